@@ -0,0 +1,258 @@
+"""
+Bulk activation service for companies
+
+Activation windows are computed in Python and written for the whole batch in
+one transaction (``bulk_update``/``update()``), instead of one ``save()`` per
+company and per schedule.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Company, ActivationSchedule, ActivationWindow
+from .snapshots import bump_company_versions, publish_company_versions
+
+logger = logging.getLogger(__name__)
+
+COMPANY_ACTIVATION_FIELDS = ['is_active', 'activation_start_time', 'activation_end_time', 'updated_at', 'config_version']
+SCHEDULE_ACTIVATION_FIELDS = ['last_activation', 'next_activation_at', 'updated_at']
+BULK_BATCH_SIZE = 500
+
+# How far ahead the windows of active schedules are created
+WINDOW_HORIZON = timedelta(days=7)
+
+
+def compute_activation_window(now, hours, scheduled_hour=None, scheduled_end_hour=None):
+    """
+    Compute the (start, end) activation window used by Company.activate_now().
+
+    Args:
+        now: current time
+        hours: number of hours to activate
+        scheduled_hour: if provided, start at the beginning of that hour (or
+            now, if that hour has already started today)
+        scheduled_end_hour: if provided, end at that hour instead of after ``hours``
+    """
+    if scheduled_hour is None:
+        # Normal activation - start from now
+        return now, now + timedelta(hours=hours)
+
+    saudi_time = now.astimezone(timezone.get_current_timezone())
+    saudi_start = saudi_time.replace(hour=scheduled_hour, minute=0, second=0, microsecond=0)
+
+    # If the scheduled time is in the past, use current time instead
+    started_now = saudi_start <= saudi_time
+    start = now if started_now else saudi_start
+
+    if scheduled_end_hour is None:
+        return start, start + timedelta(hours=hours)
+
+    if started_now:
+        # If end hour has passed today, end tomorrow
+        saudi_end = saudi_time.replace(hour=scheduled_end_hour, minute=0, second=0, microsecond=0)
+        if saudi_end <= saudi_time:
+            saudi_end += timedelta(days=1)
+    else:
+        # Started at scheduled time, handle cross-midnight
+        saudi_end = saudi_start.replace(hour=scheduled_end_hour, minute=0, second=0, microsecond=0)
+        if scheduled_end_hour < scheduled_hour:
+            saudi_end += timedelta(days=1)
+    return start, saudi_end
+
+
+def schedule_activation_window(schedule, now):
+    """Window for activating a schedule's company right now (admin / manual activation)"""
+    return compute_activation_window(
+        now,
+        schedule.duration_hours,
+        scheduled_hour=schedule.start_hour,
+        scheduled_end_hour=schedule.end_hour,
+    )
+
+
+def _upsert_windows(windows):
+    """Insert windows, updating the end of a schedule window that already exists"""
+    ActivationWindow.objects.bulk_create(
+        windows,
+        batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['schedule', 'starts_at'],
+        update_fields=['ends_at'],
+    )
+
+
+def record_windows(windows, now=None):
+    """
+    Record the new activation windows of companies.
+
+    Args:
+        windows: list of ``(company, schedule, start, end)``; ``schedule`` is
+            ``None`` for manual activations
+
+    A new window replaces the company's current one, so windows that are
+    still open are ended at ``now`` first.
+    """
+    now = now or timezone.now()
+    if not windows:
+        return
+    with transaction.atomic():
+        _end_current_windows([company.pk for company, _schedule, _start, _end in windows], now)
+        _upsert_windows([
+            ActivationWindow(
+                company=company,
+                schedule=schedule,
+                source='schedule' if schedule is not None else 'manual',
+                starts_at=start,
+                ends_at=end,
+                created_at=now,
+            )
+            for company, schedule, start, end in windows
+        ])
+
+
+def _end_current_windows(company_ids, now):
+    """End the windows of the given companies that are open at ``now``"""
+    return ActivationWindow.objects.filter(
+        company_id__in=company_ids,
+        starts_at__lt=now,
+        ends_at__gt=now,
+    ).update(ends_at=now)
+
+
+def materialize_schedule_windows(schedules, now=None):
+    """Create the windows of active schedules up to WINDOW_HORIZON ahead"""
+    from .scheduler import next_fire_time
+
+    now = now or timezone.now()
+    horizon = now + WINDOW_HORIZON
+    windows = []
+    for schedule in schedules:
+        if not schedule.is_active:
+            continue
+        fire_time = next_fire_time(schedule, now)
+        while fire_time is not None and fire_time <= horizon:
+            windows.append(ActivationWindow(
+                company_id=schedule.company_id,
+                schedule=schedule,
+                source='schedule',
+                starts_at=fire_time,
+                ends_at=fire_time + timedelta(hours=schedule.duration_hours),
+                created_at=now,
+            ))
+            fire_time = next_fire_time(schedule, fire_time)
+    if windows:
+        _upsert_windows(windows)
+    return len(windows)
+
+
+def rematerialize_schedule_windows(schedule, now=None):
+    """Re-plan a schedule's upcoming windows after it was edited"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Lock the schedule before its windows, in the same order as the
+        # scheduler (claim_due_schedules, then the windows): a schedule saved
+        # while it is due would otherwise deadlock with its activation
+        ActivationSchedule.objects.select_for_update().filter(pk=schedule.pk).first()
+        schedule.windows.filter(starts_at__gt=now).delete()
+        materialize_schedule_windows([schedule], now)
+
+
+def activate_schedules(activations, now=None, manual=False):
+    """
+    Activate companies from their schedules in one transaction.
+
+    Args:
+        activations: list of ``(schedule, start, end)``; ``schedule.company``
+            must be loaded (e.g. with ``select_related('company')``)
+        manual: the activation was requested from the admin rather than
+            fired by the scheduler (recorded as a manual window)
+
+    Each company gets its window (and a new snapshot version), each schedule
+    its ``last_activation`` and next fire time. The in-memory objects are
+    updated too. The activation
+    windows are recorded and the schedules' upcoming windows planned.
+
+    Returns:
+        number of activated companies
+    """
+    from .scheduler import next_fire_time
+
+    now = now or timezone.now()
+    companies = {}
+    schedules = []
+    for schedule, start, end in activations:
+        company = schedule.company
+        company.is_active = True
+        company.activation_start_time = start
+        company.activation_end_time = end
+        company.updated_at = now
+        company.config_version = models.F('config_version') + 1
+        companies[company.pk] = company
+
+        schedule.last_activation = now
+        schedule.next_activation_at = next_fire_time(schedule, now)
+        schedule.updated_at = now
+        schedules.append(schedule)
+
+    if not schedules:
+        return 0
+
+    with transaction.atomic():
+        Company.objects.bulk_update(companies.values(), COMPANY_ACTIVATION_FIELDS, batch_size=BULK_BATCH_SIZE)
+        versions = publish_company_versions(list(companies))
+        for company in companies.values():
+            company.config_version = versions[company.public_token]
+        ActivationSchedule.objects.bulk_update(schedules, SCHEDULE_ACTIVATION_FIELDS, batch_size=BULK_BATCH_SIZE)
+        record_windows(
+            [(schedule.company, None if manual else schedule, start, end) for schedule, start, end in activations],
+            now,
+        )
+        materialize_schedule_windows(schedules, now)
+
+    logger.info(f"Activated {len(companies)} companies from {len(schedules)} schedule(s)")
+    return len(companies)
+
+
+def advance_schedules(schedules, now=None):
+    """Move schedules on to their next fire time without activating them"""
+    from .scheduler import next_fire_time
+
+    now = now or timezone.now()
+    for schedule in schedules:
+        schedule.next_activation_at = next_fire_time(schedule, now)
+    if schedules:
+        with transaction.atomic():
+            ActivationSchedule.objects.bulk_update(schedules, ['next_activation_at'], batch_size=BULK_BATCH_SIZE)
+            materialize_schedule_windows(schedules, now)
+    return len(schedules)
+
+
+def activate_permanently(queryset):
+    """Activate companies with no time limit (one UPDATE, open windows are ended)"""
+    now = timezone.now()
+    with transaction.atomic():
+        _end_current_windows(queryset.values('pk'), now)
+        return bump_company_versions(
+            queryset,
+            is_active=True,
+            status='approved',
+            activation_start_time=None,
+            activation_end_time=None,
+            updated_at=now,
+        )
+
+
+def deactivate(queryset):
+    """Deactivate companies and clear their activation window (one UPDATE, open windows are ended)"""
+    now = timezone.now()
+    with transaction.atomic():
+        _end_current_windows(queryset.values('pk'), now)
+        return bump_company_versions(
+            queryset,
+            is_active=False,
+            activation_start_time=None,
+            activation_end_time=None,
+            updated_at=now,
+        )
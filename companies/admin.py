@@ -1,20 +1,24 @@
 """
 Admin configuration for companies app
 """
+from django import forms
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils import timezone
 from django.http import HttpResponse
-import json
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from datetime import datetime
-from .models import Company, ActivationSchedule
+from .activation import activate_permanently, activate_schedules, deactivate, schedule_activation_window
+from .models import Company, ActivationSchedule, ActivationWindow, PrizeInventory, WEEKDAY_CHOICES, days_to_mask
+from .prizes import invalidate_prize_sampler, normalize_percentages
+from .snapshots import bump_company_versions, company_snapshots
 from .utils import format_riyadh_datetime, format_arabic_datetime
 
 
@@ -46,10 +50,49 @@ class ActivationStatusFilter(SimpleListFilter):
         elif self.value() == 'inactive':
             return queryset.filter(is_active=False)
         elif self.value() == 'temporary':
-            return queryset.filter(
-                is_active=True,
-                activation_start_time__isnull=False
-            )
+            # Active now through an activation window (not permanently)
+            return queryset.active_now()
+        return queryset
+
+
+class ActivationScheduleForm(forms.ModelForm):
+    """Schedule form that edits the active_days bitmask with day checkboxes"""
+    active_days = forms.TypedMultipleChoiceField(
+        choices=WEEKDAY_CHOICES,
+        coerce=int,
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+        label='أيام التفعيل',
+    )
+    
+    class Meta:
+        model = ActivationSchedule
+        fields = '__all__'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial['active_days'] = self.instance.get_active_days_list()
+    
+    def clean_active_days(self):
+        days = self.cleaned_data.get('active_days') or []
+        if not days:
+            raise forms.ValidationError('يجب اختيار يوم واحد على الأقل')
+        return days_to_mask(days)
+
+
+class WeekdayFilter(SimpleListFilter):
+    """Filter schedules by day using the active_days bitmask (in SQL)"""
+    title = 'يوم التفعيل'
+    parameter_name = 'weekday'
+    
+    def lookups(self, request, model_admin):
+        return [('today', 'اليوم')] + [(str(weekday), name) for weekday, name in WEEKDAY_CHOICES]
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'today':
+            return queryset.active_on(timezone.localtime().weekday())
+        if self.value() is not None and self.value().isdigit():
+            return queryset.active_on(int(self.value()))
         return queryset
 
 
@@ -64,6 +107,7 @@ class ScheduleStatusFilter(SimpleListFilter):
             ('no_schedules', 'بدون جداول'),
             ('active_schedules', 'جداول نشطة'),
             ('inactive_schedules', 'جداول متوقفة'),
+            ('today_schedules', 'جداول تعمل اليوم'),
         )
     
     def queryset(self, request, queryset):
@@ -75,6 +119,10 @@ class ScheduleStatusFilter(SimpleListFilter):
             return queryset.filter(schedules__is_active=True).distinct()
         elif self.value() == 'inactive_schedules':
             return queryset.filter(schedules__is_active=False).distinct()
+        elif self.value() == 'today_schedules':
+            return queryset.filter(
+                pk__in=ActivationSchedule.objects.active_today().values('company_id')
+            )
         return queryset
 
 
@@ -95,10 +143,7 @@ class DynamicStatusFilter(SimpleListFilter):
     
     def queryset(self, request, queryset):
         if self.value() == 'active':
-            return queryset.filter(is_active=True).filter(
-                models.Q(activation_start_time__lte=timezone.now()) &
-                models.Q(activation_end_time__gte=timezone.now())
-            )
+            return queryset.active_now()
         elif self.value() == 'scheduled':
             return queryset.filter(schedules__is_active=True).distinct()
         elif self.value() == 'inactive':
@@ -125,41 +170,31 @@ class CurrentStatusFilter(SimpleListFilter):
             ('upcoming', 'قادم قريباً'),
         )
     
+    # "Upcoming soon" means a window starting within this many hours
+    UPCOMING_HOURS = 24
+    
     def queryset(self, request, queryset):
         now = timezone.now()
         
         if self.value() == 'currently_active':
-            return queryset.filter(
-                is_active=True,
-                activation_start_time__lte=now,
-                activation_end_time__gte=now
-            )
+            return queryset.currently_active(now)
         elif self.value() == 'currently_inactive':
-            return queryset.filter(
-                models.Q(is_active=False) |
-                models.Q(activation_end_time__lt=now) |
-                models.Q(activation_start_time__gt=now)
-            )
+            return queryset.exclude(pk__in=Company.objects.currently_active(now).values('pk'))
         elif self.value() == 'expired':
-            return queryset.filter(
-                is_active=True,
-                activation_end_time__lt=now
-            )
+            return queryset.expired(now)
         elif self.value() == 'upcoming':
-            return queryset.filter(
-                is_active=True,
-                activation_start_time__gt=now
-            )
+            return queryset.upcoming(self.UPCOMING_HOURS, now)
         return queryset
 
 
 class ActivationScheduleInline(admin.TabularInline):
     """Inline admin for activation schedules"""
     model = ActivationSchedule
+    form = ActivationScheduleForm
     extra = 1
     fields = [
         'is_active',
-        'saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+        'active_days',
         'start_hour', 'end_hour', 'duration_hours_display',
         'last_activation'
     ]
@@ -184,9 +219,31 @@ class ActivationScheduleInline(admin.TabularInline):
     duration_hours_display.short_description = "المدة"
 
 
+class PrizeInventoryInline(admin.TabularInline):
+    """Inline admin for prize stock limits"""
+    model = PrizeInventory
+    extra = 0
+    fields = ['prize', 'stock', 'daily_limit', 'given_today_display']
+    readonly_fields = ['given_today_display']
+    
+    classes = ['collapse']
+    
+    verbose_name = "مخزون جائزة"
+    verbose_name_plural = "🎁 مخزون الجوائز (الجوائز غير المضافة هنا غير محدودة)"
+    
+    def given_today_display(self, obj):
+        """Units given today"""
+        if obj.pk is None:
+            return "-"
+        if obj.daily_limit is None:
+            return obj.given_on_current_day
+        return f"{obj.given_on_current_day} من {obj.daily_limit}"
+    given_today_display.short_description = "الممنوح اليوم"
+
+
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
-    inlines = [ActivationScheduleInline]
+    inlines = [ActivationScheduleInline, PrizeInventoryInline]
     
     class Media:
         js = ('admin/js/company_status_updater.js', 'admin/js/prize_percentages.js',)
@@ -196,11 +253,14 @@ class CompanyAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         """Override save to handle prize percentages"""
-        # Save the model first
+        # Save the model first (this also syncs prize_config with prizes/colors)
         super().save_model(request, obj, form, change)
         
+        # Prizes may have changed - recompile the sampler on next spin
+        invalidate_prize_sampler(obj.pk)
+        
         # Get prizes
-        prizes = obj.get_prizes_list()
+        prizes = obj.get_prize_names()
         if not prizes:
             return
         
@@ -218,42 +278,9 @@ class CompanyAdmin(admin.ModelAdmin):
         
         # If percentages were submitted and match prizes count, normalize and save them
         if prize_percentages and len(prize_percentages) == len(prizes):
-            # Normalize percentages to sum to 100
-            total = sum(prize_percentages)
-            if total > 0:
-                # Normalize: (each_percentage / total) * 100
-                normalized = [(float(p) / total) * 100.0 for p in prize_percentages]
-                prize_percentages = [round(p) for p in normalized]
-                
-                # Adjust to ensure sum is exactly 100 (handle rounding errors)
-                current_sum = sum(prize_percentages)
-                if current_sum != 100:
-                    difference = 100 - current_sum
-                    max_idx = prize_percentages.index(max(prize_percentages))
-                    prize_percentages[max_idx] += difference
-                
-                # Ensure no percentage is less than 1
-                for i in range(len(prize_percentages)):
-                    if prize_percentages[i] < 1:
-                        prize_percentages[i] = 1
-                
-                # Re-adjust if needed
-                current_sum = sum(prize_percentages)
-                if current_sum != 100:
-                    difference = 100 - current_sum
-                    max_idx = prize_percentages.index(max(prize_percentages))
-                    prize_percentages[max_idx] += difference
-            
-            # Store in notes field
-            prizes_with_percentages = [
-                {'name': prize, 'percentage': percentage}
-                for prize, percentage in zip(prizes, prize_percentages)
-            ]
-            obj.notes = json.dumps({
-                'prize_percentages': prize_percentages,
-                'prizes_with_percentages': prizes_with_percentages
-            }, ensure_ascii=False)
-            obj.save(update_fields=['notes'])
+            obj.set_prize_percentages(normalize_percentages(prize_percentages))
+            obj.save(update_fields=['prize_config', 'updated_at'])
+            invalidate_prize_sampler(obj.pk)
     
     list_display = [
         'name', 
@@ -278,7 +305,7 @@ class CompanyAdmin(admin.ModelAdmin):
             'fields': ('name', 'slug', 'type', 'custom_type', 'email', 'phone')
         }),
         ('إعدادات اللعبة', {
-            'fields': ('prizes', 'colors', 'logo_url', 'prize_percentages_editor')
+            'fields': ('prizes', 'colors', 'logo_url', 'prize_percentages_editor', 'prize_mode', 'prize_deck_size', 'spin_limit_scope', 'spin_limit_period', 'spin_limit_count')
         }),
         ('الحالة والإدارة', {
             'fields': ('status', 'is_active', 'active_hours', 'activation_start_time', 'activation_end_time', 'activation_status', 'notes')
@@ -358,8 +385,7 @@ class CompanyAdmin(admin.ModelAdmin):
     
     def has_schedules(self, obj):
         """Show if company has active schedules"""
-        schedules = obj.schedules.filter(is_active=True)
-        count = schedules.count()
+        count = obj.active_schedules_count
         if count > 0:
             return format_html(
                 '<span style="color: #28a745; font-weight: bold;">✓ {} جدولة</span>',
@@ -388,7 +414,7 @@ class CompanyAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #dc3545; font-weight: bold;">❌ ملغي التفعيل</span>')
         
         # Check if it has active schedules
-        has_active_schedules = obj.schedules.filter(is_active=True).exists()
+        has_active_schedules = obj.has_active_schedules
         
         # Check if it's permanently active (no start/end time)
         is_permanent = not obj.activation_start_time and not obj.activation_end_time
@@ -426,10 +452,9 @@ class CompanyAdmin(admin.ModelAdmin):
     def calculated_active_hours_display(self, obj):
         """Display calculated active hours - show schedule hours if company has schedules"""
         # If company has active schedules, show schedule duration
-        active_schedules = obj.schedules.filter(is_active=True)
-        if active_schedules.exists():
-            # Get first active schedule's duration
-            schedule_hours = active_schedules.first().duration_hours
+        if obj.has_active_schedules:
+            # Latest active schedule's duration (annotated in get_queryset)
+            schedule_hours = obj.active_schedule_hours
             return format_html('<span style="color: #17a2b8; font-weight: bold;">📅 {} ساعة (من الجدولة)</span>', schedule_hours)
         
         # Otherwise, show calculated hours
@@ -455,27 +480,12 @@ class CompanyAdmin(admin.ModelAdmin):
         if not obj.pk:
             return format_html('<p style="color: #999; padding: 15px; background: #f8f9fa; border-radius: 5px;">⚠️ احفظ الشركة أولاً لعرض وتعديل النسب المئوية</p>')
         
-        prizes = obj.get_prizes_list()
+        prizes = obj.get_prize_names()
         if not prizes:
             return format_html('<p style="color: #999; padding: 15px; background: #f8f9fa; border-radius: 5px;">⚠️ لا توجد جوائز. أضف جوائز أولاً.</p>')
         
-        # Get percentages from notes
-        prize_percentages = []
-        if obj.notes:
-            try:
-                notes_data = json.loads(obj.notes)
-                if 'prize_percentages' in notes_data:
-                    prize_percentages = notes_data['prize_percentages']
-            except (json.JSONDecodeError, KeyError):
-                pass
-        
-        # Ensure percentages match prizes count
-        if len(prize_percentages) != len(prizes):
-            equal_percentage = 100 // len(prizes)
-            prize_percentages = [equal_percentage] * len(prizes)
-            remainder = 100 - (equal_percentage * len(prizes))
-            if remainder > 0:
-                prize_percentages[-1] += remainder
+        # Get percentages from the structured prize configuration
+        prize_percentages = obj.get_prize_percentages()
         
         # Calculate total
         total = sum(prize_percentages)
@@ -591,12 +601,7 @@ class CompanyAdmin(admin.ModelAdmin):
     
     def activate_companies(self, request, queryset):
         """تفعيل الشركات المحددة بشكل دائم (بدون حد زمني)"""
-        updated = queryset.update(
-            is_active=True, 
-            status='approved',
-            activation_start_time=None,
-            activation_end_time=None
-        )
+        updated = activate_permanently(queryset)
         self.message_user(
             request, 
             f'✅ تم تفعيل {updated} شركة بشكل دائم (تفعيل مستمر بدون حد زمني).',
@@ -606,11 +611,7 @@ class CompanyAdmin(admin.ModelAdmin):
     
     def deactivate_companies(self, request, queryset):
         """إلغاء تفعيل الشركات المحددة"""
-        updated = queryset.update(
-            is_active=False,
-            activation_start_time=None,
-            activation_end_time=None
-        )
+        updated = deactivate(queryset)
         self.message_user(
             request, 
             f'تم إلغاء تفعيل {updated} شركة.',
@@ -627,37 +628,43 @@ class CompanyAdmin(admin.ModelAdmin):
         details = []
         exact_hour_details = []
         
+        now = timezone.now()
+        activations = []
+        
+        # Load the active schedules of all selected companies in one query
+        queryset = queryset.prefetch_related(models.Prefetch(
+            'schedules',
+            queryset=ActivationSchedule.objects.filter(is_active=True),
+            to_attr='active_schedules',
+        ))
+        
         for company in queryset:
-            # Get active schedules
-            active_schedules = company.schedules.filter(is_active=True)
-            
-            if not active_schedules.exists():
+            if not company.active_schedules:
                 no_schedule_count += 1
                 continue
             
             # Try to activate from any matching schedule
-            activated = False
-            for schedule in active_schedules:
+            for schedule in company.active_schedules:
                 can_activate, is_exact_hour, message = schedule.can_activate_manually()
                 
                 if is_exact_hour:
                     # Exactly at start_hour - show message only
                     exact_hour_count += 1
                     exact_hour_details.append(f"⏰ {company.name}: {message}")
-                    activated = True
                     break
                 elif can_activate:
                     # Can activate immediately (before start_hour by 1 minute or after)
-                    company.activate_now(hours=schedule.duration_hours, scheduled_hour=schedule.start_hour, scheduled_end_hour=schedule.end_hour)
-                    schedule.last_activation = timezone.now()
-                    schedule.save()
+                    schedule.company = company
+                    start, end = schedule_activation_window(schedule, now)
+                    activations.append((schedule, start, end))
                     
                     activated_count += 1
-                    end_time = format_arabic_datetime(company.activation_end_time)
-                    details.append(f"✅ {company.name}: تم التفعيل لـ {schedule.duration_hours} ساعة (حتى {end_time})")
-                    activated = True
+                    details.append(f"✅ {company.name}: تم التفعيل لـ {schedule.duration_hours} ساعة (حتى {format_arabic_datetime(end)})")
                     break
         
+        # Persist all activations in one transaction
+        activate_schedules(activations, now, manual=True)
+        
         # Build message - only show activated and exact hour messages
         message_parts = []
         
@@ -690,6 +697,12 @@ class CompanyAdmin(admin.ModelAdmin):
     
     activate_by_schedule.short_description = '📅 تفعيل حسب الجدولة (يتحقق من الأيام والأوقات)'
     
+    def delete_queryset(self, request, queryset):
+        """Delete companies and drop their cached game snapshots"""
+        tokens = list(queryset.values_list('public_token', flat=True))
+        super().delete_queryset(request, queryset)
+        company_snapshots.forget(tokens)
+    
     def changelist_view(self, request, extra_context=None):
         """Override changelist to add export button"""
         # Check if this is an export request
@@ -820,11 +833,29 @@ class CompanyAdmin(admin.ModelAdmin):
     export_to_excel.short_description = "📊 تصدير البيانات المحددة إلى Excel"
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        """Annotate schedule info so list columns don't query schedules per row"""
+        active_schedules = ActivationSchedule.objects.filter(
+            company=models.OuterRef('pk'),
+            is_active=True,
+        )
+        # Subqueries (not joins) so list filters on schedules can't inflate the count
+        active_schedules_count = active_schedules.order_by().values('company').annotate(
+            count=models.Count('pk')
+        ).values('count')
+        return super().get_queryset(request).annotate(
+            active_schedules_count=Coalesce(
+                models.Subquery(active_schedules_count, output_field=models.IntegerField()),
+                0,
+            ),
+            active_schedule_hours=models.Subquery(
+                active_schedules.order_by('-created_at').values('duration_hours')[:1]
+            ),
+        )
 
 
 @admin.register(ActivationSchedule)
 class ActivationScheduleAdmin(admin.ModelAdmin):
+    form = ActivationScheduleForm
     list_display = [
         'company',
         'get_active_days_short',
@@ -836,12 +867,11 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
     ]
     list_filter = [
         'is_active',
-        'monday', 'tuesday', 'wednesday', 'thursday', 
-        'friday', 'saturday', 'sunday',
+        WeekdayFilter,
         'created_at'
     ]
     search_fields = ['company__name', 'company__email']
-    readonly_fields = ['last_activation', 'created_at', 'updated_at', 'schedule_status_display', 'duration_display']
+    readonly_fields = ['last_activation', 'next_activation_at', 'created_at', 'updated_at', 'schedule_status_display', 'duration_display']
     
     class Media:
         js = ('admin/js/schedule_status_updater.js', 'admin/js/schedule_delete_handler.js',)
@@ -851,10 +881,7 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
             'fields': ('company',)
         }),
         ('أيام التفعيل (بترتيب الأسبوع)', {
-            'fields': (
-                ('saturday', 'sunday', 'monday', 'tuesday'),
-                ('wednesday', 'thursday', 'friday'),
-            ),
+            'fields': ('active_days',),
             'description': 'اختر الأيام التي تريد تفعيل الشركة فيها تلقائياً (السبت إلى الجمعة)'
         }),
         ('إعدادات الوقت (نظام 12 ساعة)', {
@@ -874,21 +901,14 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
         ('معلومات التتبع', {
-            'fields': ('last_activation', 'schedule_status_display', 'created_at', 'updated_at'),
+            'fields': ('last_activation', 'next_activation_at', 'schedule_status_display', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
     
     def get_active_days_short(self, obj):
         """Get short display of active days (in Arabic week order)"""
-        days_short = []
-        if obj.saturday: days_short.append('السبت')
-        if obj.sunday: days_short.append('الأحد')
-        if obj.monday: days_short.append('الاثنين')
-        if obj.tuesday: days_short.append('الثلاثاء')
-        if obj.wednesday: days_short.append('الأربعاء')
-        if obj.thursday: days_short.append('الخميس')
-        if obj.friday: days_short.append('الجمعة')
+        days_short = [name for weekday, name in WEEKDAY_CHOICES if obj.is_active_on(weekday)]
         return ', '.join(days_short) if days_short else '-'
     get_active_days_short.short_description = 'الأيام المفعلة'
     
@@ -977,15 +997,27 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
     def activate_selected_schedules(self, request, queryset):
         """Activate selected schedules"""
         count = queryset.update(is_active=True)
+        self.bump_companies(queryset)
         self.message_user(request, f'تم تفعيل {count} جدولة')
     activate_selected_schedules.short_description = 'تفعيل الجدولة المحددة'
     
     def deactivate_selected_schedules(self, request, queryset):
         """Deactivate selected schedules"""
         count = queryset.update(is_active=False)
+        self.bump_companies(queryset)
         self.message_user(request, f'تم إيقاف {count} جدولة')
     deactivate_selected_schedules.short_description = 'إيقاف الجدولة المحددة'
     
+    def delete_queryset(self, request, queryset):
+        """Delete schedules and rebuild their companies' game snapshots"""
+        company_ids = list(queryset.values_list('company_id', flat=True))
+        super().delete_queryset(request, queryset)
+        bump_company_versions(Company.objects.filter(pk__in=company_ids))
+    
+    def bump_companies(self, queryset):
+        """Rebuild the game snapshots of the schedules' companies"""
+        bump_company_versions(Company.objects.filter(pk__in=queryset.values('company_id')))
+    
     def changelist_view(self, request, extra_context=None):
         """Override changelist to add export button"""
         # Check if this is an export request
@@ -1049,13 +1081,8 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
             ws.cell(row=row_num, column=1, value=schedule.id)
             ws.cell(row=row_num, column=2, value=schedule.company.name)
             ws.cell(row=row_num, column=3, value=schedule.company.email or '-')
-            ws.cell(row=row_num, column=4, value='نعم' if schedule.saturday else 'لا')
-            ws.cell(row=row_num, column=5, value='نعم' if schedule.sunday else 'لا')
-            ws.cell(row=row_num, column=6, value='نعم' if schedule.monday else 'لا')
-            ws.cell(row=row_num, column=7, value='نعم' if schedule.tuesday else 'لا')
-            ws.cell(row=row_num, column=8, value='نعم' if schedule.wednesday else 'لا')
-            ws.cell(row=row_num, column=9, value='نعم' if schedule.thursday else 'لا')
-            ws.cell(row=row_num, column=10, value='نعم' if schedule.friday else 'لا')
+            for column, (weekday, _name) in enumerate(WEEKDAY_CHOICES, 4):
+                ws.cell(row=row_num, column=column, value='نعم' if schedule.is_active_on(weekday) else 'لا')
             ws.cell(row=row_num, column=11, value=f"{schedule.start_hour}:00")
             ws.cell(row=row_num, column=12, value=f"{schedule.end_hour}:00")
             ws.cell(row=row_num, column=13, value=schedule.duration_hours)
@@ -1103,3 +1130,48 @@ class ActivationScheduleAdmin(admin.ModelAdmin):
         return response
     
     export_to_excel.short_description = "📊 تصدير البيانات المحددة إلى Excel"
+
+
+class WindowStateFilter(SimpleListFilter):
+    """Filter activation windows by state (shared window queries)"""
+    title = 'حالة النافذة'
+    parameter_name = 'window_state'
+    
+    def lookups(self, request, model_admin):
+        return (
+            ('active', 'نشطة الآن'),
+            ('upcoming', 'قادمة'),
+            ('expired', 'منتهية'),
+        )
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'active':
+            return queryset.active_at()
+        elif self.value() == 'upcoming':
+            return queryset.upcoming()
+        elif self.value() == 'expired':
+            return queryset.expired()
+        return queryset
+
+
+@admin.register(ActivationWindow)
+class ActivationWindowAdmin(admin.ModelAdmin):
+    list_display = ['company', 'source', 'starts_at_display', 'ends_at_display', 'schedule']
+    list_filter = [WindowStateFilter, 'source']
+    search_fields = ['company__name']
+    list_select_related = ['company', 'schedule__company']
+    readonly_fields = ['company', 'schedule', 'source', 'starts_at', 'ends_at', 'created_at']
+    date_hierarchy = 'starts_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def starts_at_display(self, obj):
+        return format_arabic_datetime(obj.starts_at)
+    starts_at_display.short_description = 'بداية التفعيل'
+    starts_at_display.admin_order_field = 'starts_at'
+    
+    def ends_at_display(self, obj):
+        return format_arabic_datetime(obj.ends_at)
+    ends_at_display.short_description = 'نهاية التفعيل'
+    ends_at_display.admin_order_field = 'ends_at'
@@ -0,0 +1,120 @@
+"""
+Prize deck mode: exact prize quotas per deck of spins
+
+Drawing every spin independently lets the number of each prize swing widely
+around its percentage over a small event. In deck mode the company's prizes
+are dealt once into a shuffled deck of ``prize_deck_size`` outcomes that
+matches the percentages exactly, and each spin pops the next outcome.
+
+A pop is one conditional UPDATE that advances ``position`` and returns the
+outcome byte at the new position, so concurrent spins never get the same
+outcome and need no lock or weight computation. When the UPDATE matches no
+row (the deck ran out, or the prizes, weights or deck size changed) a new
+deck is dealt under a row lock and the pop is retried.
+"""
+import logging
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import PrizeDeck
+from .prizes import MAX_DECK_PRIZES
+
+logger = logging.getLogger(__name__)
+
+# A deck emptied by concurrent spins between dealing and popping is dealt
+# again this many times before falling back to an independent draw
+MAX_DEAL_ATTEMPTS = 3
+
+_POP_SQL = (
+    'UPDATE {table} SET {position} = {position} + 1 '
+    'WHERE company_id = %s AND config_key = %s AND {size} = %s AND {position} < {size} '
+    'RETURNING substr(outcomes, {position}, 1)'
+)
+
+
+def _pop_sql():
+    quote = connection.ops.quote_name
+    return _POP_SQL.format(
+        table=quote(PrizeDeck._meta.db_table),
+        position=quote('position'),
+        size=quote('size'),
+    )
+
+
+def _pop(company_id, config_key, size):
+    """Pop the next outcome (prize index), or ``None`` if the deck must be dealt"""
+    with connection.cursor() as cursor:
+        cursor.execute(_pop_sql(), [company_id, config_key, size])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return bytes(row[0])[0]
+
+
+def deal_deck(company_id, sampler, size):
+    """
+    Deal a new deck for a company unless a usable one exists.
+
+    Concurrent spins that all find the deck empty wait for the row lock; the
+    first one deals and the others see the fresh deck and leave it alone.
+    """
+    with transaction.atomic():
+        deck = PrizeDeck.objects.select_for_update().filter(company_id=company_id).first()
+        if (deck is not None and deck.config_key == sampler.digest
+                and deck.size == size and deck.position < deck.size):
+            return deck
+
+        outcomes = sampler.deal_deck(size)
+        if deck is None:
+            try:
+                with transaction.atomic():
+                    deck = PrizeDeck.objects.create(
+                        company_id=company_id,
+                        config_key=sampler.digest,
+                        outcomes=outcomes,
+                        size=size,
+                    )
+            except IntegrityError:
+                # Dealt by a concurrent spin
+                return None
+        else:
+            deck.config_key = sampler.digest
+            deck.outcomes = outcomes
+            deck.size = size
+            deck.position = 0
+            deck.generation += 1
+            deck.dealt_at = timezone.now()
+            deck.save()
+
+    logger.info(
+        f"Company {company_id}: Dealt prize deck #{deck.generation} "
+        f"({size} spins, counts: {sampler.deck_counts(size)})"
+    )
+    return deck
+
+
+def draw_from_deck(company):
+    """
+    Return the next prize of the company's deck.
+
+    ``company`` may be a Company or its cached snapshot. Returns ``None``
+    when the company has no prizes.
+    """
+    sampler = company.prize_sampler
+    if sampler is None:
+        return None
+    if len(sampler) > MAX_DECK_PRIZES:
+        logger.warning(f"Company {company.pk}: Too many prizes for a deck, drawing independently")
+        return sampler.draw()
+
+    size = company.prize_deck_size
+    for _ in range(MAX_DEAL_ATTEMPTS):
+        index = _pop(company.pk, sampler.digest, size)
+        if index is not None:
+            return sampler.prizes[index]
+        deal_deck(company.pk, sampler, size)
+
+    logger.warning(f"Company {company.pk}: Prize deck exhausted by concurrent spins, drawing independently")
+    return sampler.draw()
+
@@ -0,0 +1,92 @@
+"""
+Prize stock limits ("only 20 free desserts today")
+
+A limited prize has a PrizeInventory row with an overall ``stock`` and/or a
+``daily_limit``. Taking a unit is a single conditional UPDATE: it only
+matches while the prize is in stock, decrements ``stock`` and counts the
+unit for today in the same statement. Concurrent spins never push the stock
+below zero and don't lock the company row.
+
+A prize whose UPDATE matched nothing is out of stock. It is remembered in
+the cache under the company's config version and the current day, so later
+spins leave it out of the draw without trying it again; restocking (which
+bumps the version) or the next day brings it back.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import PrizeInventory
+
+logger = logging.getLogger(__name__)
+
+OUT_OF_STOCK_TIMEOUT = 24 * 60 * 60
+
+
+def _out_of_stock_key(company, day):
+    return f'prize-stock:{company.pk}:{company.version}:{day.isoformat()}'
+
+
+def take_stock(company_id, prize, day=None):
+    """
+    Take one unit of a limited prize.
+
+    Returns ``False`` (and changes nothing) if the prize is out of stock
+    overall or for the day.
+    """
+    day = day or timezone.localdate()
+    updated = PrizeInventory.objects.filter(
+        Q(stock__isnull=True) | Q(stock__gt=0),
+        Q(daily_limit__isnull=True) | ~Q(day=day) | Q(given_today__lt=F('daily_limit')),
+        company_id=company_id,
+        prize=prize,
+    ).update(
+        stock=F('stock') - 1,
+        given_today=Case(When(day=day, then=F('given_today') + 1), default=Value(1)),
+        day=day,
+    )
+    return updated == 1
+
+
+def return_stock(company_id, prize, day=None):
+    """Give back a unit taken by take_stock() for a spin that was not recorded"""
+    day = day or timezone.localdate()
+    PrizeInventory.objects.filter(company_id=company_id, prize=prize).update(
+        stock=F('stock') + 1,
+        given_today=Case(
+            When(day=day, given_today__gt=0, then=F('given_today') - 1),
+            default=F('given_today'),
+            output_field=PrizeInventory._meta.get_field('given_today'),
+        ),
+    )
+
+
+def draw_in_stock(company, prize):
+    """
+    Take a unit of ``prize`` (picked by the company's prize mode), or of a
+    replacement drawn from the prizes still in stock.
+
+    ``company`` may be a Company snapshot with ``limited_prizes``. Returns
+    ``None`` when every prize is out of stock.
+    """
+    limited = company.limited_prizes
+    day = timezone.localdate()
+    key = _out_of_stock_key(company, day)
+    out_of_stock = set(cache.get(key, ()))
+
+    sampler = None
+    while True:
+        if prize is not None and prize not in out_of_stock:
+            if prize not in limited or take_stock(company.pk, prize, day):
+                return prize
+            out_of_stock.add(prize)
+            cache.set(key, out_of_stock, OUT_OF_STOCK_TIMEOUT)
+            logger.info(f"Company {company.slug}: Prize '{prize}' is out of stock")
+
+        # Redraw from the prizes still in stock (same relative weights)
+        sampler = (sampler or company.prize_sampler).without(out_of_stock)
+        if sampler is None:
+            return None
+        prize = sampler.draw()
@@ -0,0 +1,209 @@
+"""
+Management command to count database queries on the hot paths
+Runs against the configured database inside a transaction that is rolled back,
+and fails when a count is over its budget in QUERY_BUDGETS. With --baseline the
+pages are also measured with the per-company schedule reads that
+is_currently_active and the changelist columns used to do, and the game pages
+with the company read from the database on every request.
+"""
+import json
+from contextlib import ExitStack
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from companies.admin import CompanyAdmin
+from companies.models import ALL_DAYS_MASK, Company, ActivationSchedule
+from companies.snapshots import build_company_snapshot, company_snapshots
+
+# Recorded query counts (PostgreSQL); a count over its budget fails the command.
+# A spin writes the spin, its hourly and daily rollup slots (behind the
+# shared rollup lock) and a visitor sketch update, and reads the day's sketch
+# once per worker; the savepoint pair is the benchmark's own transaction.
+QUERY_BUDGETS = {
+    'GET play page (first request)': 3,
+    'GET play page': 0,
+    'POST spin': 8,
+    'GET admin company changelist': 6,
+}
+
+
+def _check_and_activate_from_schedule(company):
+    """What every read of is_currently_active used to run first"""
+    for schedule in company.schedules.filter(is_active=True):
+        if schedule.should_activate_now():
+            if schedule.last_activation:
+                time_since_last = timezone.now() - schedule.last_activation
+                if time_since_last.total_seconds() < (schedule.duration_hours * 3600):
+                    continue
+            company.activate_now(hours=schedule.duration_hours, scheduled_hour=schedule.start_hour, scheduled_end_hour=schedule.end_hour)
+            schedule.last_activation = timezone.now()
+            schedule.save()
+            break
+
+
+def _load_company_snapshot(token):
+    """What every game request used to run: read the company, check its schedules"""
+    company = Company.objects.filter(public_token=token).first()
+    if company is None:
+        return None
+    _check_and_activate_from_schedule(company)
+    return build_company_snapshot(company)
+
+
+def baseline_patches():
+    """
+    Patches that put back the old schedule reads: is_currently_active checks
+    the schedules on every read and the changelist columns query them per
+    row instead of reading the get_queryset() annotations. The game pages
+    read the company and check its schedules on every request instead of
+    using the cached snapshot.
+    """
+    is_currently_active = Company.is_currently_active.fget
+
+    def old_is_currently_active(company):
+        _check_and_activate_from_schedule(company)
+        return is_currently_active(company)
+
+    def old_get_queryset(model_admin, request):
+        return admin.ModelAdmin.get_queryset(model_admin, request).select_related()
+
+    return [
+        mock.patch.object(Company, 'is_currently_active', property(old_is_currently_active)),
+        mock.patch.object(Company, 'has_active_schedules', property(
+            lambda company: company.schedules.filter(is_active=True).exists()
+        )),
+        mock.patch.object(Company, 'active_schedules_count', property(
+            lambda company: company.schedules.filter(is_active=True).count()
+        ), create=True),
+        mock.patch.object(Company, 'active_schedule_hours', property(
+            lambda company: company.schedules.filter(is_active=True).first().duration_hours
+        ), create=True),
+        mock.patch.object(CompanyAdmin, 'get_queryset', old_get_queryset),
+        mock.patch.object(company_snapshots, 'get', _load_company_snapshot),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Count database queries per spin, per play page and per admin changelist page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--companies',
+            type=int,
+            default=50,
+            help='Number of companies to create for the admin changelist (default: 50)',
+        )
+        parser.add_argument(
+            '--schedules',
+            type=int,
+            default=2,
+            help='Number of active schedules per company (default: 2)',
+        )
+        parser.add_argument(
+            '--baseline',
+            action='store_true',
+            help='Also count the queries with the old per-company schedule reads',
+        )
+
+    def handle(self, *args, **options):
+        runs = [('Current', [])]
+        if options['baseline']:
+            runs.insert(0, ('Baseline', baseline_patches()))
+
+        columns = []
+        # Without the schedule middleware, whose tick would land on a random request
+        with override_settings(
+            ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False, SCHEDULE_ACTIVATION_MIDDLEWARE=False,
+        ):
+            for label, patches in runs:
+                with ExitStack() as stack:
+                    for patch in patches:
+                        stack.enter_context(patch)
+                    with transaction.atomic():
+                        columns.append(dict(self._run(options['companies'], options['schedules'])))
+                        # Never keep the benchmark data
+                        transaction.set_rollback(True)
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(f'Query counts ({options["companies"]} companies, {options["schedules"]} schedules each)')
+        self.stdout.write('=' * 70)
+        self.stdout.write(f'{"":<35}' + ''.join(f' {label:>10}' for label, _ in runs) + f' {"Budget":>10}')
+        over = []
+        for name, count in columns[-1].items():
+            line = f'{name:<35}' + ''.join(f' {column[name]:>10}' for column in columns) + f' {QUERY_BUDGETS[name]:>10}'
+            if count > QUERY_BUDGETS[name]:
+                over.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if over:
+            raise CommandError(f'Over the query budget: {", ".join(over)}')
+        self.stdout.write(self.style.SUCCESS('Query counts within budget'))
+
+    def _run(self, company_count, schedule_count):
+        companies = []
+        for i in range(company_count):
+            company = Company.objects.create(
+                name=f'Benchmark Company {i}',
+                type='cafe',
+                email=f'benchmark{i}@example.com',
+                prizes=['A', 'B', 'C'],
+                colors=['#6A3FA0', '#F2C23E', '#8C59C4'],
+                status='approved',
+                is_active=True,
+            )
+            for hour in range(schedule_count):
+                ActivationSchedule.objects.create(
+                    company=company,
+                    active_days=ALL_DAYS_MASK,
+                    start_hour=(9 + hour) % 24,
+                    end_hour=(17 + hour) % 24,
+                )
+            companies.append(company)
+
+        user = get_user_model().objects.create_superuser(
+            username='benchmark-queries-admin',
+            email='benchmark@example.com',
+            password=None,
+        )
+        client = Client()
+        client.force_login(user)
+
+        company = companies[0]
+        play_url = company.company_url
+        token = play_url.rstrip('/').split('/')[-1]
+        spin_url = reverse('game:spin', kwargs={'token': token})
+        changelist_url = reverse('admin:companies_company_changelist')
+
+        results = []
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(play_url)
+        results.append(('GET play page (first request)', len(ctx)))
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(play_url)
+        results.append(('GET play page', len(ctx)))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.post(
+                spin_url,
+                json.dumps({'visitor_name': 'benchmark', 'visitor_phone': ''}),
+                content_type='application/json',
+            )
+        if response.status_code != 200:
+            raise CommandError(f'The benchmark spin failed ({response.status_code}): {response.content[:200]!r}')
+        results.append(('POST spin', len(ctx)))
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(changelist_url)
+        results.append(('GET admin company changelist', len(ctx)))
+
+        return results
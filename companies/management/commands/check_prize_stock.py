@@ -0,0 +1,118 @@
+"""
+Management command to check prize stock limits under concurrency
+Fires N concurrent spins at a temporary company whose main prize has a small
+overall stock and another with a small daily limit, and asserts that exactly
+the stock was given out and no count went below zero
+"""
+import json
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from companies.models import Company, PrizeInventory
+from game.models import GameSpin
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent spins at limited prizes and assert the stock never goes negative'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spins',
+            type=int,
+            default=200,
+            help='Number of concurrent spins (default: 200)',
+        )
+        parser.add_argument(
+            '--stock',
+            type=int,
+            default=20,
+            help='Overall stock of the first prize (default: 20)',
+        )
+        parser.add_argument(
+            '--daily-limit',
+            type=int,
+            default=10,
+            help='Daily limit of the second prize (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        spins, stock, daily_limit = options['spins'], options['stock'], options['daily_limit']
+        company = Company.objects.create(
+            name='Prize Stock Check',
+            type='cafe',
+            email='prize-stock@example.com',
+            prizes=['Limited', 'Daily', 'Unlimited'],
+            status='approved',
+            is_active=True,
+        )
+        try:
+            # Nearly every spin goes for a limited prize first
+            company.set_prize_percentages([60, 39, 1])
+            company.save()
+            PrizeInventory.objects.create(company=company, prize='Limited', stock=stock)
+            PrizeInventory.objects.create(company=company, prize='Daily', daily_limit=daily_limit)
+
+            with override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False, SCHEDULE_ACTIVATION_MIDDLEWARE=False):
+                statuses = self.fire(company, spins)
+            if settings.GAME_SPIN_WRITE_BEHIND:
+                # Write the journaled spins before counting them
+                from game.journal import get_journal
+                journal = get_journal()
+                if journal is not None:
+                    journal.flush()
+
+            given = dict(
+                GameSpin.objects.filter(company=company)
+                .values('prize')
+                .annotate(count=Count('id'))
+                .values_list('prize', 'count')
+            )
+            inventory = {item.prize: item for item in PrizeInventory.objects.filter(company=company)}
+        finally:
+            company.delete()
+
+        ok_spins = sum(status == 200 for status in statuses)
+        limited = inventory['Limited']
+        daily = inventory['Daily']
+        self.stdout.write(f'{ok_spins}/{spins} spins OK, given: {given}')
+        self.stdout.write(
+            f'Limited: stock left {limited.stock} (expected 0), '
+            f'Daily: given today {daily.given_on_current_day} of {daily_limit}'
+        )
+
+        expected_limited = min(stock, spins)
+        if (ok_spins != spins
+                or given.get('Limited', 0) != expected_limited
+                or limited.stock != stock - expected_limited
+                or given.get('Daily', 0) > daily_limit
+                or daily.given_on_current_day != given.get('Daily', 0)):
+            raise CommandError('Prize stock limits were not respected under concurrency')
+        self.stdout.write(self.style.SUCCESS('Prize stock OK'))
+
+    def fire(self, company, count):
+        """Run ``count`` spins in threads released at the same moment"""
+        url = reverse('game:spin', args=[company.public_token])
+        body = json.dumps({'visitor_name': 'Stock Check'})
+        barrier = threading.Barrier(count)
+        statuses = [None] * count
+
+        def run(index):
+            try:
+                barrier.wait()
+                statuses[index] = Client().post(url, body, content_type='application/json').status_code
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
@@ -0,0 +1,230 @@
+"""
+Management command to check scheduler leader failover
+Runs two ScheduleLoops in separate processes against the configured
+PostgreSQL database, kills the leader with SIGKILL once it has activated a
+first batch of due schedules, and asserts that the standby takes over and that
+every fire time of both batches was activated exactly once. The loops only
+see the schedules created by the check.
+"""
+import os
+import signal
+import tempfile
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from companies import scheduler
+from companies.models import ALL_DAYS_MASK, ActivationSchedule, Company
+from companies.scheduler import ScheduleLoop, release_leader_lock, try_acquire_leader_lock
+
+# Written in the activation transaction, so a row exists iff the activation committed
+ACTIVATIONS_TABLE = 'check_scheduler_leader_activations'
+COMPANY_NAME = 'Scheduler Leader Check'
+
+
+class Command(BaseCommand):
+    help = 'Run two scheduler loops, kill the leader and assert each fire time is activated exactly once'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedules',
+            type=int,
+            default=20,
+            help='Due schedules in each batch, before and after the kill (default: 20)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Seconds to wait for each step (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'Leader election needs PostgreSQL advisory locks; on other databases '
+                'every scheduler process acts as the leader'
+            )
+        if not try_acquire_leader_lock():
+            raise CommandError('Another scheduler holds the leader lock on this database; stop it first')
+        release_leader_lock()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {ACTIVATIONS_TABLE} '
+                '(pid integer NOT NULL, schedule_id bigint NOT NULL, fire_time timestamptz NOT NULL)'
+            )
+        self.companies = []
+        self.fire_times = {}
+        self.pids = []
+        directory = tempfile.mkdtemp(prefix='scheduler-leader-')
+        self.events = os.path.join(directory, 'leadership')
+        self.timeout = options['timeout']
+        try:
+            failures = self.failover(options['schedules'])
+        finally:
+            for pid in list(self.pids):
+                self.stop(pid, signal.SIGTERM)
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {ACTIVATIONS_TABLE}')
+            Company.objects.filter(pk__in=self.companies).delete()
+            if os.path.exists(self.events):
+                os.unlink(self.events)
+            os.rmdir(directory)
+
+        if failures:
+            raise CommandError('Scheduler failover did not activate every fire time exactly once')
+        self.stdout.write(self.style.SUCCESS('Scheduler leader OK'))
+
+    def failover(self, count):
+        first_batch = self.due_schedules(count, 'before')
+        leader = self.start_loop()
+        self.wait_for('the first loop to become leader', lambda: self.leaders() == [leader])
+        standby = self.start_loop()
+        self.wait_for('the first batch', lambda: len(self.activations(first_batch)) >= count)
+        # Give the standby a few retries to (wrongly) take over
+        time.sleep(1)
+        standby_before_kill = standby in self.leaders()
+
+        self.stop(leader, signal.SIGKILL)
+        killed_at = time.monotonic()
+        self.wait_for('the standby to take over', lambda: standby in self.leaders())
+        takeover = time.monotonic() - killed_at
+        # Saved while the new leader is running, so each save races its activation
+        second_batch = self.due_schedules(count, 'after')
+        self.wait_for('the second batch', lambda: len(self.activations(second_batch)) >= count)
+        # Let both batches settle, so a late duplicate would show up
+        time.sleep(1)
+
+        first = self.activations(first_batch)
+        second = self.activations(second_batch)
+        activated = first + second
+        checks = [
+            ('the second loop stayed standby while the leader was alive', not standby_before_kill),
+            ('the standby took over after the leader was killed', standby in self.leaders()),
+            ('the first batch was activated by the leader', {pid for pid, _, _ in first} == {leader}),
+            ('the second batch was activated by the new leader', {pid for pid, _, _ in second} == {standby}),
+            ('every fire time was activated exactly once',
+             sorted((schedule_id, fire_time) for _, schedule_id, fire_time in activated)
+             == sorted(self.fire_times.items())),
+        ]
+        self.stdout.write(
+            f'{count} + {count} due schedule(s), {len(activated)} activation(s), '
+            f'standby took over in {takeover:.1f}s'
+        )
+        failures = 0
+        for label, ok in checks:
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f'{"OK  " if ok else "FAIL"} {label}'))
+            failures += not ok
+        return failures
+
+    def due_schedules(self, count, label):
+        """Create ``count`` companies, each with a schedule that fires this hour"""
+        hour = timezone.localtime().hour
+        pks = []
+        for number in range(count):
+            company = Company.objects.create(
+                name=f'{COMPANY_NAME} {label} {number}',
+                type='cafe',
+                email=f'scheduler-leader-{label}-{number}@example.com',
+                prizes=['A', 'B'],
+                status='approved',
+                is_active=False,
+            )
+            self.companies.append(company.pk)
+            schedule = ActivationSchedule.objects.create(
+                company=company,
+                active_days=ALL_DAYS_MASK,
+                start_hour=hour,
+                end_hour=(hour + 2) % 24,
+            )
+            self.fire_times[schedule.pk] = schedule.next_activation_at
+            pks.append(schedule.pk)
+        return pks
+
+    def start_loop(self):
+        """Fork a process running a ScheduleLoop over the check's schedules"""
+        connections.close_all()
+        pid = os.fork()
+        if pid != 0:
+            self.pids.append(pid)
+            return pid
+
+        code = 1
+        try:
+            due_schedules = scheduler.due_schedules
+            activate_schedules = scheduler.activate_schedules
+
+            def own_due_schedules(now=None):
+                # By name: the second batch is created after this process started
+                return due_schedules(now).filter(company__name__startswith=COMPANY_NAME)
+
+            def recording_activate_schedules(activations, now=None, **kwargs):
+                result = activate_schedules(activations, now, **kwargs)
+                with connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'INSERT INTO {ACTIVATIONS_TABLE} (pid, schedule_id, fire_time) VALUES (%s, %s, %s)',
+                        [(os.getpid(), schedule.pk, start) for schedule, start, _ in activations],
+                    )
+                return result
+
+            def on_leadership_change(is_leader):
+                descriptor = os.open(self.events, os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+                try:
+                    os.write(descriptor, f'{os.getpid()} {int(is_leader)}\n'.encode())
+                finally:
+                    os.close(descriptor)
+
+            loop = ScheduleLoop(
+                reload_interval=0.2,
+                leader_retry_interval=0.2,
+                on_leadership_change=on_leadership_change,
+            )
+            signal.signal(signal.SIGTERM, loop.stop)
+            with mock.patch.object(scheduler, 'due_schedules', own_due_schedules), \
+                    mock.patch.object(scheduler, 'activate_schedules', recording_activate_schedules):
+                loop.run_forever()
+            code = 0
+        finally:
+            os._exit(code)
+
+    def stop(self, pid, sig):
+        if pid not in self.pids:
+            return
+        self.pids.remove(pid)
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+        os.waitpid(pid, 0)
+
+    def leaders(self):
+        """Pids whose last leadership event says they lead"""
+        if not os.path.exists(self.events):
+            return []
+        state = {}
+        with open(self.events) as events:
+            for line in events:
+                pid, is_leader = line.split()
+                state[int(pid)] = is_leader == '1'
+        return [pid for pid, is_leader in state.items() if is_leader and pid in self.pids]
+
+    def activations(self, schedule_ids):
+        """``[(pid, schedule_id, fire_time)]`` recorded for the given schedules"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT pid, schedule_id, fire_time FROM {ACTIVATIONS_TABLE} WHERE schedule_id = ANY(%s)',
+                [schedule_ids],
+            )
+            return cursor.fetchall()
+
+    def wait_for(self, label, condition):
+        deadline = time.monotonic() + self.timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise CommandError(f'Timed out waiting for {label}')
+            time.sleep(0.1)
@@ -0,0 +1,134 @@
+"""
+Management command to check request coalescing on cold snapshot loads
+Fires N concurrent requests at a play page with an empty cache and asserts
+that the company snapshot was loaded from the database exactly once
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from companies.models import Company
+from companies.snapshots import SnapshotStore, build_company_snapshot, company_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent requests at a cold play page and assert a single snapshot load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Number of concurrent requests (default: 100)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Simulated workers sharing the cache for the cross-worker check (default: 4)',
+        )
+        parser.add_argument(
+            '--token',
+            help='Public token of the company to use (default: a temporary company)',
+        )
+
+    def handle(self, *args, **options):
+        temporary = None
+        if options['token']:
+            token = options['token']
+            if not Company.objects.filter(public_token=token).exists():
+                raise CommandError(f'No company with public token {token}')
+        else:
+            temporary = Company.objects.create(
+                name='Single Flight Check',
+                type='cafe',
+                email='single-flight@example.com',
+                prizes=['A', 'B', 'C'],
+                status='approved',
+                is_active=True,
+            )
+            token = temporary.public_token
+
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False, SCHEDULE_ACTIVATION_MIDDLEWARE=False):
+                failures = [
+                    self.check_requests(token, options['requests']),
+                    self.check_workers(token, options['requests'], options['workers']),
+                ]
+        finally:
+            if temporary is not None:
+                temporary.delete()
+
+        if any(failures):
+            raise CommandError('Concurrent misses were not coalesced into a single load')
+        self.stdout.write(self.style.SUCCESS('Single-flight OK'))
+
+    def check_requests(self, token, count):
+        """N concurrent GETs of the play page in this worker"""
+        loads = []
+        original_build = company_snapshots.build
+
+        def counting_build(company):
+            loads.append(company.pk)
+            return original_build(company)
+
+        company_snapshots.forget([token])
+        company_snapshots.build = counting_build
+        try:
+            url = Company.objects.get(public_token=token).company_url
+            statuses = self.fire(count, lambda: Client().get(url).status_code)
+        finally:
+            company_snapshots.build = original_build
+
+        return self.report(f'{count} concurrent play page requests', loads, statuses)
+
+    def check_workers(self, token, count, workers):
+        """N concurrent misses spread over several stores sharing the cache"""
+        loads = []
+
+        def counting_build(company):
+            loads.append(company.pk)
+            # Hold the load open long enough for every worker to miss
+            time.sleep(0.05)
+            return build_company_snapshot(company)
+
+        stores = [SnapshotStore(company_snapshots.prefix, Company, counting_build) for _ in range(workers)]
+        company_snapshots.forget([token])
+        statuses = self.fire(
+            count,
+            lambda index: 200 if stores[index % workers].get(token) is not None else 404,
+            pass_index=True,
+        )
+        return self.report(f'{count} concurrent misses over {workers} workers', loads, statuses)
+
+    def fire(self, count, call, pass_index=False):
+        """Run ``call`` in ``count`` threads released at the same moment"""
+        barrier = threading.Barrier(count)
+        statuses = [None] * count
+
+        def run(index):
+            try:
+                barrier.wait()
+                statuses[index] = call(index) if pass_index else call()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def report(self, label, loads, statuses):
+        ok = len(loads) == 1 and all(status == 200 for status in statuses)
+        style = self.style.SUCCESS if ok else self.style.ERROR
+        self.stdout.write(style(
+            f'{label}: {len(loads)} snapshot load(s), '
+            f'{sum(status == 200 for status in statuses)}/{len(statuses)} OK'
+        ))
+        return not ok
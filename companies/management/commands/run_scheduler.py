@@ -1,10 +1,13 @@
 """
 Management command to run the activation scheduler
-Run this command periodically (e.g., every hour) using cron or task scheduler
+Run it once periodically (e.g. from cron), or as a long-lived process with --loop
 """
+import signal
+
 from django.core.management.base import BaseCommand
+from django.db import connection
 from django.utils import timezone
-from companies.models import ActivationSchedule
+from companies.scheduler import ScheduleLoop, activation_window, run_due_schedules
 
 
 class Command(BaseCommand):
@@ -16,10 +19,71 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be activated without actually activating',
         )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Run as a long-lived scheduler process (sleeps until the next schedule is due)',
+        )
+        parser.add_argument(
+            '--reload-interval',
+            type=int,
+            default=60,
+            help='With --loop: maximum seconds between checks for edited schedules (default: 60)',
+        )
+        parser.add_argument(
+            '--leader-retry-interval',
+            type=int,
+            default=10,
+            help='With --loop: seconds between leadership attempts while another node is the leader (default: 10)',
+        )
 
     def handle(self, *args, **options):
-        dry_run = options['dry_run']
-        
+        if options['loop']:
+            if options['dry_run']:
+                self.stdout.write(self.style.ERROR('[!] --dry-run cannot be combined with --loop'))
+                return
+            return self.run_loop(options['reload_interval'], options['leader_retry_interval'])
+        return self.run_once(options['dry_run'])
+
+    def run_loop(self, reload_interval, leader_retry_interval):
+        """Run the scheduler until SIGINT/SIGTERM"""
+        def on_activate(schedule, fire_time):
+            self.stdout.write(self.style.SUCCESS(
+                f'[{timezone.localtime().strftime("%Y-%m-%d %H:%M:%S")}] '
+                f'Activated company {schedule.company_id} (schedule {schedule.pk}) '
+                f'for {schedule.duration_hours} hours from {timezone.localtime(fire_time).strftime("%Y-%m-%d %H:%M")}'
+            ))
+
+        def on_leadership_change(is_leader):
+            if is_leader:
+                self.stdout.write(self.style.SUCCESS('This process is now the scheduler leader'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'Another process is the scheduler leader - standing by (retry every {leader_retry_interval}s)'
+                ))
+
+        loop = ScheduleLoop(
+            reload_interval=reload_interval,
+            leader_retry_interval=leader_retry_interval,
+            on_activate=on_activate,
+            on_leadership_change=on_leadership_change,
+        )
+        signal.signal(signal.SIGTERM, loop.stop)
+        signal.signal(signal.SIGINT, loop.stop)
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                '[!] No leader election without PostgreSQL: every scheduler process acts as the leader, '
+                'run only one --loop process'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Activation scheduler running (checking at least every {reload_interval}s) - press Ctrl+C to stop'
+        ))
+        loop.run_forever()
+        self.stdout.write(self.style.WARNING('Activation scheduler stopped'))
+
+    def run_once(self, dry_run):
         if dry_run:
             self.stdout.write(self.style.WARNING('[DRY RUN] Running in DRY RUN mode - no changes will be made'))
         
@@ -27,49 +91,26 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'Running Activation Scheduler at {timezone.now().strftime("%Y-%m-%d %H:%M:%S")}'))
         self.stdout.write('=' * 70)
         
-        # Get all active schedules
-        schedules = ActivationSchedule.objects.filter(is_active=True).select_related('company')
-        
-        if not schedules.exists():
-            self.stdout.write(self.style.WARNING('[!] No active schedules found'))
-            return
-        
-        self.stdout.write(f'\nFound {schedules.count()} active schedule(s)\n')
+        activated = run_due_schedules(dry_run=dry_run)
+        if not activated:
+            self.stdout.write(self.style.WARNING('[!] No schedules to activate'))
         
-        activated_count = 0
-        skipped_count = 0
-        
-        for schedule in schedules:
+        for schedule, fire_time in activated:
+            start, end = activation_window(schedule, fire_time)
             self.stdout.write(f'\n{"-" * 70}')
             self.stdout.write(f'Company ID: {schedule.company.id}')
-            self.stdout.write(f'Days: Sat={schedule.saturday}, Sun={schedule.sunday}, Mon={schedule.monday}, Tue={schedule.tuesday}, Wed={schedule.wednesday}, Thu={schedule.thursday}, Fri={schedule.friday}')
+            self.stdout.write(f'Days: {schedule.get_active_days_display()}')
             self.stdout.write(f'Time: {schedule.start_hour}:00 - {schedule.end_hour}:00')
             self.stdout.write(f'Duration: {schedule.duration_hours} hours')
-            
-            if schedule.should_activate_now():
-                self.stdout.write(self.style.SUCCESS('✅ [تفعيل] الجدولة جاهزة للتفعيل الآن!'))
-                
-                if dry_run:
-                    self.stdout.write(self.style.WARNING('   [تجربة] كان سيتم تفعيل الشركة'))
-                    activated_count += 1
-                else:
-                    success = schedule.activate_company()
-                    if success:
-                        self.stdout.write(self.style.SUCCESS(f'   ✅ تم تفعيل الشركة لمدة {schedule.duration_hours} ساعة'))
-                        self.stdout.write(f'   ⏰ ينتهي التفعيل في: {schedule.company.activation_end_time.strftime("%Y-%m-%d %H:%M:%S")}')
-                        activated_count += 1
-                    else:
-                        self.stdout.write(self.style.WARNING('   ⏭️ تم تخطي الشركة (مفعلة بالفعل في هذه الساعة)'))
-                        skipped_count += 1
+            if dry_run:
+                self.stdout.write(self.style.WARNING('   [تجربة] كان سيتم تفعيل الشركة'))
             else:
-                self.stdout.write(self.style.WARNING('⏭️ تم تخطي الشركة (خارج نطاق الجدولة - ليس الآن وقت التفعيل)'))
-                skipped_count += 1
+                self.stdout.write(self.style.SUCCESS(f'   ✅ تم تفعيل الشركة لمدة {schedule.duration_hours} ساعة'))
+                self.stdout.write(f'   ⏰ ينتهي التفعيل في: {timezone.localtime(end).strftime("%Y-%m-%d %H:%M:%S")}')
         
         self.stdout.write(f'\n{"=" * 70}')
-        self.stdout.write(self.style.SUCCESS(f'[OK] Activated: {activated_count}'))
-        self.stdout.write(self.style.WARNING(f'[SKIP] Skipped: {skipped_count}'))
+        self.stdout.write(self.style.SUCCESS(f'[OK] Activated: {len(activated)}'))
         self.stdout.write('=' * 70)
         
         if dry_run:
             self.stdout.write(self.style.WARNING('\n[!] DRY RUN completed - no changes were made'))
-
@@ -0,0 +1,151 @@
+"""
+Management command to simulate activation schedules over a time range
+Shows which companies will be active at each step and the peak concurrency
+"""
+import csv
+import json
+import sys
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from companies.models import ActivationSchedule
+from companies.scheduler import HOURS_PER_WEEK, week_hour_mask, week_hour_slot
+
+
+def parse_time_arg(value):
+    """Parse a --from/--to value (ISO date or datetime, Saudi time if naive)"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid date/time: {value}')
+        parsed = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Simulate which companies are active at each hour of a time range (CSV/JSON) and report peak concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='start',
+            help='Start of the range (ISO date or datetime, default: the current hour)',
+        )
+        parser.add_argument(
+            '--to',
+            dest='end',
+            help='End of the range, exclusive (default: 7 days after --from)',
+        )
+        parser.add_argument(
+            '--step',
+            type=int,
+            default=1,
+            help='Step in hours between samples (default: 1)',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            default='csv',
+            help='Output format (default: csv)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the matrix to this file instead of stdout',
+        )
+
+    def handle(self, *args, **options):
+        if options['start']:
+            start = parse_time_arg(options['start'])
+        else:
+            start = timezone.localtime().replace(minute=0, second=0, microsecond=0)
+        end = parse_time_arg(options['end']) if options['end'] else start + timedelta(days=7)
+        if end <= start:
+            raise CommandError('--to must be after --from')
+        if options['step'] < 1:
+            raise CommandError('--step must be at least 1 hour')
+
+        company_ids, company_names, slot_sets = self.build_slot_sets()
+        times = []
+        current = start
+        while current < end:
+            times.append(current)
+            current += timedelta(hours=options['step'])
+
+        # One bitset of companies per sample: a single lookup, no per-schedule work
+        samples = [slot_sets[week_hour_slot(when)] for when in times]
+        counts = [bits.bit_count() for bits in samples]
+
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            if options['format'] == 'json':
+                self.write_json(output, start, end, options['step'], company_ids, company_names, times, samples, counts)
+            else:
+                self.write_csv(output, company_ids, times, samples, counts)
+        finally:
+            if options['output']:
+                output.close()
+
+        peak = max(counts) if counts else 0
+        peak_times = [when for when, count in zip(times, counts) if count == peak]
+        # Summary goes to stderr so it never mixes with a matrix written to stdout
+        self.stderr.write(self.style.SUCCESS(
+            f'Simulated {len(times)} step(s) for {len(company_ids)} scheduled companies: '
+            f'peak concurrency {peak}'
+            + (f' first at {timezone.localtime(peak_times[0]).strftime("%Y-%m-%d %H:%M")}' if peak else '')
+        ))
+
+    def build_slot_sets(self):
+        """
+        For each of the 168 week hours, the set of active companies as a bitset
+        (bit i = i-th company).
+        """
+        company_masks = {}
+        company_names = {}
+        schedules = ActivationSchedule.objects.filter(is_active=True).select_related('company')
+        for schedule in schedules:
+            company_masks[schedule.company_id] = company_masks.get(schedule.company_id, 0) | week_hour_mask(schedule)
+            company_names[schedule.company_id] = schedule.company.name
+
+        company_ids = sorted(company_masks)
+        slot_sets = [0] * HOURS_PER_WEEK
+        for index, company_id in enumerate(company_ids):
+            mask = company_masks[company_id]
+            for slot in range(HOURS_PER_WEEK):
+                if mask >> slot & 1:
+                    slot_sets[slot] |= 1 << index
+        return company_ids, company_names, slot_sets
+
+    def write_csv(self, output, company_ids, times, samples, counts):
+        writer = csv.writer(output)
+        writer.writerow(['time', 'active_count'] + company_ids)
+        for when, bits, count in zip(times, samples, counts):
+            writer.writerow(
+                [timezone.localtime(when).isoformat(), count]
+                + [bits >> index & 1 for index in range(len(company_ids))]
+            )
+
+    def write_json(self, output, start, end, step, company_ids, company_names, times, samples, counts):
+        peak = max(counts) if counts else 0
+        timeline = [
+            {
+                'time': timezone.localtime(when).isoformat(),
+                'active_count': count,
+                'active_companies': [company_id for index, company_id in enumerate(company_ids) if bits >> index & 1],
+            }
+            for when, bits, count in zip(times, samples, counts)
+        ]
+        json.dump({
+            'from': timezone.localtime(start).isoformat(),
+            'to': timezone.localtime(end).isoformat(),
+            'step_hours': step,
+            'companies': [{'id': company_id, 'name': company_names[company_id]} for company_id in company_ids],
+            'timeline': timeline,
+            'peak_concurrency': peak,
+            'peak_times': [entry['time'] for entry in timeline if entry['active_count'] == peak] if peak else [],
+        }, output, ensure_ascii=False, indent=2)
+        output.write('\n')
@@ -1,8 +1,11 @@
 """
 Middleware for automatic activation based on schedules
 """
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils import timezone
-from .models import ActivationSchedule
+from .scheduler import run_due_schedules
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,39 +15,54 @@ class ScheduleActivationMiddleware:
     """
     Middleware to check and activate companies based on schedules
     Runs on every request to ensure timely activation
+    
+    Set SCHEDULE_ACTIVATION_MIDDLEWARE=False when the dedicated scheduler
+    (``manage.py run_scheduler --loop``) is running, so requests never do
+    scheduler work.
+    
+    Supports both WSGI and ASGI, so async views are not switched to a
+    thread for every request.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
+        if not getattr(settings, 'SCHEDULE_ACTIVATION_MIDDLEWARE', True):
+            raise MiddlewareNotUsed('Schedule activation is handled by run_scheduler --loop')
+        
         self.get_response = get_response
         self.last_check = None
         self.check_interval = 1  # Check every 1 second
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
-        # Check if it's time to run the scheduler
-        now = timezone.now()
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         
-        if self.last_check is None or (now - self.last_check).total_seconds() >= self.check_interval:
-            self.last_check = now
+        if self.is_check_due():
             self.run_scheduler()
         
         response = self.get_response(request)
         return response
     
+    async def __acall__(self, request):
+        if self.is_check_due():
+            await sync_to_async(self.run_scheduler)()
+        
+        return await self.get_response(request)
+    
+    def is_check_due(self):
+        """Check if it's time to run the scheduler"""
+        now = timezone.now()
+        if self.last_check is None or (now - self.last_check).total_seconds() >= self.check_interval:
+            self.last_check = now
+            return True
+        return False
+    
     def run_scheduler(self):
-        """Run the activation scheduler"""
+        """Run the activation scheduler (due rows are claimed, so other nodes skip them)"""
         try:
-            # Get all active schedules
-            schedules = ActivationSchedule.objects.filter(is_active=True).select_related('company')
-            
-            for schedule in schedules:
-                if schedule.should_activate_now():
-                    # Activate company with scheduled hour to ensure activation starts at exact hour
-                    schedule.company.activate_now(hours=schedule.duration_hours, scheduled_hour=schedule.start_hour, scheduled_end_hour=schedule.end_hour)
-                    schedule.last_activation = timezone.now()
-                    schedule.save()
-                    
-                    logger.info(f"Auto-activated: {schedule.company.name} for {schedule.duration_hours} hours at {schedule.start_hour}:00")
-        
-        except Exception as e:
-            logger.error(f"Error in schedule activation middleware: {e}")
-
+            run_due_schedules()
+        except Exception:
+            logger.exception("Error in schedule activation middleware")
@@ -0,0 +1,113 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:07
+
+import json
+
+import companies.prizes
+from django.db import migrations, models
+
+
+# Frozen copies of the companies.prizes helpers as they were when this
+# migration was written (later changes to the app must not change it)
+def _clean_prize_names(prizes):
+    names = []
+    for prize in prizes or []:
+        name = str(prize).strip() if prize is not None else ''
+        if name:
+            names.append(name)
+    return names
+
+
+def _equal_percentages(count):
+    if count <= 0:
+        return []
+    equal_percentage = 100 // count
+    percentages = [equal_percentage] * count
+    percentages[-1] += 100 - (equal_percentage * count)
+    return percentages
+
+
+def _build_prize_config(prizes, weights=None, colors=None):
+    names = _clean_prize_names(prizes)
+    if not names:
+        return []
+    if not weights or len(weights) != len(names):
+        weights = _equal_percentages(len(names))
+    colors = [str(c) for c in (colors or []) if c]
+    return [
+        {
+            'name': name,
+            'weight': weights[i],
+            'color': colors[i % len(colors)] if colors else None,
+            'order': i,
+        }
+        for i, name in enumerate(names)
+    ]
+
+
+def _as_list(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value.split(',')
+    return value or []
+
+
+def backfill_prize_config(apps, schema_editor):
+    """Move prize percentages out of Company.notes into prize_config"""
+    Company = apps.get_model('companies', 'Company')
+    for company in Company.objects.all().iterator():
+        percentages = None
+        notes = company.notes
+        if notes:
+            try:
+                notes_data = json.loads(notes)
+            except (json.JSONDecodeError, TypeError):
+                notes_data = None
+            if isinstance(notes_data, dict) and 'prize_percentages' in notes_data:
+                percentages = notes_data.pop('prize_percentages')
+                notes_data.pop('prizes_with_percentages', None)
+                notes = json.dumps(notes_data, ensure_ascii=False) if notes_data else None
+        if not isinstance(percentages, list) or not all(
+            isinstance(p, (int, float)) and not isinstance(p, bool) for p in percentages
+        ):
+            percentages = None
+
+        company.prize_config = _build_prize_config(
+            _as_list(company.prizes),
+            weights=percentages,
+            colors=_as_list(company.colors),
+        )
+        company.notes = notes
+        company.save(update_fields=['prize_config', 'notes'])
+
+
+def restore_notes_percentages(apps, schema_editor):
+    """Write prize percentages back into Company.notes"""
+    Company = apps.get_model('companies', 'Company')
+    for company in Company.objects.exclude(prize_config=[]).iterator():
+        config = sorted(company.prize_config, key=lambda entry: entry['order'])
+        company.notes = json.dumps({
+            'prize_percentages': [entry['weight'] for entry in config],
+            'prizes_with_percentages': [
+                {'name': entry['name'], 'percentage': entry['weight']}
+                for entry in config
+            ],
+        }, ensure_ascii=False)
+        company.save(update_fields=['notes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0007_fix_django_session_expire_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='prize_config',
+            field=models.JSONField(blank=True, default=list, help_text='الاسم والنسبة واللون والترتيب لكل جائزة - يتم تحديثها تلقائياً من الجوائز والألوان', validators=[companies.prizes.validate_prize_config], verbose_name='إعدادات الجوائز'),
+        ),
+        migrations.RunPython(backfill_prize_config, restore_notes_percentages),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:12
+
+from datetime import datetime, timedelta, time as dt_time
+
+from django.db import migrations, models
+from django.utils import timezone
+
+DAY_FIELDS = [
+    ('monday', 0), ('tuesday', 1), ('wednesday', 2), ('thursday', 3),
+    ('friday', 4), ('saturday', 5), ('sunday', 6),
+]
+
+
+# Frozen copy of companies.scheduler.compute_next_fire_time as it was when
+# this migration was written
+def _next_fire_time(active_days, start_hour, after):
+    """First fire time strictly after ``after`` (``None`` if no days are selected)"""
+    if not active_days:
+        return None
+    tz = timezone.get_current_timezone()
+    local_after = after.astimezone(tz)
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if day.weekday() not in active_days:
+            continue
+        fire_time = datetime.combine(day, dt_time(hour=start_hour), tzinfo=tz)
+        if fire_time > local_after:
+            return fire_time
+    return None
+
+
+def backfill_next_activation_at(apps, schema_editor):
+    """Compute next_activation_at for existing schedules"""
+    ActivationSchedule = apps.get_model('companies', 'ActivationSchedule')
+    for schedule in ActivationSchedule.objects.all().iterator():
+        active_days = [weekday for field, weekday in DAY_FIELDS if getattr(schedule, field)]
+        created_at = schedule.created_at or timezone.now()
+        after = created_at.replace(minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
+        if schedule.last_activation and schedule.last_activation > after:
+            after = schedule.last_activation
+        schedule.next_activation_at = _next_fire_time(
+            active_days, schedule.start_hour, after
+        )
+        schedule.save(update_fields=['next_activation_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0008_company_prize_config'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activationschedule',
+            name='next_activation_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='يُحسب تلقائياً من أيام وساعة البداية ويستخدمه المُجدول لمعرفة الجداول المستحقة', null=True, verbose_name='التفعيل القادم'),
+        ),
+        migrations.AddIndex(
+            model_name='activationschedule',
+            index=models.Index(fields=['is_active', 'next_activation_at'], name='schedule_due_idx'),
+        ),
+        migrations.RunPython(backfill_next_activation_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:13
+
+import django.core.validators
+from django.db import migrations, models
+
+# Day column -> weekday (0=Monday, 6=Sunday); the bit is 1 << weekday
+DAY_FIELDS = [
+    ('monday', 0), ('tuesday', 1), ('wednesday', 2), ('thursday', 3),
+    ('friday', 4), ('saturday', 5), ('sunday', 6),
+]
+
+
+def booleans_to_mask(apps, schema_editor):
+    """Fold the seven day columns into active_days"""
+    ActivationSchedule = apps.get_model('companies', 'ActivationSchedule')
+    for schedule in ActivationSchedule.objects.all().iterator():
+        schedule.active_days = sum(
+            1 << weekday for field, weekday in DAY_FIELDS if getattr(schedule, field)
+        )
+        schedule.save(update_fields=['active_days'])
+
+
+def mask_to_booleans(apps, schema_editor):
+    """Expand active_days back into the seven day columns"""
+    ActivationSchedule = apps.get_model('companies', 'ActivationSchedule')
+    for schedule in ActivationSchedule.objects.all().iterator():
+        for field, weekday in DAY_FIELDS:
+            setattr(schedule, field, bool(schedule.active_days & (1 << weekday)))
+        schedule.save(update_fields=[field for field, _weekday in DAY_FIELDS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0009_activationschedule_next_activation_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activationschedule',
+            name='active_days',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MaxValueValidator(127)], verbose_name='أيام التفعيل'),
+        ),
+        migrations.RunPython(booleans_to_mask, mask_to_booleans),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='friday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='monday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='saturday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='sunday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='thursday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='tuesday',
+        ),
+        migrations.RemoveField(
+            model_name='activationschedule',
+            name='wednesday',
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:19
+
+from datetime import datetime, timedelta, time as dt_time
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+WINDOW_HORIZON = timedelta(days=7)
+
+
+# Same rule as companies.scheduler.compute_next_fire_time, kept here so the
+# backfill doesn't change with the app code
+def _next_fire_time(active_days, start_hour, after):
+    """First fire time strictly after ``after`` (``None`` if no days are selected)"""
+    if not active_days:
+        return None
+    tz = django.utils.timezone.get_current_timezone()
+    local_after = after.astimezone(tz)
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if day.weekday() not in active_days:
+            continue
+        fire_time = datetime.combine(day, dt_time(hour=start_hour), tzinfo=tz)
+        if fire_time > local_after:
+            return fire_time
+    return None
+
+
+def create_range_index(apps, schema_editor):
+    """GiST index for tstzrange containment queries (Postgres only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX window_range_gist_idx ON companies_activationwindow "
+        "USING gist (tstzrange(starts_at, ends_at, '[]'))"
+    )
+
+
+def drop_range_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS window_range_gist_idx")
+
+
+def backfill_windows(apps, schema_editor):
+    """Record current company windows and plan the next week of schedule windows"""
+    Company = apps.get_model('companies', 'Company')
+    ActivationSchedule = apps.get_model('companies', 'ActivationSchedule')
+    ActivationWindow = apps.get_model('companies', 'ActivationWindow')
+    now = django.utils.timezone.now()
+
+    windows = [
+        ActivationWindow(
+            company_id=company.pk,
+            source='manual',
+            starts_at=company.activation_start_time,
+            ends_at=company.activation_end_time,
+            created_at=now,
+        )
+        for company in Company.objects.filter(
+            activation_start_time__isnull=False,
+            activation_end_time__gte=models.F('activation_start_time'),
+        ).iterator()
+    ]
+
+    for schedule in ActivationSchedule.objects.filter(is_active=True).iterator():
+        active_days = [weekday for weekday in range(7) if schedule.active_days & (1 << weekday)]
+        fire_time = _next_fire_time(active_days, schedule.start_hour, now)
+        while fire_time is not None and fire_time <= now + WINDOW_HORIZON:
+            windows.append(ActivationWindow(
+                company_id=schedule.company_id,
+                schedule_id=schedule.pk,
+                source='schedule',
+                starts_at=fire_time,
+                ends_at=fire_time + timedelta(hours=schedule.duration_hours),
+                created_at=now,
+            ))
+            fire_time = _next_fire_time(active_days, schedule.start_hour, fire_time)
+
+    ActivationWindow.objects.bulk_create(windows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0010_activationschedule_active_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivationWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('schedule', 'جدولة تلقائية'), ('manual', 'تفعيل يدوي')], default='manual', max_length=20, verbose_name='المصدر')),
+                ('starts_at', models.DateTimeField(verbose_name='بداية التفعيل')),
+                ('ends_at', models.DateTimeField(verbose_name='نهاية التفعيل')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الإنشاء')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activation_windows', to='companies.company', verbose_name='الشركة')),
+                ('schedule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='windows', to='companies.activationschedule', verbose_name='الجدولة')),
+            ],
+            options={
+                'verbose_name': 'نافذة تفعيل',
+                'verbose_name_plural': 'نوافذ التفعيل',
+                'ordering': ['-starts_at'],
+                'indexes': [models.Index(fields=['company', 'starts_at'], name='window_company_start_idx'), models.Index(fields=['starts_at'], name='window_start_idx'), models.Index(fields=['ends_at'], name='window_end_idx')],
+                'constraints': [models.UniqueConstraint(fields=('schedule', 'starts_at'), name='unique_schedule_window'), models.CheckConstraint(condition=models.Q(('ends_at__gte', models.F('starts_at'))), name='window_ends_after_start')],
+            },
+        ),
+        migrations.RunPython(create_range_index, drop_range_index),
+        migrations.RunPython(backfill_windows, migrations.RunPython.noop),
+    ]
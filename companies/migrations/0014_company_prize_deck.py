@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:33
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0013_company_public_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrizeDeck',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='prize_deck', serialize=False, to='companies.company', verbose_name='الشركة')),
+                ('config_key', models.CharField(max_length=32, verbose_name='مفتاح إعدادات الجوائز')),
+                ('outcomes', models.BinaryField(verbose_name='نتائج المجموعة')),
+                ('size', models.PositiveIntegerField(verbose_name='حجم المجموعة')),
+                ('position', models.PositiveIntegerField(default=0, verbose_name='عدد الدورات المستخدمة')),
+                ('generation', models.PositiveIntegerField(default=1, verbose_name='رقم المجموعة')),
+                ('dealt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ التوزيع')),
+            ],
+            options={
+                'verbose_name': 'مجموعة جوائز',
+                'verbose_name_plural': 'مجموعات الجوائز',
+            },
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='prize_deck_size',
+            field=models.PositiveIntegerField(default=100, help_text='عدد الدورات في كل مجموعة (لطريقة المجموعة المسبقة فقط)', validators=[django.core.validators.MinValueValidator(10), django.core.validators.MaxValueValidator(10000)], verbose_name='حجم مجموعة الجوائز'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='prize_mode',
+            field=models.CharField(choices=[('weighted', 'سحب عشوائي حسب النسب'), ('deck', 'مجموعة مسبقة بالنسب الدقيقة')], default='weighted', help_text='السحب العشوائي يختار كل جائزة حسب نسبتها، والمجموعة المسبقة توزع الجوائز بالنسب المحددة تماماً في كل مجموعة', max_length=10, verbose_name='طريقة توزيع الجوائز'),
+        ),
+    ]
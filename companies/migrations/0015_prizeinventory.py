@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0014_company_prize_deck'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrizeInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prize', models.CharField(max_length=200, verbose_name='الجائزة')),
+                ('stock', models.PositiveIntegerField(blank=True, help_text='العدد المتبقي من الجائزة - اتركه فارغاً لعدد غير محدود', null=True, verbose_name='المخزون المتبقي')),
+                ('daily_limit', models.PositiveIntegerField(blank=True, help_text='أقصى عدد يُمنح من الجائزة في اليوم - اتركه فارغاً لعدد غير محدود', null=True, verbose_name='الحد اليومي')),
+                ('given_today', models.PositiveIntegerField(default=0, editable=False, verbose_name='الممنوح اليوم')),
+                ('day', models.DateField(blank=True, editable=False, null=True, verbose_name='يوم العد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prize_inventory', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'مخزون جائزة',
+                'verbose_name_plural': 'مخزون الجوائز',
+                'constraints': [models.UniqueConstraint(fields=('company', 'prize'), name='prize_inventory_unique')],
+            },
+        ),
+    ]
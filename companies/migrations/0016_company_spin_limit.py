@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:38
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0015_prizeinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='spin_limit_count',
+            field=models.PositiveSmallIntegerField(default=1, help_text='أقصى عدد من المحاولات لكل زائر خلال المدة', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(100)], verbose_name='عدد المحاولات المسموح'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='spin_limit_period',
+            field=models.CharField(choices=[('day', 'يومياً'), ('activation', 'لكل فترة تفعيل'), ('event', 'طوال الفعالية')], default='day', max_length=10, verbose_name='مدة حد المحاولات'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='spin_limit_scope',
+            field=models.CharField(choices=[('none', 'بدون حد'), ('phone', 'لكل رقم جوال'), ('session', 'لكل جهاز (جلسة المتصفح)')], default='none', help_text='لكل رقم جوال يجعل رقم الجوال إلزامياً في صفحة اللعب', max_length=10, verbose_name='حد المحاولات'),
+        ),
+    ]
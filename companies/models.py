@@ -1,16 +1,74 @@
 """
 Company models for Dawerha platform
 """
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 from django.core.validators import MinLengthValidator, MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils.text import slugify
+from .prizes import build_prize_config, get_prize_sampler, sync_prize_config, validate_prize_config
+from .utils import generate_public_token
 import json
 import random
 import string
 
 
+class CompanyQuerySet(models.QuerySet):
+    """
+    Activation state queries.
+
+    "Active now" is the test of Company.is_currently_active in SQL: the
+    company's own activation window, which only an activation writes. The
+    ActivationWindow table also holds the planned windows of schedules, so
+    it answers the upcoming and expired queries but not "active now" (a
+    planned window is not active until the scheduler activates it).
+    """
+
+    def active_now(self, when=None):
+        """Active companies inside their activation window at ``when`` (default: now)"""
+        when = when or timezone.now()
+        active_hours = models.ExpressionWrapper(
+            models.F('active_hours') * timezone.timedelta(hours=1),
+            output_field=models.DurationField(),
+        )
+        window_end = models.F('activation_start_time') + active_hours
+        return self.filter(is_active=True, activation_start_time__lte=when).alias(
+            window_end=window_end,
+        ).filter(
+            models.Q(activation_end_time__gte=when) |
+            models.Q(activation_end_time__isnull=True, window_end__gte=when)
+        )
+
+    def permanently_active(self):
+        """Active companies with no activation window (see Company.is_currently_active)"""
+        return self.filter(is_active=True, activation_start_time__isnull=True)
+
+    def currently_active(self, when=None):
+        """Companies that are active now, in a window or permanently"""
+        return self.filter(
+            models.Q(pk__in=self.model.objects.active_now(when).values('pk')) |
+            models.Q(pk__in=self.model.objects.permanently_active().values('pk'))
+        )
+
+    def upcoming(self, hours=None, when=None):
+        """Companies with a window starting after ``when`` (within ``hours``, if given)"""
+        return self.filter(
+            pk__in=ActivationWindow.objects.upcoming(hours, when).values('company_id'),
+        )
+
+    def expired(self, when=None):
+        """Active companies whose windows have all ended"""
+        windows = ActivationWindow.objects
+        return self.filter(
+            is_active=True,
+            pk__in=windows.expired(when).values('company_id'),
+        ).exclude(
+            pk__in=self.model.objects.currently_active(when).values('pk'),
+        ).exclude(
+            pk__in=windows.upcoming(when=when).values('company_id'),
+        )
+
+
 class Company(models.Model):
     """
     Company model for storing business information
@@ -35,6 +93,23 @@ class Company(models.Model):
         ('inactive', 'غير نشط'),
     ]
     
+    PRIZE_MODE_CHOICES = [
+        ('weighted', 'سحب عشوائي حسب النسب'),
+        ('deck', 'مجموعة مسبقة بالنسب الدقيقة'),
+    ]
+    
+    SPIN_LIMIT_SCOPE_CHOICES = [
+        ('none', 'بدون حد'),
+        ('phone', 'لكل رقم جوال'),
+        ('session', 'لكل جهاز (جلسة المتصفح)'),
+    ]
+    
+    SPIN_LIMIT_PERIOD_CHOICES = [
+        ('day', 'يومياً'),
+        ('activation', 'لكل فترة تفعيل'),
+        ('event', 'طوال الفعالية'),
+    ]
+    
     # Basic Information
     name = models.CharField(
         max_length=200, 
@@ -48,6 +123,14 @@ class Company(models.Model):
         verbose_name="الرابط الفريد",
         help_text="سيتم إنشاؤه تلقائياً من اسم الجهة"
     )
+    public_token = models.CharField(
+        max_length=32,
+        unique=True,
+        editable=False,
+        default=generate_public_token,
+        verbose_name="رمز الرابط العام",
+        help_text="يُستخدم في روابط اللعب والتسجيل العامة"
+    )
     type = models.CharField(
         max_length=50, 
         choices=TYPE_CHOICES,
@@ -80,6 +163,45 @@ class Company(models.Model):
         default=list,
         verbose_name="الألوان"
     )
+    prize_config = models.JSONField(
+        default=list,
+        blank=True,
+        validators=[validate_prize_config],
+        verbose_name="إعدادات الجوائز",
+        help_text="الاسم والنسبة واللون والترتيب لكل جائزة - يتم تحديثها تلقائياً من الجوائز والألوان"
+    )
+    prize_mode = models.CharField(
+        max_length=10,
+        choices=PRIZE_MODE_CHOICES,
+        default='weighted',
+        verbose_name="طريقة توزيع الجوائز",
+        help_text="السحب العشوائي يختار كل جائزة حسب نسبتها، والمجموعة المسبقة توزع الجوائز بالنسب المحددة تماماً في كل مجموعة"
+    )
+    prize_deck_size = models.PositiveIntegerField(
+        default=100,
+        validators=[MinValueValidator(10), MaxValueValidator(10000)],
+        verbose_name="حجم مجموعة الجوائز",
+        help_text="عدد الدورات في كل مجموعة (لطريقة المجموعة المسبقة فقط)"
+    )
+    spin_limit_scope = models.CharField(
+        max_length=10,
+        choices=SPIN_LIMIT_SCOPE_CHOICES,
+        default='none',
+        verbose_name="حد المحاولات",
+        help_text="لكل رقم جوال يجعل رقم الجوال إلزامياً في صفحة اللعب"
+    )
+    spin_limit_period = models.CharField(
+        max_length=10,
+        choices=SPIN_LIMIT_PERIOD_CHOICES,
+        default='day',
+        verbose_name="مدة حد المحاولات"
+    )
+    spin_limit_count = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1), MaxValueValidator(100)],
+        verbose_name="عدد المحاولات المسموح",
+        help_text="أقصى عدد من المحاولات لكل زائر خلال المدة"
+    )
     
     # Status and Management
     status = models.CharField(
@@ -136,6 +258,15 @@ class Company(models.Model):
         verbose_name="ملاحظات"
     )
     
+    # Bumped on every change so the cached game snapshot is rebuilt
+    config_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="إصدار الإعدادات"
+    )
+    
+    objects = CompanyQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "شركة"
         verbose_name_plural = "الشركات"
@@ -168,7 +299,24 @@ class Company(models.Model):
             
             self.slug = unique_slug
         
-        super().save(*args, **kwargs)
+        # Keep the structured prize configuration in sync with prizes/colors,
+        # carrying over the stored weight of every prize that still exists
+        self.prize_config = sync_prize_config(
+            self.prize_config,
+            self.get_prizes_list(),
+            colors=self.get_colors_list(),
+        )
+        
+        # Bump config_version so the cached game snapshot is rebuilt
+        from .snapshots import company_snapshots, versioned_save
+        versioned_save(company_snapshots, self, super().save, *args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """Delete the company and drop its cached game snapshot"""
+        from .snapshots import company_snapshots
+        result = super().delete(*args, **kwargs)
+        company_snapshots.forget([self.public_token])
+        return result
     
     @property
     def final_type(self):
@@ -177,14 +325,9 @@ class Company(models.Model):
     
     @property
     def company_url(self):
-        """Generate company game URL with encrypted token"""
+        """Generate company game URL with the public token"""
         from django.urls import reverse
-        from .utils import encrypt_slug
-        token = encrypt_slug(self.slug)
-        if token:
-            return reverse('game:play', kwargs={'token': token})
-        # Fallback to slug if encryption fails
-        return reverse('game:play', kwargs={'token': self.slug})
+        return reverse('game:play', kwargs={'token': self.public_token})
     
     @property
     def calculated_active_hours(self):
@@ -215,7 +358,7 @@ class Company(models.Model):
             return 'active'
         
         # If company has schedules but not currently active, show as scheduled
-        if self.schedules.filter(is_active=True).exists():
+        if self.has_active_schedules:
             return 'scheduled'
         
         # If company is not active, show as inactive
@@ -245,12 +388,27 @@ class Company(models.Model):
         else:
             return "غير محدد"
     
+    @property
+    def has_active_schedules(self):
+        """
+        Check if company has at least one active schedule.
+        Uses the ``active_schedules_count`` annotation when the queryset provides it.
+        """
+        annotated = getattr(self, 'active_schedules_count', None)
+        if annotated is not None:
+            return annotated > 0
+        return self.schedules.filter(is_active=True).exists()
+    
     @property
     def is_currently_active(self):
-        """Check if company is currently active based on time window and schedules"""
-        # First, check schedules and auto-activate if needed
-        self._check_and_activate_from_schedule()
+        """
+        Check if company is currently active based on its stored activation window.
         
+        This is a pure computation over the company's own columns: it never
+        queries the schedules table or writes. Schedule-driven activation
+        happens in the scheduler (middleware / run_scheduler), which updates
+        the activation window.
+        """
         # If company is not active, return False
         if not self.is_active:
             return False
@@ -303,25 +461,6 @@ class Company(models.Model):
         else:
             return "غير مفعل"
     
-    def _check_and_activate_from_schedule(self):
-        """Check schedules and auto-activate if needed"""
-        # Get active schedules for this company
-        active_schedules = self.schedules.filter(is_active=True)
-        
-        for schedule in active_schedules:
-            if schedule.should_activate_now():
-                # Check if already activated recently
-                if schedule.last_activation:
-                    time_since_last = timezone.now() - schedule.last_activation
-                    if time_since_last.total_seconds() < (schedule.duration_hours * 3600):
-                        continue  # Still within activation period
-                
-                # Activate company with scheduled hour
-                self.activate_now(hours=schedule.duration_hours, scheduled_hour=schedule.start_hour, scheduled_end_hour=schedule.end_hour)
-                schedule.last_activation = timezone.now()
-                schedule.save()
-                break  # Only activate from one schedule at a time
-    
     def approve(self):
         """Approve the company"""
         self.status = 'approved'
@@ -337,53 +476,22 @@ class Company(models.Model):
             scheduled_hour: If provided, set start time to the beginning of that hour
             scheduled_end_hour: If provided, set end time to the end of that hour
         """
+        from .activation import compute_activation_window
+        
         if hours is None:
             hours = self.active_hours
         
         self.is_active = True
-        
-        # If scheduled_hour is provided, set start/end times based on schedule
-        if scheduled_hour is not None:
-            now = timezone.now()
-            saudi_time = now.astimezone(timezone.get_current_timezone())
-            
-            # Set start time to the beginning of the scheduled hour
-            saudi_start = saudi_time.replace(hour=scheduled_hour, minute=0, second=0, microsecond=0)
-            
-            # If the scheduled time is in the past, use current time instead
-            if saudi_start <= saudi_time:
-                # Use current time as start (immediate activation)
-                self.activation_start_time = now
-            else:
-                # Use the scheduled hour start time
-                self.activation_start_time = saudi_start
-            
-            # Set end time based on scheduled_end_hour if provided
-            if scheduled_end_hour is not None:
-                # Calculate end time at the end of the scheduled hour
-                if saudi_start <= saudi_time:
-                    # If we started now, calculate end based on current time
-                    saudi_end = saudi_time.replace(hour=scheduled_end_hour, minute=0, second=0, microsecond=0)
-                    # If end hour has passed today, schedule for tomorrow
-                    if saudi_end <= saudi_time:
-                        saudi_end = saudi_end + timezone.timedelta(days=1)
-                    self.activation_end_time = saudi_end
-                else:
-                    # Started at scheduled time, calculate end normally
-                    saudi_end = saudi_start.replace(hour=scheduled_end_hour, minute=0, second=0, microsecond=0)
-                    # Handle cross-midnight
-                    if scheduled_end_hour < scheduled_hour:
-                        saudi_end = saudi_end + timezone.timedelta(days=1)
-                    self.activation_end_time = saudi_end
-            else:
-                # Use duration if no end_hour specified
-                self.activation_end_time = self.activation_start_time + timezone.timedelta(hours=hours)
-        else:
-            # Normal activation - start from now
-            self.activation_start_time = timezone.now()
-            self.activation_end_time = timezone.now() + timezone.timedelta(hours=hours)
-        
+        self.activation_start_time, self.activation_end_time = compute_activation_window(
+            timezone.now(),
+            hours,
+            scheduled_hour=scheduled_hour,
+            scheduled_end_hour=scheduled_end_hour,
+        )
         self.save()
+        
+        from .activation import record_windows
+        record_windows([(self, None, self.activation_start_time, self.activation_end_time)])
     
     def reject(self):
         """Reject the company"""
@@ -408,6 +516,91 @@ class Company(models.Model):
             except json.JSONDecodeError:
                 return self.colors.split(',')
         return self.colors if self.colors else []
+    
+    def get_prize_config(self):
+        """Get the structured prize configuration ordered for the wheel"""
+        if self.prize_config:
+            # Stored in wheel order by build_prize_config
+            return self.prize_config
+        # Unsaved instance - derive it from the raw prizes/colors
+        return build_prize_config(self.get_prizes_list(), colors=self.get_colors_list())
+    
+    def get_prize_names(self):
+        """Get normalized prize names in wheel order"""
+        return [entry['name'] for entry in self.get_prize_config()]
+    
+    def get_prize_percentages(self):
+        """Get prize weights in wheel order"""
+        return [entry['weight'] for entry in self.get_prize_config()]
+    
+    def set_prize_percentages(self, percentages):
+        """Set prize weights (same order and length as the prizes)"""
+        self.prize_config = build_prize_config(
+            self.get_prize_names(),
+            weights=percentages,
+            colors=self.get_colors_list(),
+        )
+    
+    @property
+    def prize_sampler(self):
+        """Compiled ready-to-sample form of the prize configuration"""
+        return get_prize_sampler(self)
+
+
+# Weekdays use Python numbering (0=Monday, 6=Sunday), listed in Arabic week order
+WEEKDAY_CHOICES = [
+    (5, 'السبت'),
+    (6, 'الأحد'),
+    (0, 'الاثنين'),
+    (1, 'الثلاثاء'),
+    (2, 'الأربعاء'),
+    (3, 'الخميس'),
+    (4, 'الجمعة'),
+]
+ALL_DAYS_MASK = 0b1111111
+
+
+def weekday_bit(weekday):
+    """Bit of a weekday (0=Monday, 6=Sunday) in ActivationSchedule.active_days"""
+    return 1 << weekday
+
+
+def days_to_mask(weekdays):
+    """Convert a list of weekdays to an active_days bitmask"""
+    mask = 0
+    for weekday in weekdays:
+        mask |= weekday_bit(int(weekday))
+    return mask
+
+
+def _weekday_property(weekday):
+    """Boolean accessor for one day of ActivationSchedule.active_days"""
+    def getter(self):
+        return self.is_active_on(weekday)
+
+    def setter(self, value):
+        if value:
+            self.active_days |= weekday_bit(weekday)
+        else:
+            self.active_days &= ~weekday_bit(weekday)
+
+    return property(getter, setter)
+
+
+class ActivationScheduleQuerySet(models.QuerySet):
+    """Queries over ActivationSchedule.active_days evaluated in SQL"""
+
+    def active_on(self, weekday):
+        """Schedules that include a weekday (0=Monday, 6=Sunday)"""
+        bit = weekday_bit(weekday)
+        return self.alias(
+            day_bit=models.F('active_days').bitand(bit)
+        ).filter(day_bit=bit)
+
+    def active_today(self):
+        """Active schedules that include today's weekday (Saudi time)"""
+        today = timezone.localtime().weekday()
+        return self.filter(is_active=True).active_on(today)
 
 
 class ActivationSchedule(models.Model):
@@ -421,14 +614,20 @@ class ActivationSchedule(models.Model):
         verbose_name="الشركة"
     )
     
-    # Days of week (ordered for Arabic calendar: Saturday to Friday)
-    saturday = models.BooleanField(default=False, verbose_name="السبت")
-    sunday = models.BooleanField(default=False, verbose_name="الأحد")
-    monday = models.BooleanField(default=False, verbose_name="الاثنين")
-    tuesday = models.BooleanField(default=False, verbose_name="الثلاثاء")
-    wednesday = models.BooleanField(default=False, verbose_name="الأربعاء")
-    thursday = models.BooleanField(default=False, verbose_name="الخميس")
-    friday = models.BooleanField(default=False, verbose_name="الجمعة")
+    # Days of week as a bitmask: bit (1 << weekday), 0=Monday ... 6=Sunday
+    active_days = models.PositiveSmallIntegerField(
+        default=0,
+        validators=[MaxValueValidator(ALL_DAYS_MASK)],
+        verbose_name="أيام التفعيل"
+    )
+    
+    saturday = _weekday_property(5)
+    sunday = _weekday_property(6)
+    monday = _weekday_property(0)
+    tuesday = _weekday_property(1)
+    wednesday = _weekday_property(2)
+    thursday = _weekday_property(3)
+    friday = _weekday_property(4)
     
     # Time settings (12-hour format with AM/PM)
     HOUR_CHOICES = [
@@ -490,6 +689,13 @@ class ActivationSchedule(models.Model):
         null=True,
         verbose_name="آخر تفعيل"
     )
+    next_activation_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="التفعيل القادم",
+        help_text="يُحسب تلقائياً من أيام وساعة البداية ويستخدمه المُجدول لمعرفة الجداول المستحقة"
+    )
     
     created_at = models.DateTimeField(
         default=timezone.now,
@@ -500,10 +706,16 @@ class ActivationSchedule(models.Model):
         verbose_name="تاريخ التحديث"
     )
     
+    objects = ActivationScheduleQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "جدولة التفعيل"
         verbose_name_plural = "جداول التفعيل"
         ordering = ['-created_at']
+        indexes = [
+            # Due schedules: WHERE is_active AND next_activation_at <= now
+            models.Index(fields=['is_active', 'next_activation_at'], name='schedule_due_idx'),
+        ]
     
     def __str__(self):
         days = self.get_active_days_display()
@@ -521,14 +733,34 @@ class ActivationSchedule(models.Model):
             # Crosses midnight: start=22, end=2 → duration=4 hours (22,23,0,1,2)
             self.duration_hours = (24 - self.start_hour) + self.end_hour
         
+        # Recompute the next fire time on full saves (the scheduler sets it
+        # explicitly together with update_fields)
+        if kwargs.get('update_fields') is None:
+            from .scheduler import pending_fire_time
+            self.next_activation_at = pending_fire_time(self)
+        
         # Save the schedule (no auto-activation - only via "activate_by_schedule" action)
         super().save(*args, **kwargs)
+        
+        # Re-plan the upcoming windows of this schedule and rebuild the
+        # company's game snapshot (it lists the active schedules)
+        if kwargs.get('update_fields') is None:
+            from .activation import rematerialize_schedule_windows
+            from .snapshots import bump_company_versions
+            rematerialize_schedule_windows(self)
+            bump_company_versions(Company.objects.filter(pk=self.company_id))
+    
+    def delete(self, *args, **kwargs):
+        """Delete the schedule and rebuild the company's game snapshot"""
+        from .snapshots import bump_company_versions
+        result = super().delete(*args, **kwargs)
+        bump_company_versions(Company.objects.filter(pk=self.company_id))
+        return result
     
     def clean(self):
         """Validate schedule"""
         # Check if at least one day is selected
-        if not any([self.saturday, self.sunday, self.monday, self.tuesday, 
-                   self.wednesday, self.thursday, self.friday]):
+        if not self.active_days:
             raise ValidationError('يجب اختيار يوم واحد على الأقل')
         
         # Validate hours
@@ -537,29 +769,18 @@ class ActivationSchedule(models.Model):
         if self.end_hour < 0 or self.end_hour > 23:
             raise ValidationError('ساعة النهاية يجب أن تكون بين 0 و 23')
     
+    def is_active_on(self, weekday):
+        """Check if a weekday (0=Monday, 6=Sunday) is one of the scheduled days"""
+        return bool(self.active_days & weekday_bit(weekday))
+    
     def get_active_days_display(self):
         """Get display of active days (in Arabic week order)"""
-        days = []
-        if self.saturday: days.append('السبت')
-        if self.sunday: days.append('الأحد')
-        if self.monday: days.append('الاثنين')
-        if self.tuesday: days.append('الثلاثاء')
-        if self.wednesday: days.append('الأربعاء')
-        if self.thursday: days.append('الخميس')
-        if self.friday: days.append('الجمعة')
+        days = [name for weekday, name in WEEKDAY_CHOICES if self.is_active_on(weekday)]
         return ', '.join(days) if days else 'لا يوجد'
     
     def get_active_days_list(self):
         """Get list of active day numbers (0=Monday, 6=Sunday)"""
-        days = []
-        if self.saturday: days.append(5)
-        if self.sunday: days.append(6)
-        if self.monday: days.append(0)
-        if self.tuesday: days.append(1)
-        if self.wednesday: days.append(2)
-        if self.thursday: days.append(3)
-        if self.friday: days.append(4)
-        return days
+        return [weekday for weekday, _name in WEEKDAY_CHOICES if self.is_active_on(weekday)]
     
     def should_activate_now(self):
         """Check if should activate based on current time - only at the exact scheduled hour"""
@@ -574,8 +795,7 @@ class ActivationSchedule(models.Model):
         current_minute = saudi_time.minute
         
         # Check if today is an active day
-        active_days = self.get_active_days_list()
-        if current_weekday not in active_days:
+        if not self.is_active_on(current_weekday):
             return False
         
         # Only activate at the exact scheduled start hour (minute 0)
@@ -621,11 +841,7 @@ class ActivationSchedule(models.Model):
         if not self.is_active:
             return False
         
-        now = timezone.now()
-        saudi_time = now.astimezone(timezone.get_current_timezone())
-        current_weekday = saudi_time.weekday()  # 0=Monday, 6=Sunday
-        active_days = self.get_active_days_list()
-        return current_weekday in active_days
+        return self.is_active_on(timezone.localtime().weekday())
     
     def should_activate_soon(self):
         """Check if should activate soon based on current time - check if within scheduled window"""
@@ -639,8 +855,7 @@ class ActivationSchedule(models.Model):
         current_minute = saudi_time.minute
         
         # Check if today is an active day
-        active_days = self.get_active_days_list()
-        if current_weekday not in active_days:
+        if not self.is_active_on(current_weekday):
             return False
         
         # Check if current hour is within activation window
@@ -670,8 +885,7 @@ class ActivationSchedule(models.Model):
         current_minute = saudi_time.minute
         
         # Check if today is an active day
-        active_days = self.get_active_days_list()
-        if current_weekday not in active_days:
+        if not self.is_active_on(current_weekday):
             return (False, False, "اليوم ليس ضمن أيام التفعيل المحددة")
         
         # Check if exactly at start_hour (minute 0)
@@ -696,15 +910,14 @@ class ActivationSchedule(models.Model):
         return (False, False, "خارج نطاق وقت التفعيل")
     
     def activate_company(self):
-        """Activate the company based on schedule"""
-        if not self.should_activate_now():
-            return False
+        """Activate the company if this schedule is due (same rules as the scheduler)"""
+        from .scheduler import activate_schedule, get_due_fire_time
         
-        # Activate company with scheduled hour
-        self.company.activate_now(hours=self.duration_hours, scheduled_hour=self.start_hour, scheduled_end_hour=self.end_hour)
-        self.last_activation = timezone.now()
-        self.save()
+        fire_time = get_due_fire_time(self)
+        if fire_time is None:
+            return False
         
+        activate_schedule(self, fire_time)
         return True
     
     def get_company_activation_status(self):
@@ -744,3 +957,256 @@ class ActivationSchedule(models.Model):
             'color': '#dc3545',
             'is_active': False
         }
+
+
+class WindowRange(models.Func):
+    """``tstzrange(start, end, '[]')`` - the expression of the GiST index on Postgres"""
+    function = 'TSTZRANGE'
+    template = "%(function)s(%(expressions)s, '[]')"
+    output_field = models.Field()
+
+
+class RangeOperator(models.Func):
+    """Boolean ``lhs <operator> rhs`` between ranges (``@>``, ``&&``, ``<<``)"""
+    template = '(%(expressions)s)'
+    output_field = models.BooleanField()
+
+    def __init__(self, lhs, operator, rhs):
+        super().__init__(lhs, rhs)
+        self.arg_joiner = f' {operator} '
+
+
+class ActivationWindowQuerySet(models.QuerySet):
+    """
+    "Active now", "upcoming" and "expired" window queries.
+
+    On Postgres each one is a range predicate on
+    ``tstzrange(starts_at, ends_at, '[]')`` served by its GiST index; other
+    databases (SQLite) compare the two columns instead.
+    """
+
+    def _uses_ranges(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    @staticmethod
+    def _at(when):
+        return models.Value(when, output_field=models.DateTimeField())
+
+    def active_at(self, when=None):
+        """Windows containing ``when`` (default: now)"""
+        when = when or timezone.now()
+        if self._uses_ranges():
+            return self.filter(RangeOperator(WindowRange('starts_at', 'ends_at'), '@>', self._at(when)))
+        return self.filter(starts_at__lte=when, ends_at__gte=when)
+
+    def upcoming(self, hours=None, when=None):
+        """Windows starting after ``when`` (within ``hours``, if given)"""
+        when = when or timezone.now()
+        queryset = self.filter(starts_at__gt=when)
+        if hours is None:
+            return queryset
+        until = when + timezone.timedelta(hours=hours)
+        if self._uses_ranges():
+            return queryset.filter(RangeOperator(
+                WindowRange('starts_at', 'ends_at'), '&&', WindowRange(self._at(when), self._at(until)),
+            ))
+        return queryset.filter(starts_at__lte=until)
+
+    def expired(self, when=None):
+        """Windows that ended before ``when``"""
+        when = when or timezone.now()
+        if self._uses_ranges():
+            return self.filter(RangeOperator(
+                WindowRange('starts_at', 'ends_at'), '<<', WindowRange(self._at(when), models.Value(None)),
+            ))
+        return self.filter(ends_at__lt=when)
+
+
+class ActivationWindow(models.Model):
+    """
+    A period in which a company is, was or will be active.
+
+    Past windows are kept as history. The upcoming windows of active
+    schedules are created ahead of time (see companies.activation).
+    """
+    SOURCE_CHOICES = [
+        ('schedule', 'جدولة تلقائية'),
+        ('manual', 'تفعيل يدوي'),
+    ]
+    
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='activation_windows',
+        verbose_name="الشركة"
+    )
+    schedule = models.ForeignKey(
+        ActivationSchedule,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='windows',
+        verbose_name="الجدولة"
+    )
+    source = models.CharField(
+        max_length=20,
+        choices=SOURCE_CHOICES,
+        default='manual',
+        verbose_name="المصدر"
+    )
+    starts_at = models.DateTimeField(verbose_name="بداية التفعيل")
+    ends_at = models.DateTimeField(verbose_name="نهاية التفعيل")
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="تاريخ الإنشاء"
+    )
+    
+    objects = ActivationWindowQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = "نافذة تفعيل"
+        verbose_name_plural = "نوافذ التفعيل"
+        ordering = ['-starts_at']
+        # On Postgres migration 0011 also adds a GiST index on tstzrange(starts_at, ends_at, '[]')
+        indexes = [
+            models.Index(fields=['company', 'starts_at'], name='window_company_start_idx'),
+            models.Index(fields=['starts_at'], name='window_start_idx'),
+            models.Index(fields=['ends_at'], name='window_end_idx'),
+        ]
+        constraints = [
+            # One window per schedule fire time (manual windows have no schedule)
+            models.UniqueConstraint(fields=['schedule', 'starts_at'], name='unique_schedule_window'),
+            models.CheckConstraint(condition=models.Q(ends_at__gte=models.F('starts_at')), name='window_ends_after_start'),
+        ]
+    
+    def __str__(self):
+        return f"{self.company.name} - {self.get_source_display()}"
+
+
+class PrizeDeck(models.Model):
+    """
+    Pre-dealt shuffled prize outcomes of a company in deck mode.
+
+    Spins pop the next outcome with a single conditional UPDATE of
+    ``position`` (see companies.decks). The deck is dealt again when it runs
+    out or when the prizes, weights or deck size change.
+    """
+    company = models.OneToOneField(
+        Company,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='prize_deck',
+        verbose_name="الشركة"
+    )
+    config_key = models.CharField(
+        max_length=32,
+        verbose_name="مفتاح إعدادات الجوائز"
+    )
+    # One byte per spin: the index of the prize in wheel order
+    outcomes = models.BinaryField(
+        verbose_name="نتائج المجموعة"
+    )
+    size = models.PositiveIntegerField(
+        verbose_name="حجم المجموعة"
+    )
+    position = models.PositiveIntegerField(
+        default=0,
+        verbose_name="عدد الدورات المستخدمة"
+    )
+    generation = models.PositiveIntegerField(
+        default=1,
+        verbose_name="رقم المجموعة"
+    )
+    dealt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="تاريخ التوزيع"
+    )
+    
+    class Meta:
+        verbose_name = "مجموعة جوائز"
+        verbose_name_plural = "مجموعات الجوائز"
+    
+    def __str__(self):
+        return f"{self.company} - {self.position}/{self.size}"
+
+
+class PrizeInventory(models.Model):
+    """
+    Stock limits of a company's prize.
+
+    Prizes without an inventory row are unlimited. A spin takes one unit of
+    a limited prize with a single conditional UPDATE (see
+    companies.inventory), so the stock never goes below zero and concurrent
+    spins don't lock the company row.
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='prize_inventory',
+        verbose_name="الشركة"
+    )
+    prize = models.CharField(
+        max_length=200,
+        verbose_name="الجائزة"
+    )
+    stock = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="المخزون المتبقي",
+        help_text="العدد المتبقي من الجائزة - اتركه فارغاً لعدد غير محدود"
+    )
+    daily_limit = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="الحد اليومي",
+        help_text="أقصى عدد يُمنح من الجائزة في اليوم - اتركه فارغاً لعدد غير محدود"
+    )
+    given_today = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="الممنوح اليوم"
+    )
+    day = models.DateField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="يوم العد"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="تاريخ التحديث"
+    )
+    
+    class Meta:
+        verbose_name = "مخزون جائزة"
+        verbose_name_plural = "مخزون الجوائز"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'prize'], name='prize_inventory_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.company.name} - {self.prize}"
+    
+    def clean(self):
+        """The prize must be one of the company's prizes"""
+        self.prize = (self.prize or '').strip()
+        if self.company_id and self.prize not in self.company.get_prize_names():
+            raise ValidationError({'prize': 'الجائزة غير موجودة في جوائز الشركة'})
+    
+    def save(self, *args, **kwargs):
+        """Save the limits and rebuild the company's game snapshot (it lists the limited prizes)"""
+        super().save(*args, **kwargs)
+        from .snapshots import bump_company_versions
+        bump_company_versions(Company.objects.filter(pk=self.company_id))
+    
+    def delete(self, *args, **kwargs):
+        """Delete the limits and rebuild the company's game snapshot"""
+        from .snapshots import bump_company_versions
+        result = super().delete(*args, **kwargs)
+        bump_company_versions(Company.objects.filter(pk=self.company_id))
+        return result
+    
+    @property
+    def given_on_current_day(self):
+        """Units given today (the counter restarts on the first spin of a day)"""
+        return self.given_today if self.day == timezone.localdate() else 0
@@ -0,0 +1,65 @@
+"""
+Rendered-page cache for the public game pages
+
+The play and registration pages are the same for every visitor of a company
+or influencer until its configuration changes, so they are rendered once per
+config version (and activation state) and served from the cache.
+
+Each cached page has an ETag derived from its key and a Last-Modified time,
+so a repeat visit revalidates and gets ``304 Not Modified`` without the page
+body. The pages carry no per-visitor data (no CSRF token: the endpoints they
+call are csrf-exempt).
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .singleflight import SingleFlight
+
+# Rendered pages stay cached until their key changes or they're evicted
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+_flights = SingleFlight('page')
+
+
+def _page_cache_key(key):
+    return 'page:' + ':'.join(str(part) for part in key)
+
+
+def cached_page(request, key, template_name, get_context):
+    """
+    Serve a public page from the rendered-page cache.
+
+    Args:
+        key: tuple identifying the page content, e.g. the template, the
+            entity's public token, its config version and activation state
+        template_name: template to render on a miss
+        get_context: returns the template context (only called on a miss)
+    """
+    cache_key = _page_cache_key(key)
+    etag = f'"{hashlib.md5(cache_key.encode()).hexdigest()}"'
+
+    def render():
+        entry = (render_to_string(template_name, get_context()), int(time.time()))
+        cache.set(cache_key, entry, PAGE_CACHE_TIMEOUT)
+        return entry
+
+    entry = cache.get(cache_key)
+    if entry is None:
+        entry = _flights.do(cache_key, render, lambda: cache.get(cache_key))
+    content, rendered_at = entry
+
+    response = get_conditional_response(request, etag=etag, last_modified=rendered_at)
+    if response is None:
+        response = HttpResponse(content)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(rendered_at)
+    # Browsers may keep the page but must revalidate: the activation state can
+    # change at any time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
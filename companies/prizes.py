@@ -0,0 +1,310 @@
+"""
+Prize configuration and weighted sampling helpers for the wheel game
+"""
+import bisect
+import hashlib
+import json
+import logging
+import random
+import threading
+
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Per-worker cache of compiled samplers: {company_id: (config_key, sampler)}
+_sampler_cache = {}
+_sampler_cache_lock = threading.Lock()
+SAMPLER_CACHE_MAX_SIZE = 2048
+
+PRIZE_CONFIG_KEYS = {'name', 'weight', 'color', 'order'}
+
+# Deck outcomes are stored as one byte (the prize index) per spin
+MAX_DECK_PRIZES = 256
+
+
+def clean_prize_names(prizes):
+    """Normalize prize names (trim whitespace) and drop empty entries"""
+    names = []
+    for prize in prizes or []:
+        name = str(prize).strip() if prize is not None else ''
+        if name:
+            names.append(name)
+    return names
+
+
+def equal_percentages(count):
+    """Split 100% equally between ``count`` prizes (remainder goes to the last one)"""
+    if count <= 0:
+        return []
+    equal_percentage = 100 // count
+    percentages = [equal_percentage] * count
+    remainder = 100 - (equal_percentage * count)
+    if remainder > 0:
+        percentages[-1] += remainder
+    return percentages
+
+
+def normalize_percentages(percentages):
+    """
+    Normalize positive percentages to integers that sum to exactly 100.
+
+    Works for any total (e.g. 50%, 150%, 300%) and preserves the relative
+    ratios between prizes. No prize ends up below 1%.
+    """
+    total = sum(percentages)
+    if total <= 0:
+        return equal_percentages(len(percentages))
+
+    # Normalize: (each_percentage / total) * 100
+    normalized = [(float(p) / total) * 100.0 for p in percentages]
+    percentages = [round(p) for p in normalized]
+
+    # Adjust to ensure sum is exactly 100 (handle rounding errors)
+    current_sum = sum(percentages)
+    if current_sum != 100:
+        max_idx = percentages.index(max(percentages))
+        percentages[max_idx] += 100 - current_sum
+
+    # Ensure no percentage is less than 1
+    for i in range(len(percentages)):
+        if percentages[i] < 1:
+            percentages[i] = 1
+
+    # Re-adjust the highest percentage to compensate
+    current_sum = sum(percentages)
+    if current_sum != 100:
+        max_idx = percentages.index(max(percentages))
+        percentages[max_idx] += 100 - current_sum
+        if percentages[max_idx] < 1:
+            percentages[max_idx] = 1
+
+    return percentages
+
+
+def build_prize_config(prizes, weights=None, colors=None):
+    """
+    Build a structured prize configuration.
+
+    Args:
+        prizes: list of prize names
+        weights: list of weights (same length as prizes) or a ``{name: weight}``
+            mapping; prizes without a known weight get an equal share
+        colors: list of wheel colors, repeated over the prizes like the wheel does
+
+    Returns:
+        list of ``{'name', 'weight', 'color', 'order'}`` dicts
+    """
+    names = clean_prize_names(prizes)
+    if not names:
+        return []
+
+    default_weight = equal_percentages(len(names))
+    if isinstance(weights, dict):
+        resolved = [weights.get(name, default_weight[i]) for i, name in enumerate(names)]
+    elif weights and len(weights) == len(names):
+        resolved = list(weights)
+    else:
+        resolved = default_weight
+
+    colors = [str(c) for c in (colors or []) if c]
+    return [
+        {
+            'name': name,
+            'weight': resolved[i],
+            'color': colors[i % len(colors)] if colors else None,
+            'order': i,
+        }
+        for i, name in enumerate(names)
+    ]
+
+
+def sync_prize_config(config, prizes, colors=None):
+    """
+    Rebuild a prize configuration after the prize names or colors changed.
+
+    Weights are kept by position while the prize list is unchanged, and by
+    prize name otherwise (new prizes get an equal share).
+    """
+    current = sorted(config or [], key=lambda entry: entry['order'])
+    if [entry['name'] for entry in current] == clean_prize_names(prizes):
+        weights = [entry['weight'] for entry in current]
+    else:
+        weights = {entry['name']: entry['weight'] for entry in current}
+    return build_prize_config(prizes, weights=weights, colors=colors)
+
+
+def validate_prize_config(value):
+    """Validate the schema of a structured prize configuration"""
+    if not isinstance(value, list):
+        raise ValidationError('إعدادات الجوائز يجب أن تكون قائمة')
+
+    seen_orders = set()
+    for entry in value:
+        if not isinstance(entry, dict):
+            raise ValidationError('كل جائزة يجب أن تكون كائناً يحتوي على الاسم والنسبة')
+        unknown = set(entry) - PRIZE_CONFIG_KEYS
+        if unknown:
+            raise ValidationError(f'حقول غير معروفة في إعدادات الجوائز: {", ".join(sorted(unknown))}')
+        if not isinstance(entry.get('name'), str) or not entry['name'].strip():
+            raise ValidationError('اسم الجائزة مطلوب')
+        weight = entry.get('weight')
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+            raise ValidationError(f'نسبة الجائزة "{entry["name"]}" يجب أن تكون رقماً موجباً')
+        color = entry.get('color')
+        if color is not None and not isinstance(color, str):
+            raise ValidationError(f'لون الجائزة "{entry["name"]}" غير صحيح')
+        order = entry.get('order')
+        if isinstance(order, bool) or not isinstance(order, int) or order in seen_orders:
+            raise ValidationError(f'ترتيب الجائزة "{entry["name"]}" غير صحيح')
+        seen_orders.add(order)
+
+
+class PrizeSampler:
+    """
+    Compiled weighted sampler for a single prize configuration.
+
+    The weights are normalized once and stored as a cumulative-weight
+    array, so each draw is one ``random()`` call plus a binary search
+    instead of re-parsing and re-normalizing the configuration.
+    """
+
+    __slots__ = ('prizes', 'percentages', 'weights', 'cumulative', 'digest')
+
+    def __init__(self, prizes, percentages=None):
+        if not prizes:
+            raise ValueError('PrizeSampler requires at least one prize')
+
+        self.prizes = tuple(prizes)
+
+        # If no percentages stored or length mismatch, use equal distribution
+        if not percentages or len(percentages) != len(self.prizes):
+            equal_percentage = 100 / len(self.prizes)
+            percentages = [equal_percentage] * len(self.prizes)
+        self.percentages = tuple(percentages)
+
+        # Normalize weights to sum to 1 (handles totals other than 100)
+        weights = [max(float(p), 0.0) / 100.0 for p in self.percentages]
+        total_weight = sum(weights)
+        if total_weight > 0:
+            self.weights = tuple(w / total_weight for w in weights)
+        else:
+            self.weights = tuple([1.0 / len(self.prizes)] * len(self.prizes))
+
+        cumulative = []
+        running = 0.0
+        for weight in self.weights:
+            running += weight
+            cumulative.append(running)
+        # Guard against floating point drift on the last bucket
+        cumulative[-1] = 1.0
+        self.cumulative = tuple(cumulative)
+
+        # Identifies the configuration (e.g. the one a prize deck was dealt from)
+        self.digest = hashlib.md5(
+            json.dumps([self.prizes, self.percentages], ensure_ascii=False).encode()
+        ).hexdigest()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a sampler from a structured prize configuration"""
+        entries = sorted(config, key=lambda entry: entry['order'])
+        return cls(
+            [entry['name'] for entry in entries],
+            [entry['weight'] for entry in entries],
+        )
+
+    def __len__(self):
+        return len(self.prizes)
+
+    def draw_index(self, rng=random):
+        """Return the index of a randomly selected prize"""
+        return bisect.bisect_right(self.cumulative, rng.random())
+
+    def draw(self, rng=random):
+        """Return a randomly selected prize name"""
+        return self.prizes[self.draw_index(rng)]
+
+    def without(self, excluded):
+        """
+        Return a sampler over the prizes not in ``excluded`` (names), keeping
+        their relative weights, or ``None`` if no prize is left.
+        """
+        kept = [i for i, prize in enumerate(self.prizes) if prize not in excluded]
+        if len(kept) == len(self.prizes):
+            return self
+        if not kept:
+            return None
+        return PrizeSampler(
+            [self.prizes[i] for i in kept],
+            [self.percentages[i] for i in kept],
+        )
+
+    def deck_counts(self, size):
+        """
+        Split ``size`` spins between the prizes exactly by their weights.
+
+        Uses largest-remainder rounding, so the counts always add up to
+        ``size`` and each one is within one spin of its exact share.
+        """
+        shares = [weight * size for weight in self.weights]
+        counts = [int(share) for share in shares]
+        by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - counts[i], reverse=True)
+        for i in by_remainder[:size - sum(counts)]:
+            counts[i] += 1
+        return counts
+
+    def deal_deck(self, size, rng=random):
+        """
+        Return a shuffled deck of ``size`` outcomes matching the weights exactly.
+
+        Each outcome is one byte: the index of the prize in wheel order.
+        """
+        if len(self.prizes) > MAX_DECK_PRIZES:
+            raise ValueError(f'A prize deck supports at most {MAX_DECK_PRIZES} prizes')
+        outcomes = bytearray()
+        for index, count in enumerate(self.deck_counts(size)):
+            outcomes.extend([index] * count)
+        rng.shuffle(outcomes)
+        return bytes(outcomes)
+
+
+def get_prize_sampler(company):
+    """
+    Return the compiled sampler for a company, building it on first use.
+
+    The cache lives in the worker process and is keyed by the company id. The
+    stored entry is reused only while the prize names and weights are
+    unchanged, so edits made in another process are picked up on the next
+    spin even without an explicit invalidation.
+
+    Returns ``None`` when the company has no prizes.
+    """
+    config = company.get_prize_config()
+    if not config:
+        return None
+
+    config_key = tuple([(entry['name'], entry['weight']) for entry in config])
+
+    entry = _sampler_cache.get(company.pk)
+    if entry is not None and entry[0] == config_key:
+        return entry[1]
+
+    sampler = PrizeSampler.from_config(config)
+    logger.debug(
+        "Company %s: Compiled prize sampler (%s prizes, percentages: %s)",
+        company.name, len(sampler), sampler.percentages,
+    )
+
+    if company.pk is not None:
+        with _sampler_cache_lock:
+            if len(_sampler_cache) >= SAMPLER_CACHE_MAX_SIZE:
+                _sampler_cache.clear()
+            _sampler_cache[company.pk] = (config_key, sampler)
+    return sampler
+
+
+def invalidate_prize_sampler(company_id):
+    """Drop the cached sampler for a company in this worker"""
+    with _sampler_cache_lock:
+        _sampler_cache.pop(company_id, None)
@@ -0,0 +1,357 @@
+"""
+Activation scheduler for ActivationSchedule
+
+Computes schedule fire times (start_hour on the selected weekdays, Saudi time),
+activates companies when a schedule fires and catches up on windows that were
+missed while nothing was running.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, time as dt_time
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .activation import activate_schedules, advance_schedules
+from .models import ActivationSchedule
+
+logger = logging.getLogger(__name__)
+
+# Application-wide key of the Postgres advisory lock held by the scheduler leader
+SCHEDULER_LOCK_KEY = 7_348_291
+
+
+def _local_fire_time(start_hour, day):
+    """Fire time (aware datetime) for a start hour on a given local date"""
+    tz = timezone.get_current_timezone()
+    return datetime.combine(day, dt_time(hour=start_hour), tzinfo=tz)
+
+
+def compute_next_fire_time(active_days, start_hour, after):
+    """
+    First fire time strictly after ``after`` for the given weekdays
+    (0=Monday, 6=Sunday) and start hour, or ``None`` if no days are selected.
+    """
+    if not active_days:
+        return None
+
+    local_after = after.astimezone(timezone.get_current_timezone())
+    for offset in range(8):
+        day = local_after.date() + timedelta(days=offset)
+        if day.weekday() not in active_days:
+            continue
+        fire_time = _local_fire_time(start_hour, day)
+        if fire_time > local_after:
+            return fire_time
+    return None
+
+
+def next_fire_time(schedule, after):
+    """First fire time of a schedule strictly after ``after`` (or ``None`` if no days are selected)"""
+    return compute_next_fire_time(schedule.get_active_days_list(), schedule.start_hour, after)
+
+
+def last_fire_time(schedule, at):
+    """Most recent fire time at or before ``at`` (or ``None`` if no days are selected)"""
+    active_days = schedule.get_active_days_list()
+    if not active_days:
+        return None
+
+    local_at = at.astimezone(timezone.get_current_timezone())
+    for offset in range(8):
+        day = local_at.date() - timedelta(days=offset)
+        if day.weekday() not in active_days:
+            continue
+        fire_time = _local_fire_time(schedule.start_hour, day)
+        if fire_time <= local_at:
+            return fire_time
+    return None
+
+
+def pending_fire_time(schedule):
+    """
+    The first fire time that has not been activated yet.
+
+    This is what ``next_activation_at`` stores: fire times before the hour
+    the schedule was created in, or at/before its last activation, are done.
+    """
+    created_at = schedule.created_at or timezone.now()
+    after = created_at.replace(minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
+    if schedule.last_activation and schedule.last_activation > after:
+        after = schedule.last_activation
+    return next_fire_time(schedule, after)
+
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def week_hour_slot(when):
+    """Index (0..167) of the local weekday/hour of ``when`` in a week-hour mask"""
+    local = when.astimezone(timezone.get_current_timezone())
+    return local.weekday() * 24 + local.hour
+
+
+def week_hour_mask(schedule):
+    """
+    Bitmask of the week hours a schedule keeps its company active.
+
+    Bit ``weekday * 24 + hour`` (0=Monday 00:00) is set for every hour from
+    the start hour on each scheduled day, for ``duration_hours`` hours;
+    windows that run past midnight (or past Sunday) wrap around.
+    """
+    mask = 0
+    duration = min(schedule.duration_hours, HOURS_PER_WEEK)
+    for weekday in schedule.get_active_days_list():
+        start = weekday * 24 + schedule.start_hour
+        for offset in range(duration):
+            mask |= 1 << ((start + offset) % HOURS_PER_WEEK)
+    return mask
+
+
+def get_due_fire_time(schedule, now=None):
+    """
+    Return the fire time a schedule should be activated for right now, or ``None``.
+
+    A schedule is due when its most recent fire time has not been activated yet
+    and its activation window (fire time + duration) is still open. This also
+    catches up on windows missed while the scheduler was down. Fire times from
+    before the hour the schedule was created in are ignored, so a new schedule
+    waits for its next start hour.
+    """
+    if not schedule.is_active:
+        return None
+
+    now = now or timezone.now()
+    fire_time = last_fire_time(schedule, now)
+    if fire_time is None:
+        return None
+
+    if schedule.created_at and fire_time < schedule.created_at.replace(minute=0, second=0, microsecond=0):
+        return None
+    if schedule.last_activation and schedule.last_activation >= fire_time:
+        return None
+    if now >= fire_time + timedelta(hours=schedule.duration_hours):
+        return None
+    return fire_time
+
+
+def due_schedules(now=None):
+    """Schedules whose ``next_activation_at`` has passed (an index range scan)"""
+    now = now or timezone.now()
+    return (
+        ActivationSchedule.objects
+        .filter(is_active=True, next_activation_at__lte=now)
+        .select_related('company')
+        .order_by('next_activation_at')
+    )
+
+
+def claim_due_schedules(now=None):
+    """
+    Due schedules, locked for the current transaction.
+
+    Rows that another scheduler (another node, a cron run or the middleware)
+    is already processing are skipped rather than waited on, so each fire
+    time is activated exactly once however many processes run the
+    scheduler. Must be evaluated inside ``transaction.atomic()``.
+    """
+    return due_schedules(now).select_for_update(skip_locked=True, of=('self',))
+
+
+def activation_window(schedule, fire_time):
+    """Activation window of a schedule for the fire time it is due for"""
+    return fire_time, fire_time + timedelta(hours=schedule.duration_hours)
+
+
+def activate_schedule(schedule, fire_time, now=None):
+    """Activate the schedule's company for the window starting at ``fire_time``"""
+    activate_schedules([(schedule, *activation_window(schedule, fire_time))], now)
+
+
+def run_due_schedules(now=None, dry_run=False):
+    """
+    Activate every schedule that is due now.
+
+    Due schedules whose activation window already closed (missed while
+    nothing was running), or whose company was just activated by another
+    schedule, are moved on to their next fire time. All writes for the tick
+    are batched into one transaction.
+
+    Returns:
+        list of ``(schedule, fire_time)`` that were (or would be) activated
+    """
+    now = now or timezone.now()
+    activated = []
+    skipped = []
+    activated_companies = set()
+
+    with transaction.atomic():
+        schedules = due_schedules(now) if dry_run else claim_due_schedules(now)
+        for schedule in schedules:
+            fire_time = get_due_fire_time(schedule, now)
+            # Only activate from one schedule per company at a time
+            if fire_time is None or schedule.company_id in activated_companies:
+                skipped.append(schedule)
+                continue
+            activated_companies.add(schedule.company_id)
+            activated.append((schedule, fire_time))
+
+        if not dry_run:
+            activate_schedules(
+                [(schedule, *activation_window(schedule, fire_time)) for schedule, fire_time in activated],
+                now,
+            )
+            advance_schedules(skipped, now)
+
+    for schedule, fire_time in activated:
+        logger.info(
+            f"Auto-activated: {schedule.company.name} for {schedule.duration_hours} hours "
+            f"from {fire_time.strftime('%Y-%m-%d %H:%M')}"
+        )
+    return activated
+
+
+def get_next_activation_at():
+    """Earliest upcoming ``next_activation_at`` over all active schedules"""
+    return (
+        ActivationSchedule.objects
+        .filter(is_active=True, next_activation_at__isnull=False)
+        .order_by('next_activation_at')
+        .values_list('next_activation_at', flat=True)
+        .first()
+    )
+
+
+def try_acquire_leader_lock(using=DEFAULT_DB_ALIAS):
+    """
+    Try to become the scheduler leader without blocking.
+
+    The leader holds a session-level Postgres advisory lock. Postgres
+    releases it when the leader's connection goes away (process killed, node
+    lost), so a standby takes over on its next attempt. Other databases have
+    no advisory locks: every process acts as leader there and the row claims
+    in run_due_schedules() still prevent duplicate activations.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [SCHEDULER_LOCK_KEY])
+        return cursor.fetchone()[0]
+
+
+def holds_leader_lock(using=DEFAULT_DB_ALIAS):
+    """Check that this process's database session still holds the leader lock"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return True
+    if connection.connection is None:
+        # The session (and its lock) is gone
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' "
+            "AND pid = pg_backend_pid() AND classid = 0 AND objid = %s AND objsubid = 1 AND granted)",
+            [SCHEDULER_LOCK_KEY],
+        )
+        return cursor.fetchone()[0]
+
+
+def release_leader_lock(using=DEFAULT_DB_ALIAS):
+    """Give up leadership so a standby can take over immediately"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or connection.connection is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', [SCHEDULER_LOCK_KEY])
+
+
+class ScheduleLoop:
+    """
+    Long-running scheduler loop.
+
+    Each tick activates the due schedules and then sleeps until the
+    earliest ``next_activation_at``, but never longer than
+    ``reload_interval`` seconds so added, edited or stopped schedules are
+    picked up. Both queries are served by the ``(is_active,
+    next_activation_at)`` index, so a tick does not grow with the number
+    of schedules.
+
+    Several loops can run against one database (one per node): only the
+    leader (see try_acquire_leader_lock) runs ticks, the others retry every
+    ``leader_retry_interval`` seconds and take over if the leader dies.
+    """
+
+    def __init__(self, reload_interval=60, leader_retry_interval=10, on_activate=None, on_leadership_change=None):
+        self.reload_interval = reload_interval
+        self.leader_retry_interval = leader_retry_interval
+        self.on_activate = on_activate
+        self.on_leadership_change = on_leadership_change
+        self.is_leader = False
+        self._stop_event = threading.Event()
+
+    def run_pending(self, now):
+        """Activate all schedules whose fire time has passed"""
+        for schedule, fire_time in run_due_schedules(now):
+            self._notify(schedule, fire_time)
+
+    def seconds_until_next_event(self, now):
+        """How long the loop can sleep before something needs attention"""
+        seconds = self.reload_interval
+        next_activation = get_next_activation_at()
+        if next_activation is not None:
+            seconds = min(seconds, (next_activation - now).total_seconds())
+        return max(0.0, seconds)
+
+    def check_leadership(self):
+        """Keep or try to gain leadership; returns whether this loop is the leader"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        # Keep the connection (and the advisory lock tied to its session)
+        # across ticks, only replacing it when it is broken
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+        was_leader = self.is_leader
+        if self.is_leader:
+            self.is_leader = holds_leader_lock()
+        if not self.is_leader:
+            self.is_leader = try_acquire_leader_lock()
+
+        if self.is_leader != was_leader:
+            logger.info(f"Scheduler {'became leader' if self.is_leader else 'is standby'}")
+            if self.on_leadership_change:
+                self.on_leadership_change(self.is_leader)
+        return self.is_leader
+
+    def tick(self):
+        """Run one scheduler iteration and return the number of seconds to sleep"""
+        if not self.check_leadership():
+            return self.leader_retry_interval
+        self.run_pending(timezone.now())
+        return self.seconds_until_next_event(timezone.now())
+
+    def run_forever(self):
+        """Run until ``stop()`` is called (e.g. from a SIGTERM handler)"""
+        self._stop_event.clear()
+        while not self._stop_event.is_set():
+            try:
+                delay = self.tick()
+            except Exception as e:
+                logger.exception(f"Error in scheduler loop: {e}")
+                delay = self.reload_interval
+            self._stop_event.wait(delay)
+
+        if self.is_leader:
+            try:
+                release_leader_lock()
+            except Exception as e:
+                logger.warning(f"Could not release scheduler leader lock: {e}")
+            self.is_leader = False
+
+    def stop(self, *args):
+        """Stop the loop and wake it up if it is sleeping"""
+        self._stop_event.set()
+
+    def _notify(self, schedule, fire_time):
+        if self.on_activate:
+            self.on_activate(schedule, fire_time)
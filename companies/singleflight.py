@@ -0,0 +1,92 @@
+"""
+Single-flight loading for cache misses
+
+When a venue shows its QR code, hundreds of phones open the same link in the
+same second and all miss the cache together. SingleFlight makes them share
+one load instead of each running the same queries:
+
+* inside a worker, callers that miss while a load for the same key is in
+  flight wait for that load and get its result;
+* across workers, the loading worker holds a short lock in the shared cache
+  (``cache.add``); the other workers poll the cache for the value the load
+  will store, and only load themselves if the lock goes away without it.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+# How long a load may hold the shared lock (and others wait for it)
+LOCK_TIMEOUT = 5
+POLL_INTERVAL = 0.02
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same key"""
+
+    def __init__(self, prefix, lock_timeout=LOCK_TIMEOUT, poll_interval=POLL_INTERVAL):
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, load, lookup):
+        """
+        Return ``load()``, running it once for all concurrent callers of ``key``.
+
+        Args:
+            load: loads the value and stores it where ``lookup`` finds it
+            lookup: cache read returning the value, or ``None`` if not there yet
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if flight.done.wait(self.lock_timeout) and not flight.failed:
+                return flight.result
+            # The load failed or is stuck: try on our own
+            return load()
+
+        try:
+            flight.result = self._load_shared(key, load, lookup)
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result
+
+    def _load_shared(self, key, load, lookup):
+        """Load under the cross-worker lock, or wait for the worker holding it"""
+        lock_key = f'{self.prefix}:{key}:loading'
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                return load()
+            finally:
+                cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                # Released without a value (e.g. not found): load ourselves
+                break
+        return load()
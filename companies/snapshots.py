@@ -0,0 +1,312 @@
+"""
+Cross-request snapshots of the data behind the public game pages
+
+The play page, spins and participant pages only need a small, read-only view
+of a company or influencer (name, prizes, colors, compiled weights,
+activation window and flags). That view is built once from the database and
+kept in the cache as an immutable snapshot, so hot requests make no database
+reads for it.
+
+Snapshots are keyed by the entity's public token (the one in its links).
+Each entity has a ``config_version`` column bumped on every ``save()`` and by
+the admin/activation bulk updates. The cache holds two keys per token:
+
+* ``<prefix>:v<format>:<token>`` - the current version (the "pointer")
+* ``<prefix>:v<format>:<token>:<version>`` - the snapshot of that version
+
+After a change commits, the new version is published to the pointer, so the
+next request loads a fresh snapshot. Readers that loaded an older row only
+ever ``add`` the pointer, so a slow reader can't move it back to a stale
+version.
+
+With a shared cache (Redis, see REDIS_URL) a change is visible to all workers
+at once. With the local-memory cache each worker has its own pointers and
+never sees another process publish (the scheduler, the admin, another
+worker's middleware tick), so a cached snapshot is checked against the
+row's ``config_version`` - one indexed read per token at most every
+GAME_SNAPSHOT_PROBE_INTERVAL seconds per worker.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import models, transaction
+
+from .models import Company, ActivationSchedule, PrizeInventory
+from .singleflight import SingleFlight
+from .utils import decrypt_slug, is_public_token
+
+# Part of every snapshot key: bumped when the snapshot classes change, so
+# snapshots pickled by an older release are never read
+SNAPSHOT_FORMAT = 4
+
+# Tokens whose last version probe is remembered per worker
+MAX_PROBED = 10000
+
+
+def cache_is_shared():
+    """False when each worker process has its own cache (local memory)"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+class SnapshotStore:
+    """Read-through cache of versioned snapshots keyed by public token"""
+
+    def __init__(self, prefix, model, build):
+        """
+        Args:
+            prefix: cache key prefix
+            model: model with ``public_token``, ``slug`` and ``config_version``
+            build: ``build(instance)`` returns the snapshot of an instance
+        """
+        self.prefix = prefix
+        self.model = model
+        self.build = build
+        self.flights = SingleFlight(prefix)
+        # {token: monotonic time of the last version probe}
+        self._probed = {}
+        self._probed_lock = threading.Lock()
+
+    def _pointer_key(self, token):
+        return f'{self.prefix}:v{SNAPSHOT_FORMAT}:{token}'
+
+    def _snapshot_key(self, token, version):
+        return f'{self.prefix}:v{SNAPSHOT_FORMAT}:{token}:{version}'
+
+    def _legacy_key(self, token):
+        return f'{self.prefix}:legacy:{token}'
+
+    def load(self, token):
+        """Build a fresh snapshot from the database (``None`` if not found)"""
+        instance = self.model.objects.filter(public_token=token).first()
+        return self.build(instance) if instance is not None else None
+
+    def cached(self, token):
+        """Return the cached snapshot for a public token, or ``None``"""
+        version = cache.get(self._pointer_key(token))
+        if version is None:
+            return None
+        return cache.get(self._snapshot_key(token, version))
+
+    def get(self, token):
+        """
+        Return the snapshot for a public token (``None`` if it doesn't exist).
+
+        Concurrent misses for the same token share one load (see SingleFlight).
+        """
+        snapshot = self.cached(token)
+        if snapshot is not None and not self.is_outdated(token, snapshot):
+            return snapshot
+        return self.flights.do(token, lambda: self.fill(token), lambda: self.cached(token))
+
+    def is_outdated(self, token, snapshot):
+        """
+        Whether the database has another version of a cached snapshot.
+
+        Only checked when the cache isn't shared (other processes can't move
+        this worker's pointers), and at most every
+        GAME_SNAPSHOT_PROBE_INTERVAL seconds per token.
+        """
+        if cache_is_shared():
+            return False
+        now = time.monotonic()
+        with self._probed_lock:
+            if now - self._probed.get(token, float('-inf')) < settings.GAME_SNAPSHOT_PROBE_INTERVAL:
+                return False
+            if len(self._probed) >= MAX_PROBED:
+                self._probed.clear()
+            self._probed[token] = now
+
+        version = self.model.objects.filter(public_token=token).values_list('config_version', flat=True).first()
+        if version is None:
+            # Deleted: drop the pointer, the reload returns None
+            cache.delete(self._pointer_key(token))
+            return True
+        return version != snapshot.version
+
+    def fill(self, token):
+        """Load a snapshot from the database and store it in the cache"""
+        snapshot = self.load(token)
+        if snapshot is None:
+            return None
+
+        timeout = settings.GAME_SNAPSHOT_TIMEOUT
+        version = cache.get(self._pointer_key(token))
+        cache.set(self._snapshot_key(token, snapshot.version), snapshot, timeout)
+        if version is None:
+            cache.add(self._pointer_key(token), snapshot.version, timeout)
+        elif snapshot.version > version:
+            cache.set(self._pointer_key(token), snapshot.version, timeout)
+        with self._probed_lock:
+            self._probed[token] = time.monotonic()
+        return snapshot
+
+    def resolve(self, token):
+        """
+        Return the snapshot for a token from a link.
+
+        Old signed tokens (links and QR codes printed before public tokens)
+        are still accepted: they are verified once and then mapped to the
+        public token through the cache.
+        """
+        if not token:
+            return None
+        if is_public_token(token):
+            return self.get(token)
+
+        public_token = cache.get(self._legacy_key(token))
+        if public_token is None:
+            public_token = self.flights.do(
+                f'legacy:{token}',
+                lambda: self._map_legacy_token(token),
+                lambda: cache.get(self._legacy_key(token)),
+            )
+            if public_token is None:
+                return None
+        return self.get(public_token)
+
+    def _map_legacy_token(self, token):
+        """Verify an old signed token and cache its public token"""
+        slug = decrypt_slug(token)
+        if not slug:
+            return None
+        public_token = self.model.objects.filter(slug=slug).values_list('public_token', flat=True).first()
+        if public_token is not None:
+            cache.set(self._legacy_key(token), public_token, settings.GAME_SNAPSHOT_TIMEOUT)
+        return public_token
+
+    async def aresolve(self, token):
+        """Async version of resolve() (a miss reads the database)"""
+        return await sync_to_async(self.resolve)(token)
+
+    def publish(self, versions):
+        """Point tokens at their new versions (``{public_token: version}``)"""
+        if versions:
+            cache.set_many(
+                {self._pointer_key(token): version for token, version in versions.items()},
+                settings.GAME_SNAPSHOT_TIMEOUT,
+            )
+
+    def forget(self, tokens):
+        """Drop the pointers of deleted entities once the deletion commits"""
+        keys = [self._pointer_key(token) for token in tokens]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def publish_versions(store, model, pks):
+    """Publish the current versions of the given rows after commit"""
+    versions = dict(model.objects.filter(pk__in=pks).values_list('public_token', 'config_version'))
+    transaction.on_commit(lambda: store.publish(versions))
+    return versions
+
+
+def bump_versions(store, queryset, **updates):
+    """
+    Bump ``config_version`` of the rows in ``queryset`` in one UPDATE (together
+    with any other ``updates``) and publish the new versions after commit.
+
+    Returns the number of updated rows.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        pks = list(queryset.values_list('pk', flat=True))
+        count = model.objects.filter(pk__in=pks).update(
+            config_version=models.F('config_version') + 1,
+            **updates,
+        )
+        publish_versions(store, model, pks)
+    return count
+
+
+def versioned_save(store, instance, save, *args, **kwargs):
+    """
+    Run a model's ``save`` with its ``config_version`` bumped, then publish
+    the new version after commit. New rows keep the default version.
+    """
+    bump = not instance._state.adding
+    if bump:
+        instance.config_version = models.F('config_version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = [*update_fields, 'config_version']
+
+    save(*args, **kwargs)
+
+    if bump:
+        instance.refresh_from_db(fields=['config_version'])
+        versions = {instance.public_token: instance.config_version}
+        transaction.on_commit(lambda: store.publish(versions))
+
+
+class CompanySnapshot:
+    """Read-only view of a company for the public game pages"""
+
+    __slots__ = (
+        'pk', 'slug', 'public_token', 'version', 'name', 'final_type', 'email', 'status',
+        'is_active', 'active_hours', 'activation_start_time', 'activation_end_time',
+        'prize_names', 'colors', 'prize_sampler', 'prize_mode', 'prize_deck_size', 'limited_prizes',
+        'spin_limit_scope', 'spin_limit_period', 'spin_limit_count',
+        'has_active_schedules', 'active_schedules',
+    )
+
+    # The model's status logic only reads the fields copied above
+    is_currently_active = Company.is_currently_active
+    dynamic_status = Company.dynamic_status
+
+    def __init__(self, company, schedules, limited_prizes=()):
+        self.pk = company.pk
+        self.slug = company.slug
+        self.public_token = company.public_token
+        self.version = company.config_version
+        self.name = company.name
+        self.final_type = company.final_type
+        self.email = company.email
+        self.status = company.status
+        self.is_active = company.is_active
+        self.active_hours = company.active_hours
+        self.activation_start_time = company.activation_start_time
+        self.activation_end_time = company.activation_end_time
+        self.prize_names = company.get_prize_names()
+        self.colors = company.get_colors_list()
+        self.prize_sampler = company.prize_sampler
+        self.prize_mode = company.prize_mode
+        self.prize_deck_size = company.prize_deck_size
+        self.limited_prizes = frozenset(limited_prizes)
+        self.spin_limit_scope = company.spin_limit_scope
+        self.spin_limit_period = company.spin_limit_period
+        self.spin_limit_count = company.spin_limit_count
+        self.has_active_schedules = bool(schedules)
+        self.active_schedules = [
+            {'days': schedule.get_active_days_display(), 'time': schedule.get_time_display()}
+            for schedule in schedules
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+def build_company_snapshot(company):
+    schedules = list(ActivationSchedule.objects.filter(company=company, is_active=True))
+    limited_prizes = PrizeInventory.objects.filter(company=company).values_list('prize', flat=True)
+    return CompanySnapshot(company, schedules, limited_prizes)
+
+
+company_snapshots = SnapshotStore('snapshot:company', Company, build_company_snapshot)
+
+
+def get_company_snapshot(token):
+    """Company snapshot for a link token, or ``None``"""
+    return company_snapshots.resolve(token)
+
+
+def bump_company_versions(queryset, **updates):
+    """Apply ``updates`` to companies and invalidate their snapshots"""
+    return bump_versions(company_snapshots, queryset, **updates)
+
+
+def publish_company_versions(company_ids):
+    """Invalidate the snapshots of companies whose version was bumped in bulk"""
+    return publish_versions(company_snapshots, Company, company_ids)
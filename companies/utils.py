@@ -5,6 +5,12 @@ from django.core.signing import Signer, BadSignature, TimestampSigner, Signature
 from django.conf import settings
 import hashlib
 import hmac
+import secrets
+
+# Public link tokens: 16 random bytes, 22 URL-safe characters. Signed slug
+# tokens (encrypt_slug) are always longer: slug + ":" + 27-char signature.
+PUBLIC_TOKEN_BYTES = 16
+PUBLIC_TOKEN_LENGTH = 22
 
 
 def format_riyadh_datetime(dt):
@@ -35,6 +41,33 @@ def format_arabic_datetime(dt):
     return dt.strftime('%Y-%m-%d %H:%M')
 
 
+def generate_public_token():
+    """Random, URL-safe public token for company/influencer links"""
+    return secrets.token_urlsafe(PUBLIC_TOKEN_BYTES)
+
+
+def is_public_token(token):
+    """True if ``token`` has the shape of a public token (not a signed slug)"""
+    return bool(token) and len(token) == PUBLIC_TOKEN_LENGTH
+
+
+def get_by_public_token(queryset, token):
+    """
+    Return the object with this public token, or ``None``.
+
+    Old signed tokens (``encrypt_slug``) are still accepted, so links and QR
+    codes printed before public tokens existed keep working.
+    """
+    if not token:
+        return None
+    if is_public_token(token):
+        return queryset.filter(public_token=token).first()
+    slug = decrypt_slug(token)
+    if not slug:
+        return None
+    return queryset.filter(slug=slug).first()
+
+
 def encrypt_slug(slug, salt=None):
     """
     Sign a slug using Django's signing mechanism.
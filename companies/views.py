@@ -14,6 +14,8 @@ import json
 import random
 import logging
 from .models import Company, ActivationSchedule
+from .prizes import build_prize_config, equal_percentages, normalize_percentages
+from .utils import format_arabic_datetime
 
 logger = logging.getLogger(__name__)
 
@@ -82,17 +84,10 @@ def register_company(request):
                 'message': 'البريد الإلكتروني مطلوب'
             }, status=400)
         
-        # If prizes is a string (old format), convert it
+        # If prizes is a string (old format), convert it (equal percentages)
         if isinstance(prizes, str):
             prizes = [prize.strip() for prize in prizes.split(',') if prize.strip()]
-            # Default equal percentages for old format
-            if prizes:
-                equal_percentage = 100 // len(prizes)
-                prize_percentages = [equal_percentage] * len(prizes)
-                # Adjust last item to make total 100
-                remainder = 100 - (equal_percentage * len(prizes))
-                if remainder > 0:
-                    prize_percentages[-1] += remainder
+            prize_percentages = equal_percentages(len(prizes))
         
         # Validate prizes after conversion
         if not prizes or (isinstance(prizes, list) and len(prizes) == 0):
@@ -120,66 +115,11 @@ def register_company(request):
                     'message': 'جميع النسب المئوية يجب أن تكون أكبر من 0'
                 }, status=400)
             
-            # Normalize percentages to sum to 100
-            # This works for any total (e.g., 50%, 150%, 300%, etc.)
-            # The algorithm preserves the relative ratios between prizes
-            total_percentage = sum(prize_percentages)
-            if total_percentage > 0:
-                # Normalize to percentages that sum to 100
-                # Formula: (each_percentage / total) * 100
-                # This preserves the relative weights
-                normalized = [(float(p) / total_percentage) * 100.0 for p in prize_percentages]
-                
-                # Round to nearest integer for display/storage
-                prize_percentages = [round(p) for p in normalized]
-                
-                # Adjust to ensure sum is exactly 100 (handle rounding errors)
-                current_sum = sum(prize_percentages)
-                if current_sum != 100:
-                    difference = 100 - current_sum
-                    # Add/subtract difference from the prize with the highest percentage
-                    # This maintains the relative importance
-                    max_idx = prize_percentages.index(max(prize_percentages))
-                    prize_percentages[max_idx] += difference
-                
-                # Ensure no percentage is less than 1 after normalization
-                # This prevents prizes from having 0% chance
-                for i in range(len(prize_percentages)):
-                    if prize_percentages[i] < 1:
-                        prize_percentages[i] = 1
-                
-                # Re-adjust if needed after ensuring minimum of 1%
-                current_sum = sum(prize_percentages)
-                if current_sum != 100:
-                    difference = 100 - current_sum
-                    # Adjust the highest percentage to compensate
-                    max_idx = prize_percentages.index(max(prize_percentages))
-                    prize_percentages[max_idx] += difference
-                    # Ensure it doesn't go below 1
-                    if prize_percentages[max_idx] < 1:
-                        prize_percentages[max_idx] = 1
+            # Normalize percentages to sum to 100 (preserves the relative ratios)
+            prize_percentages = normalize_percentages(prize_percentages)
         else:
             # Default equal percentages if not provided
-            equal_percentage = 100 // len(prizes)
-            prize_percentages = [equal_percentage] * len(prizes)
-            remainder = 100 - (equal_percentage * len(prizes))
-            if remainder > 0:
-                prize_percentages[-1] += remainder
-        
-        # Ensure prize_percentages has the same length as prizes
-        if not prize_percentages or len(prize_percentages) != len(prizes):
-            # Generate default equal percentages
-            equal_percentage = 100 // len(prizes)
-            prize_percentages = [equal_percentage] * len(prizes)
-            remainder = 100 - (equal_percentage * len(prizes))
-            if remainder > 0:
-                prize_percentages[-1] += remainder
-        
-        # Store prizes with percentages as list of dicts
-        prizes_with_percentages = [
-            {'name': prize, 'percentage': percentage}
-            for prize, percentage in zip(prizes, prize_percentages)
-        ]
+            prize_percentages = equal_percentages(len(prizes))
         
         # Generate colors
         dawerha_colors = [
@@ -192,8 +132,8 @@ def register_company(request):
         final_type = custom_type if company_type == 'other' else company_type
         
         try:
-            # Create company - store prizes as list of names for backward compatibility
-            # and store percentages separately in a new field if needed
+            # Create company - prizes/colors stay as plain lists for the wheel,
+            # names, weights, colors and order are kept together in prize_config
             company = Company.objects.create(
                 name=company_name,
                 type=company_type,
@@ -202,18 +142,10 @@ def register_company(request):
                 phone=phone if phone else None,
                 prizes=prizes,  # Store as list of names
                 colors=colors,
+                prize_config=build_prize_config(prizes, weights=prize_percentages, colors=colors),
                 status='pending',
                 is_active=False
             )
-            
-            # Store prize percentages in notes field as JSON (temporary solution)
-            # In production, you might want to add a separate JSONField for this
-            if prize_percentages and len(prize_percentages) > 0:
-                company.notes = json.dumps({
-                    'prize_percentages': prize_percentages,
-                    'prizes_with_percentages': prizes_with_percentages
-                }, ensure_ascii=False)
-                company.save()
         except Exception as db_error:
             logger.error(f'Database error creating company: {db_error}')
             raise
@@ -246,38 +178,32 @@ def company_dashboard(request, company_id):
     """Company dashboard view"""
     company = get_object_or_404(Company, id=company_id)
     
-    # Get game statistics
+    # Game statistics from the daily spin rollups
+    from game.rollups import spin_stats, unique_visitors as unique_visitors_count
+    stats = spin_stats(company.pk)
     spins = company.spins.all()
-    total_spins = spins.count()
-    unique_visitors = spins.values('visitor_name').distinct().count()
-    
-    # Today's spins
-    from django.utils import timezone
-    today = timezone.now().date()
-    today_spins = spins.filter(created_at__date=today).count()
     
-    # This week's spins
-    from datetime import timedelta
-    week_ago = today - timedelta(days=7)
-    week_spins = spins.filter(created_at__date__gte=week_ago).count()
+    # Unique visitors from the daily visitor sketches (?exact=1 counts the
+    # spins themselves, for staff audits)
+    exact = request.GET.get('exact') == '1' and request.user.is_staff
+    unique_visitors = unique_visitors_count(company.pk, exact=exact)
     
     # Prize distribution
-    prize_distribution = {}
-    for spin in spins:
-        prize = spin.prize
-        prize_distribution[prize] = prize_distribution.get(prize, 0) + 1
+    prize_distribution = {row['prize']: row['count'] for row in stats['prize_distribution']}
     
     # Recent spins
     recent_spins = spins[:10]
     
     context = {
         'company': company,
-        'total_spins': total_spins,
+        'total_spins': stats['total_spins'],
         'unique_visitors': unique_visitors,
-        'today_spins': today_spins,
-        'week_spins': week_spins,
+        'today_spins': stats['today_spins'],
+        'week_spins': stats['week_spins'],
         'prize_distribution': prize_distribution,
         'recent_spins': recent_spins,
+        # Live total/today badges (polled from the daily spin rollups)
+        'counters_url': reverse('game:counters', kwargs={'token': company.public_token}),
     }
     
     return render(request, 'companies/dashboard.html', context)
@@ -290,6 +216,7 @@ def get_schedule_status(request, schedule_id):
     try:
         schedule = get_object_or_404(ActivationSchedule, id=schedule_id)
         company_status = schedule.get_company_activation_status()
+        next_window = schedule.windows.upcoming().order_by('starts_at').first()
         
         return JsonResponse({
             'success': True,
@@ -299,7 +226,8 @@ def get_schedule_status(request, schedule_id):
             'is_active': company_status['is_active'],
             'end_time': company_status.get('end_time'),
             'schedule_active': schedule.is_active,
-            'should_activate_soon': schedule.should_activate_soon()
+            'should_activate_soon': schedule.should_activate_soon(),
+            'next_window_start': format_arabic_datetime(next_window.starts_at) if next_window else None,
         })
     except Exception as e:
         return JsonResponse({
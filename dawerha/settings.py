@@ -50,6 +50,10 @@ MIDDLEWARE = [
     'companies.middleware.ScheduleActivationMiddleware',  # Auto-activation based on schedules
 ]
 
+# Schedule activation on the request path. Turn this off when the dedicated
+# scheduler process (python manage.py run_scheduler --loop) is running.
+SCHEDULE_ACTIVATION_MIDDLEWARE = config('SCHEDULE_ACTIVATION_MIDDLEWARE', default=True, cast=bool)
+
 ROOT_URLCONF = 'dawerha.urls'
 
 TEMPLATES = [
@@ -133,6 +137,32 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Game spins write-behind: spins are appended to a local fsync'd journal and
+# written to the database in batches by a background flusher (PostgreSQL only)
+GAME_SPIN_WRITE_BEHIND = config('GAME_SPIN_WRITE_BEHIND', default=False, cast=bool)
+GAME_SPIN_JOURNAL_DIR = config('GAME_SPIN_JOURNAL_DIR', default=str(BASE_DIR / 'journal'))
+GAME_SPIN_FLUSH_INTERVAL = config('GAME_SPIN_FLUSH_INTERVAL', default=1.0, cast=float)
+GAME_SPIN_FLUSH_BATCH_SIZE = config('GAME_SPIN_FLUSH_BATCH_SIZE', default=500, cast=int)
+
+# Cached company/influencer snapshots for the public game pages (seconds)
+GAME_SNAPSHOT_TIMEOUT = config('GAME_SNAPSHOT_TIMEOUT', default=300, cast=int)
+# With the local-memory cache (no REDIS_URL) each worker re-reads a cached
+# snapshot's version at most this often (seconds), to see changes made by
+# other processes
+GAME_SNAPSHOT_PROBE_INTERVAL = config('GAME_SNAPSHOT_PROBE_INTERVAL', default=1.0, cast=float)
+
+# How long the result of a spin is kept for retries with the same
+# idempotency key (seconds)
+GAME_SPIN_IDEMPOTENCY_TTL = config('GAME_SPIN_IDEMPOTENCY_TTL', default=600, cast=int)
+
+# Spins one ASGI worker draws and records at the same time (the others wait
+# without holding a database connection)
+GAME_SPIN_ASYNC_WRITERS = config('GAME_SPIN_ASYNC_WRITERS', default=2, cast=int)
+
+# Slots per company of the spin rollups: concurrent spins of a company add to
+# different rollup rows (1 puts every spin of an hour/prize on one row)
+GAME_SPIN_ROLLUP_SHARDS = config('GAME_SPIN_ROLLUP_SHARDS', default=16, cast=int)
+
 # Email settings (for production)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
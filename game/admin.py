@@ -8,7 +8,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from datetime import datetime
-from .models import GameSpin
+from .models import GameSpin, RejectedSpin, UserAgent
 
 
 @admin.register(GameSpin)
@@ -22,9 +22,9 @@ class GameSpinAdmin(admin.ModelAdmin):
         'created_at',
         'ip_address'
     ]
-    list_filter = ['won', 'company', 'created_at']
+    list_filter = ['won', 'company', 'created_at', 'user_agent__device', 'user_agent__browser']
     search_fields = ['visitor_name', 'visitor_phone', 'prize', 'company__name']
-    readonly_fields = ['created_at', 'session_id', 'ip_address', 'user_agent']
+    readonly_fields = ['created_at', 'session_id', 'ip_address', 'user_agent', 'idempotency_key']
     actions = ['export_to_excel']
 
     fieldsets = (
@@ -32,13 +32,13 @@ class GameSpinAdmin(admin.ModelAdmin):
             'fields': ('company', 'visitor_name', 'visitor_phone', 'prize', 'won')
         }),
         ('معلومات تقنية', {
-            'fields': ('session_id', 'ip_address', 'user_agent', 'created_at'),
+            'fields': ('session_id', 'ip_address', 'user_agent', 'idempotency_key', 'created_at'),
             'classes': ('collapse',)
         }),
     )
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('company')
+        return super().get_queryset(request).select_related('company', 'user_agent')
 
     def changelist_view(self, request, extra_context=None):
         """
@@ -75,6 +75,7 @@ class GameSpinAdmin(admin.ModelAdmin):
             'تاريخ الدورة',
             'عنوان IP',
             'المتصفح',
+            'نوع الجهاز',
         ]
 
         header_font = Font(bold=True, color="FFFFFF", size=12)
@@ -103,7 +104,9 @@ class GameSpinAdmin(admin.ModelAdmin):
                 ws.cell(row=row_num, column=7, value=str(created_val) if created_val else '-')
 
             ws.cell(row=row_num, column=8, value=spin.ip_address or '-')
-            ws.cell(row=row_num, column=9, value=spin.user_agent or '-')
+            user_agent = spin.user_agent
+            ws.cell(row=row_num, column=9, value=f'{user_agent.browser} - {user_agent.os}' if user_agent else '-')
+            ws.cell(row=row_num, column=10, value=user_agent.get_device_display() if user_agent else '-')
 
             row_num += 1
 
@@ -128,3 +131,27 @@ class GameSpinAdmin(admin.ModelAdmin):
         return response
 
     export_to_excel.short_description = "📊 تصدير دورات الألعاب إلى Excel"
+
+
+@admin.register(UserAgent)
+class UserAgentAdmin(admin.ModelAdmin):
+    list_display = ['browser', 'os', 'device', 'user_agent']
+    list_filter = ['device', 'browser', 'os']
+    search_fields = ['user_agent']
+    readonly_fields = ['digest', 'user_agent', 'device', 'browser', 'os']
+
+    def has_add_permission(self, request):
+        # Rows are created by the spins that first send a header
+        return False
+
+
+@admin.register(RejectedSpin)
+class RejectedSpinAdmin(admin.ModelAdmin):
+    list_display = ['id', 'company', 'prize', 'idempotency_key', 'recorded_spin_id', 'rejected_at']
+    list_filter = ['company', 'rejected_at']
+    search_fields = ['idempotency_key', 'company__name']
+    readonly_fields = ['id', 'company', 'prize', 'idempotency_key', 'recorded_spin_id', 'record', 'rejected_at']
+
+    def has_add_permission(self, request):
+        # Rows are created by the journal replay
+        return False
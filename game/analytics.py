@@ -0,0 +1,109 @@
+"""
+Spins-over-time analytics
+
+Spin counts of a company bucketed by hour, day or week (Asia/Riyadh) over
+any range of days. The buckets are computed in SQL with Trunc* over the
+hourly spin rollups, so a year of data is at most 8760 rollup rows per
+prize however many spins there were.
+
+Long ranges are split into pages of a bounded number of buckets; empty
+buckets are included so heat maps need no gap filling. Each page is cached:
+pages that end before today don't change and are kept for a day, pages that
+include today for a minute.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncWeek
+from django.utils import timezone
+
+from .models import SpinRollup
+
+GRANULARITIES = {
+    'hour': (TruncHour, timedelta(hours=1)),
+    'day': (TruncDay, timedelta(days=1)),
+    'week': (TruncWeek, timedelta(weeks=1)),
+}
+
+# Buckets per page: a week of hours, a quarter of days, a year of weeks
+PAGE_SIZES = {'hour': 168, 'day': 92, 'week': 53}
+
+MAX_RANGE_DAYS = 3 * 366
+
+CLOSED_PAGE_TIMEOUT = 24 * 60 * 60
+OPEN_PAGE_TIMEOUT = 60
+
+
+def _bucket_starts(granularity, start, end):
+    """Start of every bucket that overlaps the days ``start``..``end``"""
+    tz = timezone.get_default_timezone()
+    first = datetime.combine(start, time.min, tzinfo=tz)
+    if granularity == 'week':
+        # Weeks start on Monday (as TruncWeek)
+        first -= timedelta(days=start.weekday())
+    stop = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+    step = GRANULARITIES[granularity][1]
+    starts = []
+    current = first
+    while current < stop:
+        starts.append(current)
+        current += step
+    return starts, datetime.combine(start, time.min, tzinfo=tz), stop
+
+
+def spins_over_time(company_id, granularity, start, end, page=1):
+    """
+    Spin counts of a company per bucket for one page of the range.
+
+    Args:
+        granularity: 'hour', 'day' or 'week'
+        start, end: first and last day of the range (inclusive, Asia/Riyadh)
+        page: 1-based page number
+
+    Returns a dict with ``buckets`` (``start``/``spins`` dicts), ``page``,
+    ``pages`` and ``total`` (spins in the page). Raises ValueError for an
+    invalid granularity, range or page.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError('granularity')
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError('range')
+
+    starts, range_start, range_stop = _bucket_starts(granularity, start, end)
+    page_size = PAGE_SIZES[granularity]
+    pages = (len(starts) + page_size - 1) // page_size
+    if not 1 <= page <= pages:
+        raise ValueError('page')
+
+    page_starts = starts[(page - 1) * page_size:page * page_size]
+    page_from = max(page_starts[0], range_start)
+    page_to = min(page_starts[-1] + GRANULARITIES[granularity][1], range_stop)
+
+    today = timezone.localdate()
+    cache_key = f'spin-analytics:{company_id}:{granularity}:{start}:{end}:{page}'
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    trunc = GRANULARITIES[granularity][0]
+    tz = timezone.get_default_timezone()
+    rows = (
+        SpinRollup.objects.filter(company_id=company_id, hour__gte=page_from, hour__lt=page_to)
+        .annotate(bucket=trunc('hour', tzinfo=tz))
+        .values('bucket')
+        .annotate(spins=Sum('spins'))
+        .order_by()
+    )
+    counts = {row['bucket'].astimezone(tz): row['spins'] for row in rows}
+
+    buckets = [{'start': bucket.isoformat(), 'spins': counts.get(bucket, 0)} for bucket in page_starts]
+    result = {
+        'buckets': buckets,
+        'page': page,
+        'pages': pages,
+        'total': sum(bucket['spins'] for bucket in buckets),
+    }
+    closed = page_to <= datetime.combine(today, time.min, tzinfo=tz)
+    cache.set(cache_key, result, CLOSED_PAGE_TIMEOUT if closed else OPEN_PAGE_TIMEOUT)
+    return result
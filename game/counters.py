@@ -0,0 +1,39 @@
+"""
+Live spin counters ("total spins" and "spins today" badges)
+
+The counters are read from the daily spin rollups, which every spin already
+adds to (split over GAME_SPIN_ROLLUP_SHARDS slots, see game.rollups), so
+counting a spin costs no extra write. Reading them sums the company's daily
+rows - one per day, prize and slot used - cached for a few seconds.
+"""
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import DailySpinRollup
+
+READ_CACHE_TIMEOUT = 5
+
+
+def _read(company_id):
+    today = timezone.localdate()
+    totals = DailySpinRollup.objects.filter(company_id=company_id).aggregate(
+        total=Sum('spins'),
+        today=Sum('spins', filter=Q(day=today)),
+    )
+    return {'total_spins': totals['total'] or 0, 'today_spins': totals['today'] or 0}
+
+
+def spin_counters(company_id):
+    """``{'total_spins', 'today_spins'}`` of a company (a few seconds stale at most)"""
+    cache_key = f'spin-counters:{company_id}'
+    counters = cache.get(cache_key)
+    if counters is None:
+        counters = _read(company_id)
+        cache.set(cache_key, counters, READ_CACHE_TIMEOUT)
+    return counters
+
+
+aspin_counters = sync_to_async(spin_counters)
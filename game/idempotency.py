@@ -0,0 +1,76 @@
+"""
+Idempotency keys for spin requests
+
+The play page sends a key generated once per spin attempt and resends it when
+the request is retried (flaky venue Wi-Fi). The first request with a key
+claims it in the cache; the result is stored under the key, so a retry gets
+the original prize and spin id back without a new draw or a new row.
+
+A retry that arrives while the first request is still running waits briefly
+for its result.
+
+The claim is only shared between workers when the cache is (REDIS_URL); with
+the local-memory cache a retry can reach a worker that has not seen the key.
+That worker looks the key up in GameSpin before drawing, so a spin that was
+recorded is returned as is. If both requests run at the same time, the
+unique (company, idempotency_key) constraint keeps the second row from being
+written and the second request gives back the stock unit and spin-limit
+count it took (see game.views.draw_and_record_spin).
+"""
+import asyncio
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+PENDING = 'pending'
+
+# How long a retry waits for the request that claimed the key
+WAIT_TIMEOUT = 5
+POLL_INTERVAL = 0.05
+
+
+def is_valid_key(key):
+    return bool(key) and IDEMPOTENCY_KEY_PATTERN.match(key) is not None
+
+
+def _cache_key(company_id, key):
+    return f'spin-idempotency:{company_id}:{key}'
+
+
+async def aclaim(company_id, key):
+    """
+    Claim an idempotency key for a new spin.
+
+    Returns ``(True, None)`` if the caller should run the spin, or
+    ``(False, result)`` with the stored result of an earlier request
+    (``None`` if that request is still running).
+    """
+    cache_key = _cache_key(company_id, key)
+    timeout = settings.GAME_SPIN_IDEMPOTENCY_TTL
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        if await cache.aadd(cache_key, PENDING, timeout):
+            return True, None
+        value = await cache.aget(cache_key)
+        if value is not None and value != PENDING:
+            return False, value
+        if value is None:
+            # Released by a failed request (or evicted): claim it again
+            continue
+        if time.monotonic() >= deadline:
+            return False, None
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def acomplete(company_id, key, result):
+    """Store the result of the spin that claimed the key"""
+    await cache.aset(_cache_key(company_id, key), result, settings.GAME_SPIN_IDEMPOTENCY_TTL)
+
+
+async def arelease(company_id, key):
+    """Give up a claim after a failed spin, so a retry can run it"""
+    await cache.adelete(_cache_key(company_id, key))
@@ -0,0 +1,248 @@
+"""
+Crash-safe write-behind journal for game spins
+
+With GAME_SPIN_WRITE_BEHIND enabled, spin_wheel does not insert into the
+database. Instead:
+
+1. a spin id is taken from a block reserved up front from the GameSpin id
+   sequence, so the id in the response is final;
+2. the spin is appended as one JSON line to this process's journal segment
+   and fsync'd before the response is sent;
+3. a background flusher rotates the segment every GAME_SPIN_FLUSH_INTERVAL
+   seconds and writes closed segments with bulk_create, then deletes them.
+
+Each process holds an exclusive flock on the segment it is writing, so a
+segment that can be locked is closed and safe to drain - including the
+segments left behind by a process that crashed, which are replayed on the
+next flush (and at startup). Replays insert with ignore_conflicts on the
+reserved ids (and idempotency keys), so a segment drained twice never
+duplicates spins. A spin skipped because another spin recorded its
+idempotency key first is kept as a RejectedSpin, and its prize unit and
+spin-limit claim are given back (once, see game.spins.reject_spins).
+
+Reserving ids needs a database sequence, so write-behind is only used on
+PostgreSQL; elsewhere spins are written synchronously.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import GameSpin
+from .useragents import intern_user_agent
+
+logger = logging.getLogger(__name__)
+
+ID_BLOCK_SIZE = 100
+SEGMENT_PATTERN = 'spins-*.jsonl'
+
+_journal = None
+_journal_lock = threading.Lock()
+_unavailable = False
+
+
+def get_journal():
+    """
+    Return this process's journal, starting it on first use.
+
+    Returns ``None`` when write-behind is not available (not PostgreSQL).
+    """
+    global _journal, _unavailable
+    pid = os.getpid()
+    if _journal is not None and _journal.pid == pid:
+        return _journal
+    if _unavailable:
+        return None
+
+    with _journal_lock:
+        # A forked worker must not share its parent's journal
+        if _journal is None or _journal.pid != pid:
+            if connection.vendor != 'postgresql':
+                logger.warning("GAME_SPIN_WRITE_BEHIND needs PostgreSQL - writing spins synchronously")
+                _unavailable = True
+                return None
+            _journal = SpinJournal(settings.GAME_SPIN_JOURNAL_DIR)
+            _journal.start()
+    return _journal
+
+
+def spin_to_record(spin):
+    return {
+        'id': spin.id,
+        'company_id': spin.company_id,
+        'visitor_name': spin.visitor_name,
+        'visitor_phone': spin.visitor_phone,
+        'prize': spin.prize,
+        'won': spin.won,
+        'session_id': spin.session_id,
+        'ip_address': spin.ip_address,
+        'user_agent_id': spin.user_agent_id,
+        'idempotency_key': spin.idempotency_key,
+        'created_at': spin.created_at.isoformat(),
+    }
+
+
+def record_to_spin(record):
+    record = dict(record)
+    record['created_at'] = datetime.fromisoformat(record['created_at'])
+    if 'user_agent' in record:
+        # Written before user agents were interned
+        record['user_agent_id'] = intern_user_agent(record.pop('user_agent'))
+    return GameSpin(**record)
+
+
+class SpinIdAllocator:
+    """Hands out GameSpin ids reserved in blocks from the table's sequence"""
+
+    def __init__(self, block_size=ID_BLOCK_SIZE):
+        self.block_size = block_size
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            if not self._ids:
+                self._ids = self._reserve_block()
+            return self._ids.pop()
+
+    def _reserve_block(self):
+        table = GameSpin._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [table, self.block_size],
+            )
+            # Popped from the end, so keep them in descending order
+            return sorted((row[0] for row in cursor.fetchall()), reverse=True)
+
+
+class SpinJournal:
+    """Append-only, fsync'd spin journal with a background flusher"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pid = os.getpid()
+        self.ids = SpinIdAllocator()
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_number = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Open a segment and start the flusher (which first replays old segments)"""
+        with self._lock:
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='spin-journal-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def append(self, spin):
+        """Give the spin its reserved id and durably journal it; returns the id"""
+        spin.id = self.ids.next_id()
+        line = json.dumps(spin_to_record(spin), ensure_ascii=False) + '\n'
+        with self._lock:
+            self._segment.write(line.encode('utf-8'))
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+        return spin.id
+
+    def stop(self):
+        """Stop the flusher and drain everything written by this process"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.GAME_SPIN_FLUSH_INTERVAL * 5)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Spin journal: final flush failed, will be replayed on restart: {e}")
+
+    def flush(self):
+        """Rotate the current segment and write all closed segments to the database"""
+        with self._lock:
+            if self._segment is not None and self._segment.tell() > 0:
+                self._close_segment()
+                if not self._stop_event.is_set():
+                    self._open_segment()
+        return drain_segments(self.directory)
+
+    def _run(self):
+        while not self._stop_event.wait(settings.GAME_SPIN_FLUSH_INTERVAL):
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.exception(f"Spin journal flush failed (will retry): {e}")
+
+    def _open_segment(self):
+        self._segment_number += 1
+        name = f'spins-{self.pid}-{int(time.time() * 1000)}-{self._segment_number}.jsonl'
+        path = os.path.join(self.directory, name)
+        # Created under a name drainers ignore and renamed once locked, so a
+        # drainer can never take (and delete) a segment before it is locked
+        self._segment = open(path + '.new', 'ab')
+        # Held until the segment is closed: marks it as still being written
+        fcntl.flock(self._segment.fileno(), fcntl.LOCK_EX)
+        os.rename(path + '.new', path)
+
+    def _close_segment(self):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        fcntl.flock(self._segment.fileno(), fcntl.LOCK_UN)
+        self._segment.close()
+        self._segment = None
+
+
+def read_segment(path):
+    """Read the spins of a segment, skipping a torn last line from a crash"""
+    spins = []
+    with open(path, 'rb') as segment:
+        for number, line in enumerate(segment, 1):
+            try:
+                spins.append(record_to_spin(json.loads(line)))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Spin journal: skipping unreadable line {number} in {path}: {e}")
+    return spins
+
+
+def drain_segments(directory):
+    """
+    Write every closed segment in ``directory`` to the database and delete it.
+
+    Segments locked by a live writer (or by another drainer) are skipped.
+    Returns the number of spins written.
+    """
+    from .spins import persist_spins
+
+    written = 0
+    for path in sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN))):
+        try:
+            segment = open(path, 'rb')
+        except FileNotFoundError:
+            continue
+        with segment:
+            try:
+                fcntl.flock(segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            if not os.path.exists(path):
+                # Drained by another process while we waited for the lock
+                continue
+            spins = read_segment(path)
+            persist_spins(spins, replay=True)
+            os.unlink(path)
+            written += len(spins)
+    if written:
+        logger.info(f"Spin journal: wrote {written} spin(s) to the database")
+    return written
@@ -0,0 +1,82 @@
+"""
+Per-visitor spin limits ("one spin per phone number per day")
+
+A company's spin policy counts spins per visitor - the phone number or the
+browser session - within a period: the day, the current activation or the
+whole event. The count lives in a SpinClaim row keyed by (company, subject,
+period), so checking and counting a spin is one conditional UPDATE on that
+unique index (plus an INSERT for the visitor's first spin), however large
+GameSpin grows.
+"""
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SpinClaim
+
+
+class SpinLimitReached(Exception):
+    """The visitor has used all the spins allowed in the period"""
+
+
+def limit_message(company):
+    if company.spin_limit_period == 'day':
+        return 'لقد استخدمت جميع محاولاتك لهذا اليوم، حاول مرة أخرى غداً'
+    return 'لقد استخدمت جميع المحاولات المسموح بها'
+
+
+def limit_period(company, when=None):
+    """Key of the limit period of a company at ``when`` (default: now)"""
+    if company.spin_limit_period == 'day':
+        return timezone.localdate(when).isoformat()
+    if company.spin_limit_period == 'activation' and company.activation_start_time:
+        return f'activation:{int(company.activation_start_time.timestamp())}'
+    return 'event'
+
+
+def claim_spin(company, subject):
+    """
+    Count a spin for ``subject`` in the current period.
+
+    Returns ``False`` (and counts nothing) if the limit is reached.
+    ``company`` may be a Company or its cached snapshot.
+    """
+    period = limit_period(company)
+    claims = SpinClaim.objects.filter(company_id=company.pk, subject=subject, period=period)
+
+    def count_spin():
+        return claims.filter(spins__lt=company.spin_limit_count).update(spins=F('spins') + 1) == 1
+
+    if count_spin():
+        return True
+    try:
+        with transaction.atomic():
+            SpinClaim.objects.create(company_id=company.pk, subject=subject, period=period)
+        return True
+    except IntegrityError:
+        # Claimed by an earlier (or concurrent) spin of the same visitor
+        return count_spin()
+
+
+def spin_subject(company, spin):
+    """The visitor a recorded spin was counted for (``None`` without a limit)"""
+    if company.spin_limit_scope == 'phone':
+        return spin.visitor_phone
+    if company.spin_limit_scope == 'session':
+        return spin.session_id
+    return None
+
+
+def unclaim_spin(company, subject, when=None):
+    """Give back a spin counted (at ``when``, default: now) for a spin that failed"""
+    SpinClaim.objects.filter(
+        company_id=company.pk,
+        subject=subject,
+        period=limit_period(company, when),
+        spins__gt=0,
+    ).update(spins=F('spins') - 1)
+
+
+aclaim_spin = sync_to_async(claim_spin)
+aunclaim_spin = sync_to_async(unclaim_spin)
@@ -0,0 +1,103 @@
+"""
+Management command to benchmark prize selection
+Compares the compiled, cached prize sampler against the original per-spin path
+"""
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from companies.prizes import build_prize_config, get_prize_sampler, invalidate_prize_sampler
+
+
+def legacy_select_weighted_prize(company, prizes):
+    """The original per-spin selection: parse notes, normalize, choices + index"""
+    prize_percentages = None
+    if company.notes:
+        try:
+            notes_data = json.loads(company.notes)
+            if 'prize_percentages' in notes_data:
+                prize_percentages = notes_data['prize_percentages']
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+    if not prize_percentages or len(prize_percentages) != len(prizes):
+        equal_percentage = 100 / len(prizes)
+        prize_percentages = [equal_percentage] * len(prizes)
+
+    weights = [float(p) / 100.0 for p in prize_percentages]
+    total_weight = sum(weights)
+    if total_weight > 0:
+        normalized_weights = [w / total_weight for w in weights]
+    else:
+        normalized_weights = [1.0 / len(prizes)] * len(prizes)
+
+    selected_prize = random.choices(prizes, weights=normalized_weights, k=1)[0]
+    prizes.index(selected_prize)
+    return selected_prize
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the compiled prize sampler against the original per-spin selection path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spins',
+            type=int,
+            default=200000,
+            help='Number of spins to simulate for each path (default: 200000)',
+        )
+        parser.add_argument(
+            '--prizes',
+            type=int,
+            default=8,
+            help='Number of prizes on the wheel (default: 8)',
+        )
+
+    def handle(self, *args, **options):
+        spins = options['spins']
+        prize_count = options['prizes']
+
+        prizes = [f'جائزة {i + 1}' for i in range(prize_count)]
+        percentages = [random.randint(1, 40) for _ in prizes]
+        prizes_with_percentages = [
+            {'name': prize, 'percentage': percentage}
+            for prize, percentage in zip(prizes, percentages)
+        ]
+
+        # In-memory company - no database access is needed for this benchmark
+        company = Company(
+            pk=-1,
+            name='benchmark',
+            prizes=prizes,
+            prize_config=build_prize_config(prizes, weights=percentages),
+            notes=json.dumps({
+                'prize_percentages': percentages,
+                'prizes_with_percentages': prizes_with_percentages
+            }, ensure_ascii=False),
+        )
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(f'Prize selection benchmark: {spins} spins, {prize_count} prizes')
+        self.stdout.write('=' * 70)
+
+        start = time.perf_counter()
+        for _ in range(spins):
+            legacy_select_weighted_prize(company, prizes)
+        legacy_seconds = time.perf_counter() - start
+
+        invalidate_prize_sampler(company.pk)
+        start = time.perf_counter()
+        for _ in range(spins):
+            get_prize_sampler(company).draw()
+        sampler_seconds = time.perf_counter() - start
+        invalidate_prize_sampler(company.pk)
+
+        legacy_us = legacy_seconds / spins * 1e6
+        sampler_us = sampler_seconds / spins * 1e6
+        self.stdout.write(f'Original path:    {legacy_us:8.2f} µs/spin ({legacy_seconds:.3f}s total)')
+        self.stdout.write(f'Compiled sampler: {sampler_us:8.2f} µs/spin ({sampler_seconds:.3f}s total)')
+        if sampler_seconds > 0:
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {legacy_seconds / sampler_seconds:.1f}x'))
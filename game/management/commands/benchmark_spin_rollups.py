@@ -0,0 +1,160 @@
+"""
+Management command to benchmark spin throughput with the rollup slots
+Writes spins of one company from concurrent threads through persist_spins(),
+with prizes drawn from a weighted wheel: without rollup maintenance, with
+every spin on one rollup row per prize (one slot) and with the rollups split
+over GAME_SPIN_ROLLUP_SHARDS slots, and checks that the rollups and the live
+counters add up to the spins written
+"""
+import random
+import statistics
+import threading
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import override_settings
+
+from companies.models import Company
+from companies.prizes import PrizeSampler
+from game.counters import spin_counters
+from game.models import DailySpinRollup, GameSpin, SpinRollup
+from game.spins import persist_spins
+
+# A typical cafe wheel (prize, percentage)
+PRIZE_MIX = [
+    ('خصم 10%', 40),
+    ('قهوة مجانية', 25),
+    ('حلى مجاني', 15),
+    ('خصم 20%', 10),
+    ('حظ أوفر', 9),
+    ('وجبة مجانية', 1),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent spin writes of one company without rollups, with one rollup slot and with sharded rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Number of concurrent writers (default: 16)',
+        )
+        parser.add_argument(
+            '--spins',
+            type=int,
+            default=200,
+            help='Spins written by each thread (default: 200)',
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=None,
+            help='Rollup slots per company (default: GAME_SPIN_ROLLUP_SHARDS)',
+        )
+
+    def handle(self, *args, **options):
+        threads, spins = options['threads'], options['spins']
+        shards = options['shards'] or settings.GAME_SPIN_ROLLUP_SHARDS
+        if shards <= 1:
+            raise CommandError('The sharded run needs more than one rollup slot')
+
+        self.stdout.write('=' * 70)
+        self.stdout.write(
+            f'Spin rollup benchmark: {threads} threads x {spins} spins on one company, '
+            f'{len(PRIZE_MIX)} prizes ({connection.vendor})'
+        )
+        self.stdout.write('=' * 70)
+
+        results = {}
+        for label, slots in [('Without rollups', 0), ('One rollup slot', 1), (f'{shards} rollup slots', shards)]:
+            with ExitStack() as stack:
+                if slots:
+                    stack.enter_context(override_settings(GAME_SPIN_ROLLUP_SHARDS=slots))
+                else:
+                    stack.enter_context(mock.patch('game.spins.add_to_rollups'))
+                seconds, latencies, counted = self.run(threads, spins)
+            results[label] = threads * spins / seconds
+            latencies.sort()
+            self.stdout.write(
+                f'{label:<18} {results[label]:8.0f} spins/s ({seconds:.2f}s)  '
+                f'p50 {statistics.median(latencies) * 1000:6.1f} ms  '
+                f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.1f} ms'
+            )
+            if slots and any(count != threads * spins for count in counted):
+                raise CommandError(
+                    f'{label}: hourly/daily rollups and live counter show {counted} of {threads * spins} spins'
+                )
+
+        baseline = results['Without rollups']
+        sharded = results[f'{shards} rollup slots']
+        self.stdout.write(self.style.SUCCESS(
+            f'Sharded rollups: {sharded / baseline:.0%} of the throughput without rollups, '
+            f'one slot: {results["One rollup slot"] / baseline:.0%}'
+        ))
+
+    def run(self, threads, spins):
+        """
+        Write ``spins`` spins from each of ``threads`` threads; returns
+        (seconds, per-spin latencies, [hourly, daily, counter] spin totals)
+        """
+        company = Company.objects.create(
+            name='Spin Rollup Benchmark',
+            type='cafe',
+            email='spin-rollup@example.com',
+            prizes=[prize for prize, _ in PRIZE_MIX],
+            status='approved',
+            is_active=True,
+        )
+        sampler = PrizeSampler([prize for prize, _ in PRIZE_MIX], [percentage for _, percentage in PRIZE_MIX])
+        try:
+            barrier = threading.Barrier(threads + 1)
+            errors = []
+            latencies = []
+
+            def write(index):
+                rng = random.Random(index)
+                own = []
+                try:
+                    barrier.wait()
+                    for number in range(spins):
+                        spin = GameSpin(
+                            company_id=company.pk,
+                            visitor_name=f'Benchmark {index}-{number}',
+                            visitor_phone=f'05{rng.randrange(10 ** 8):08d}' if rng.random() < 0.5 else None,
+                            prize=sampler.draw(rng),
+                        )
+                        start = time.perf_counter()
+                        persist_spins([spin])
+                        own.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    latencies.extend(own)
+                    connection.close()
+
+            workers = [threading.Thread(target=write, args=(index,)) for index in range(threads)]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for worker in workers:
+                worker.join()
+            seconds = time.perf_counter() - start
+            if errors:
+                raise CommandError(f'{len(errors)} writer(s) failed: {errors[0]}')
+
+            counted = [
+                SpinRollup.objects.filter(company=company).aggregate(total=Sum('spins'))['total'] or 0,
+                DailySpinRollup.objects.filter(company=company).aggregate(total=Sum('spins'))['total'] or 0,
+                spin_counters(company.pk)['total_spins'],
+            ]
+        finally:
+            company.delete()
+        return seconds, latencies, counted
@@ -0,0 +1,173 @@
+"""
+Management command to check the spin journal replay after a crash
+A child process journals spins (taking their prize stock and spin-limit
+claims like the spin endpoint) and is killed before it flushes. Some of its
+idempotency keys were already recorded by "another worker". The segment is
+then replayed twice (as after a crash between the database commit and the
+segment delete), and the spins, rejected spins, stock and claims must add up
+"""
+import glob
+import os
+import shutil
+import signal
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test.utils import override_settings
+
+from companies.inventory import take_stock
+from companies.models import Company, PrizeInventory
+from game.journal import SEGMENT_PATTERN, SpinJournal, drain_segments
+from game.limits import claim_spin
+from game.models import DailySpinRollup, GameSpin, RejectedSpin, SpinClaim
+from game.spins import persist_spins
+
+STOCK = 1000
+LIMITED = 'Limited'
+
+
+class Command(BaseCommand):
+    help = 'Crash a journaling process, replay its segment twice and check spins, rejections, stock and claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--spins',
+            type=int,
+            default=200,
+            help='Spins journaled by the crashing process (default: 200)',
+        )
+        parser.add_argument(
+            '--conflict-every',
+            type=int,
+            default=4,
+            help='Every Nth idempotency key is recorded by another worker first (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The spin journal needs PostgreSQL')
+
+        company = Company.objects.create(
+            name='Journal Replay Check',
+            type='cafe',
+            email='journal-replay@example.com',
+            prizes=[LIMITED, 'Other'],
+            status='approved',
+            is_active=True,
+            spin_limit_scope='phone',
+            spin_limit_period='day',
+            spin_limit_count=100,
+        )
+        PrizeInventory.objects.create(company=company, prize=LIMITED, stock=STOCK)
+        directory = tempfile.mkdtemp(prefix='journal-replay-')
+        try:
+            failures = self.replay(company, directory, options['spins'], options['conflict_every'])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+            company.delete()
+
+        if failures:
+            raise CommandError('The replayed journal does not add up')
+        self.stdout.write(self.style.SUCCESS('Journal replay OK'))
+
+    def spin(self, company, number):
+        return GameSpin(
+            company_id=company.pk,
+            visitor_name=f'Replay {number}',
+            visitor_phone=f'05{number % 10:08d}',
+            prize=LIMITED if number % 3 == 0 else 'Other',
+            idempotency_key=f'replay-{number}',
+        )
+
+    def draw(self, company, spin):
+        """Take the claims the spin endpoint takes for a spin"""
+        if not claim_spin(company, spin.visitor_phone):
+            raise CommandError(f'Spin limit reached for {spin.visitor_phone}')
+        if spin.prize == LIMITED and not take_stock(company.pk, spin.prize):
+            raise CommandError('Out of stock')
+
+    def replay(self, company, directory, count, every):
+        conflicts = [number for number in range(count) if number % every == 0]
+        # Recorded by another worker before the journal is replayed
+        for number in conflicts:
+            spin = self.spin(company, number)
+            self.draw(company, spin)
+            persist_spins([spin])
+
+        self.crash(company, directory, count)
+        segments = glob.glob(os.path.join(directory, SEGMENT_PATTERN))
+        if not segments:
+            raise CommandError('The crashed process left no journal segment')
+        for path in segments:
+            shutil.copy(path, path + '.bak')
+
+        drain_segments(directory)
+        first = self.state(company)
+        # Crash between the commit and the delete: the segment comes back
+        for path in segments:
+            os.rename(path + '.bak', path)
+        drain_segments(directory)
+        second = self.state(company)
+
+        rejected = RejectedSpin.objects.filter(company=company)
+        expected = {
+            'spins': count,
+            'rejected': len(conflicts),
+            'stock': STOCK - GameSpin.objects.filter(company=company, prize=LIMITED).count(),
+            'claims': count,
+            'rollups': count,
+        }
+        checks = [
+            ('spins written once per idempotency key', first['spins'] == expected['spins']),
+            ('conflicting spins dead-lettered', first['rejected'] == expected['rejected']),
+            ('rejected ids were never written',
+             not GameSpin.objects.filter(id__in=rejected.values('id')).exists()),
+            ('rejected spins point at the recorded spin',
+             not rejected.filter(recorded_spin_id__isnull=True).exists()),
+            ('stock of rejected spins given back once', first['stock'] == expected['stock']),
+            ('limit claims of rejected spins given back once', first['claims'] == expected['claims']),
+            ('rollups count written spins only', first['rollups'] == expected['rollups']),
+            ('second replay changed nothing', second == first),
+        ]
+        self.stdout.write(f'{count} journaled spin(s), {len(conflicts)} with a key recorded elsewhere')
+        self.stdout.write(f'after replay: {first}')
+        self.stdout.write(f'expected:     {expected}')
+        failures = 0
+        for label, ok in checks:
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f'{"OK  " if ok else "FAIL"} {label}'))
+            failures += not ok
+        return failures
+
+    def crash(self, company, directory, count):
+        """Journal ``count`` spins in a child process and SIGKILL it before it flushes"""
+        marker = os.path.join(directory, 'journaled')
+        connections.close_all()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with override_settings(GAME_SPIN_FLUSH_INTERVAL=3600):
+                    journal = SpinJournal(directory)
+                    journal.start()
+                    for number in range(count):
+                        spin = self.spin(company, number)
+                        self.draw(company, spin)
+                        journal.append(spin)
+                open(marker, 'w').close()
+            finally:
+                os.kill(os.getpid(), signal.SIGKILL)
+        os.waitpid(pid, 0)
+        if not os.path.exists(marker):
+            raise CommandError('The journaling process failed before it was killed')
+        os.unlink(marker)
+
+    def state(self, company):
+        return {
+            'spins': GameSpin.objects.filter(company=company).count(),
+            'rejected': RejectedSpin.objects.filter(company=company).count(),
+            'stock': PrizeInventory.objects.get(company=company, prize=LIMITED).stock,
+            'claims': SpinClaim.objects.filter(company=company).aggregate(total=Sum('spins'))['total'] or 0,
+            'rollups': DailySpinRollup.objects.filter(company=company).aggregate(total=Sum('spins'))['total'] or 0,
+        }
@@ -0,0 +1,39 @@
+"""
+Management command to count the unique visitors of a company
+Prints the estimate from the daily HyperLogLog sketches and, with --exact,
+the exact count from the spins (for audits)
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.models import Company
+from game.rollups import unique_visitors
+
+
+class Command(BaseCommand):
+    help = 'Count the unique visitors of a company over a range of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', type=int, help='Company id')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='Last day (YYYY-MM-DD)')
+        parser.add_argument(
+            '--exact',
+            action='store_true',
+            help='Also count exactly by scanning the spins',
+        )
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(id=options['company']).first()
+        if company is None:
+            raise CommandError(f'No company with id {options["company"]}')
+
+        start, end = options['start'], options['end']
+        estimate = unique_visitors(company.pk, start, end)
+        self.stdout.write(f'{company.name}: ~{estimate} unique visitor(s) (estimate)')
+
+        if options['exact']:
+            exact = unique_visitors(company.pk, start, end, exact=True)
+            error = abs(estimate - exact) / exact * 100 if exact else 0.0
+            self.stdout.write(f'{company.name}: {exact} unique visitor(s) (exact, estimate off by {error:.2f}%)')
@@ -0,0 +1,31 @@
+"""
+Management command to write journaled spins to the database
+Drains closed segments of the write-behind spin journal, including segments
+left behind by crashed workers
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from game.journal import drain_segments
+
+
+class Command(BaseCommand):
+    help = 'Write closed spin journal segments (GAME_SPIN_WRITE_BEHIND) to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=None,
+            help='Journal directory (default: GAME_SPIN_JOURNAL_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.GAME_SPIN_JOURNAL_DIR
+        if not os.path.isdir(directory):
+            self.stdout.write(f'No journal directory at {directory}')
+            return
+
+        written = drain_segments(directory)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} journaled spin(s) to the database'))
@@ -0,0 +1,155 @@
+"""
+Management command to load test the spin endpoint of a running server
+Opens N concurrent clients (asyncio, one connection per spin like phones on
+venue Wi-Fi) that post spins for a temporary company until the duration is
+over, optionally sending the body after a delay to simulate slow uplinks,
+and reports throughput, latency percentiles and errors. Run it against
+start_production.sh (gthread) and start_production_asgi.sh (Uvicorn) on the
+same database to compare the two.
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from companies.models import Company
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent spin requests at a running server and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the server (default: http://127.0.0.1:8000)',
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=500,
+            help='Number of concurrent clients (default: 500)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Seconds to run (default: 30)',
+        )
+        parser.add_argument(
+            '--slow-upload',
+            type=float,
+            default=0,
+            help='Milliseconds between sending the headers and the body (default: 0)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Seconds before a request counts as timed out (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only http:// URLs are supported')
+
+        # The server must use the same database to see this company
+        company = Company.objects.create(
+            name='Spin Load Test',
+            type='cafe',
+            email='load-test@example.com',
+            prizes=['A', 'B', 'C'],
+            status='approved',
+            is_active=True,
+        )
+        try:
+            path = reverse('game:spin', args=[company.public_token])
+            results, seconds = asyncio.run(self.run(
+                url.hostname,
+                url.port or 80,
+                path,
+                options['clients'],
+                options['duration'],
+                options['slow_upload'] / 1000,
+                options['timeout'],
+            ))
+        finally:
+            company.delete()
+
+        statuses = Counter(status for status, _ in results)
+        latencies = [latency for status, latency in results if status == 200]
+        self.stdout.write('=' * 70)
+        self.stdout.write(
+            f'{options["clients"]} clients, {seconds:.1f}s, slow upload {options["slow_upload"]:.0f} ms: '
+            f'{url.geturl()}'
+        )
+        self.stdout.write('=' * 70)
+        self.stdout.write(f'Requests:   {len(results)} ({dict(sorted(statuses.items(), key=str))})')
+        self.stdout.write(f'Throughput: {len(latencies) / seconds:.1f} successful spins/s')
+        self.stdout.write(
+            f'Latency:    p50 {percentile(latencies, 0.5) * 1000:.0f} ms, '
+            f'p95 {percentile(latencies, 0.95) * 1000:.0f} ms, '
+            f'p99 {percentile(latencies, 0.99) * 1000:.0f} ms'
+        )
+
+    async def run(self, host, port, path, clients, duration, slow_upload, timeout):
+        """Run the clients; returns ``([(status, seconds)], elapsed seconds)``"""
+        results = []
+        deadline = time.monotonic() + duration
+
+        async def client(index):
+            number = 0
+            while time.monotonic() < deadline:
+                number += 1
+                started = time.monotonic()
+                try:
+                    status = await asyncio.wait_for(
+                        self.spin(host, port, path, f'Load {index}-{number}', slow_upload),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    status = 'timeout'
+                except OSError as e:
+                    status = type(e).__name__
+                    # Don't spin on a refused connection
+                    await asyncio.sleep(0.1)
+                results.append((status, time.monotonic() - started))
+
+        started = time.monotonic()
+        await asyncio.gather(*(client(index) for index in range(clients)))
+        return results, time.monotonic() - started
+
+    async def spin(self, host, port, path, visitor_name, slow_upload):
+        """Post one spin on a new connection and return the response status"""
+        body = json.dumps({'visitor_name': visitor_name}).encode('utf-8')
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(
+                f'POST {path} HTTP/1.1\r\n'
+                f'Host: {host}:{port}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode('latin-1')
+            )
+            if slow_upload:
+                await writer.drain()
+                await asyncio.sleep(slow_upload)
+            writer.write(body)
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1]) if status_line else 'closed'
+        finally:
+            writer.close()
@@ -0,0 +1,24 @@
+"""
+Management command to merge the pending visitor sketch updates
+Folds the register updates appended by spins into the daily visitor sketches
+and deletes them. Run it periodically (e.g. every minute from cron)
+"""
+from django.core.management.base import BaseCommand
+
+from game.rollups import merge_visitor_sketches
+
+
+class Command(BaseCommand):
+    help = 'Merge the pending register updates into the daily visitor sketches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Updates merged per transaction (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        merged = merge_visitor_sketches(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Merged {merged} visitor sketch update(s)'))
@@ -0,0 +1,46 @@
+"""
+Management command to rebuild the spin rollups from GameSpin
+Backfills SpinRollup/DailySpinRollup (which the live spin counters read) and
+the daily visitor sketches for existing spins, or recomputes them after spins were
+changed or deleted outside the game. Spins of a company wait while its
+rollups are rebuilt.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.models import Company
+from game.models import DailySpinRollup, SpinRollup, VisitorSketch
+from game.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly and daily spin rollups, and visitor sketches from the spins table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            action='append',
+            dest='companies',
+            help='Only rebuild this company (id, can be repeated; default: all companies)',
+        )
+
+    def handle(self, *args, **options):
+        company_ids = options['companies']
+        if company_ids:
+            missing = set(company_ids) - set(Company.objects.filter(id__in=company_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f'No company with id {", ".join(str(pk) for pk in sorted(missing))}')
+
+        rebuild_rollups(company_ids)
+
+        hourly = SpinRollup.objects.all()
+        daily = DailySpinRollup.objects.all()
+        sketches = VisitorSketch.objects.all()
+        if company_ids:
+            hourly = hourly.filter(company_id__in=company_ids)
+            daily = daily.filter(company_id__in=company_ids)
+            sketches = sketches.filter(company_id__in=company_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt spin rollups: {hourly.count()} hourly and {daily.count()} daily row(s), '
+            f'{sketches.count()} daily visitor sketch(es)'
+        ))
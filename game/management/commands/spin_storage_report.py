@@ -0,0 +1,155 @@
+"""
+Management command to report the storage used by game spins
+Prints the table and index sizes of GameSpin and the interned user agents,
+optionally after loading a synthetic dataset into a temporary company
+(PostgreSQL, or SQLite built with the dbstat table)
+"""
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from companies.models import Company
+from game.models import GameSpin, UserAgent
+from game.useragents import intern_user_agent
+
+BATCH_SIZE = 10000
+
+_DEVICES = [
+    'iPhone; CPU iPhone OS {major}_{minor} like Mac OS X',
+    'Linux; Android {major}; SM-A{minor}5F',
+    'iPad; CPU OS {major}_{minor} like Mac OS X',
+    'Windows NT 10.0; Win64; x64',
+]
+_BROWSERS = [
+    'AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{major}.{minor} Mobile/15E148 Safari/604.1',
+    'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{build}.0.{patch}.0 Mobile Safari/537.36',
+    'AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 Snapchat/{build}.{minor}.0.{patch}',
+    'AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 Instagram {build}.0.0.{patch} (iPhone14,5; iOS 17_1; ar_SA)',
+]
+
+
+def _synthetic_headers(count):
+    rng = random.Random(count)
+    headers = set()
+    while len(headers) < count:
+        values = {
+            'major': rng.randint(10, 17),
+            'minor': rng.randint(0, 9),
+            'build': rng.randint(100, 130),
+            'patch': rng.randint(1000, 6000),
+        }
+        device = rng.choice(_DEVICES).format(**values)
+        browser = rng.choice(_BROWSERS).format(**values)
+        headers.add(f'Mozilla/5.0 ({device}) {browser}')
+    return sorted(headers)
+
+
+class Command(BaseCommand):
+    help = 'Report the table and index sizes of game spins and interned user agents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help='Load this many synthetic spins into a temporary company first',
+        )
+        parser.add_argument(
+            '--user-agents',
+            type=int,
+            default=3000,
+            help='Distinct user agents in the synthetic spins (default: 3000)',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the synthetic spins (delete the "Storage Report" company to remove them)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError('Sizes can only be read on PostgreSQL and SQLite')
+
+        company = None
+        self.user_agent_ids = []
+        if options['synthetic']:
+            company = Company.objects.create(
+                name='Storage Report',
+                type='cafe',
+                email='storage-report@example.com',
+                prizes=['A', 'B'],
+                status='approved',
+            )
+        try:
+            if company is not None:
+                self.load(company, options['synthetic'], options['user_agents'])
+            self.report()
+        finally:
+            if company is not None and not options['keep']:
+                company.delete()
+                # Synthetic user agents that no real spin uses
+                UserAgent.objects.filter(pk__in=self.user_agent_ids, spins__isnull=True).delete()
+
+    def load(self, company, count, user_agent_count):
+        """Insert ``count`` spins with Zipf-distributed user agents"""
+        started = time.perf_counter()
+        self.user_agent_ids = user_agent_ids = [
+            intern_user_agent(header) for header in _synthetic_headers(user_agent_count)
+        ]
+        weights = [1 / (rank + 1) for rank in range(len(user_agent_ids))]
+        start = timezone.now() - timedelta(days=90)
+        rng = random.Random(count)
+
+        for offset in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - offset)
+            chosen = rng.choices(user_agent_ids, weights, k=size)
+            GameSpin.objects.bulk_create([
+                GameSpin(
+                    company_id=company.pk,
+                    visitor_name=f'زائر {(offset + index) % 5000}',
+                    visitor_phone=f'05{rng.randrange(10 ** 8):08d}' if rng.random() < 0.5 else None,
+                    prize='AB'[index % 2],
+                    session_id=uuid.uuid4().hex if rng.random() < 0.7 else None,
+                    ip_address=f'10.{index % 256}.{(offset // 256) % 256}.{rng.randint(1, 254)}',
+                    user_agent_id=user_agent,
+                    created_at=start + timedelta(seconds=(offset + index) * 5),
+                )
+                for index, user_agent in enumerate(chosen)
+            ])
+        self.stdout.write(f'Loaded {count} synthetic spins in {time.perf_counter() - started:.1f}s')
+
+    def report(self):
+        self.stdout.write(f'{"Table":<24} {"Rows":>12} {"Table MB":>10} {"Indexes MB":>11}')
+        for model in (GameSpin, UserAgent):
+            table = model._meta.db_table
+            table_bytes, index_bytes = self.sizes(table)
+            self.stdout.write(
+                f'{table:<24} {model.objects.count():>12} '
+                f'{table_bytes / 2 ** 20:>10.1f} {index_bytes / 2 ** 20:>11.1f}'
+            )
+
+    def sizes(self, table):
+        """Return (table bytes, index bytes) of a table"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass)',
+                    [table, table],
+                )
+                return cursor.fetchone()
+            try:
+                cursor.execute(
+                    'SELECT coalesce(sum(CASE WHEN m.type = %s THEN d.pgsize END), 0), '
+                    'coalesce(sum(CASE WHEN m.type = %s THEN d.pgsize END), 0) '
+                    'FROM dbstat AS d JOIN sqlite_schema AS m ON m.name = d.name '
+                    'WHERE m.tbl_name = %s',
+                    ['table', 'index', table],
+                )
+            except OperationalError as e:
+                raise CommandError(f'This SQLite build has no dbstat table: {e}')
+            return cursor.fetchone()
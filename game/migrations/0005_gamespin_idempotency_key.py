@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0015_prizeinventory'),
+        ('game', '0004_add_visitor_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamespin',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='يرسله المتصفح مع كل محاولة دوران لمنع تكرار الدورة عند إعادة الإرسال', max_length=64, null=True, verbose_name='مفتاح الطلب'),
+        ),
+        migrations.AddConstraint(
+            model_name='gamespin',
+            constraint=models.UniqueConstraint(fields=('company', 'idempotency_key'), name='gamespin_idempotency_key_unique'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0005_gamespin_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpinClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(help_text='رقم الجوال أو معرف الجلسة حسب حد المحاولات', max_length=100, verbose_name='الزائر')),
+                ('period', models.CharField(max_length=40, verbose_name='المدة')),
+                ('spins', models.PositiveSmallIntegerField(default=1, verbose_name='عدد المحاولات')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ أول محاولة')),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='spin_claims', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'محاولات زائر',
+                'verbose_name_plural': 'محاولات الزوار',
+                'constraints': [models.UniqueConstraint(fields=('company', 'subject', 'period'), name='spinclaim_unique')],
+            },
+        ),
+    ]
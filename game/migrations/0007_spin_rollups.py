@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0006_spinclaim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpinRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('prize', models.CharField(max_length=200, verbose_name='الجائزة')),
+                ('spins', models.PositiveIntegerField(default=0, verbose_name='عدد الدورات')),
+            ],
+            options={
+                'verbose_name': 'إحصائية دورات يومية',
+                'verbose_name_plural': 'إحصائيات الدورات اليومية',
+            },
+        ),
+        migrations.CreateModel(
+            name='SpinRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='الساعة')),
+                ('prize', models.CharField(max_length=200, verbose_name='الجائزة')),
+                ('spins', models.PositiveIntegerField(default=0, verbose_name='عدد الدورات')),
+            ],
+            options={
+                'verbose_name': 'إحصائية دورات بالساعة',
+                'verbose_name_plural': 'إحصائيات الدورات بالساعة',
+            },
+        ),
+        migrations.AlterField(
+            model_name='gamespin',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='spins', to='companies.company', verbose_name='الشركة'),
+        ),
+        migrations.AddIndex(
+            model_name='gamespin',
+            index=models.Index(fields=['company', '-created_at'], name='gamespin_company_recent_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyspinrollup',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_spin_rollups', to='companies.company', verbose_name='الشركة'),
+        ),
+        migrations.AddField(
+            model_name='spinrollup',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='spin_rollups', to='companies.company', verbose_name='الشركة'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyspinrollup',
+            constraint=models.UniqueConstraint(fields=('company', 'day', 'prize'), name='dailyspinrollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='spinrollup',
+            constraint=models.UniqueConstraint(fields=('company', 'hour', 'prize'), name='spinrollup_unique'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0007_spin_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('registers', models.BinaryField(verbose_name='بيانات التقدير')),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'تقدير الزوار اليومي',
+                'verbose_name_plural': 'تقديرات الزوار اليومية',
+                'constraints': [models.UniqueConstraint(fields=('company', 'day'), name='visitorsketch_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0008_visitorsketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpinCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='الخانة')),
+                ('total', models.PositiveBigIntegerField(default=0, verbose_name='إجمالي الدورات')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('today', models.PositiveIntegerField(default=0, help_text='دورات اليوم المسجل في حقل اليوم', verbose_name='دورات اليوم')),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='spin_counters', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'عداد دورات',
+                'verbose_name_plural': 'عدادات الدورات',
+                'constraints': [models.UniqueConstraint(fields=('company', 'slot'), name='spincounter_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,160 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:14
+
+import hashlib
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.db.models.functions import MD5
+
+# Spins updated per transaction (the backfill can run on a live table)
+BATCH_SIZE = 50000
+
+# The header parsing of game.useragents at the time of this migration
+_BOT = re.compile(r'bot|crawl|spider|slurp|preview|curl|wget|python-requests|httpclient|headless', re.I)
+_TABLET = re.compile(r'ipad|tablet|kindle|silk|sm-t\d|(android(?!.*mobile))', re.I)
+_MOBILE = re.compile(r'mobile|iphone|ipod|android|windows phone|blackberry|opera mini', re.I)
+
+_BROWSERS = [
+    ('Snapchat', re.compile(r'snapchat', re.I)),
+    ('Instagram', re.compile(r'instagram', re.I)),
+    ('TikTok', re.compile(r'tiktok|musical_ly|bytedancewebview', re.I)),
+    ('Facebook', re.compile(r'fban|fbav|fb_iab', re.I)),
+    ('X', re.compile(r'twitter', re.I)),
+    ('WhatsApp', re.compile(r'whatsapp', re.I)),
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.I)),
+    ('Opera', re.compile(r'opr/|opera|opt/', re.I)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.I)),
+    ('Huawei Browser', re.compile(r'huaweibrowser', re.I)),
+    ('Firefox', re.compile(r'firefox|fxios', re.I)),
+    ('Chrome', re.compile(r'chrome|crios|chromium', re.I)),
+    ('Safari', re.compile(r'safari|applewebkit', re.I)),
+]
+
+_SYSTEMS = [
+    ('iOS', re.compile(r'iphone|ipad|ipod|ios', re.I)),
+    ('Android', re.compile(r'android', re.I)),
+    ('Windows', re.compile(r'windows', re.I)),
+    ('macOS', re.compile(r'mac os x|macintosh', re.I)),
+    ('Linux', re.compile(r'linux|x11|cros', re.I)),
+]
+
+
+def _family(families, header):
+    for name, pattern in families:
+        if pattern.search(header):
+            return name
+    return 'Other'
+
+
+def _user_agent(UserAgent, header):
+    """Unsaved UserAgent row of a header (digest is MD5, like the MD5() lookup below)"""
+    if _BOT.search(header):
+        device = 'bot'
+    elif _TABLET.search(header):
+        device = 'tablet'
+    elif _MOBILE.search(header):
+        device = 'mobile'
+    else:
+        device = 'desktop'
+    return UserAgent(
+        digest=hashlib.md5(header.encode('utf-8')).hexdigest(),
+        user_agent=header,
+        device=device,
+        browser=_family(_BROWSERS, header),
+        os=_family(_SYSTEMS, header),
+    )
+
+
+def _id_ranges(GameSpin):
+    bounds = GameSpin.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, BATCH_SIZE):
+        yield GameSpin.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE)
+
+
+def intern_user_agents(apps, schema_editor):
+    """Create a UserAgent row per distinct header and point the spins at it"""
+    GameSpin = apps.get_model('game', 'GameSpin')
+    UserAgent = apps.get_model('game', 'UserAgent')
+
+    headers = (
+        GameSpin.objects.exclude(user_agent__isnull=True).exclude(user_agent='')
+        .order_by().values_list('user_agent', flat=True).distinct()
+    )
+    rows = []
+    for header in headers.iterator(chunk_size=2000):
+        rows.append(_user_agent(UserAgent, header))
+        if len(rows) >= 1000:
+            UserAgent.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    UserAgent.objects.bulk_create(rows, ignore_conflicts=True)
+
+    user_agent_id = Subquery(
+        UserAgent.objects.filter(digest=MD5(OuterRef('user_agent'))).values('pk')[:1]
+    )
+    for spins in _id_ranges(GameSpin):
+        with transaction.atomic():
+            spins.exclude(user_agent__isnull=True).exclude(user_agent='').update(user_agent_ref=user_agent_id)
+            # Spins without a session used to get a made-up "session_<timestamp>" id
+            spins.filter(session_id__startswith='session_').update(session_id=None)
+
+
+def restore_user_agents(apps, schema_editor):
+    GameSpin = apps.get_model('game', 'GameSpin')
+    UserAgent = apps.get_model('game', 'UserAgent')
+
+    header = Subquery(UserAgent.objects.filter(pk=OuterRef('user_agent_ref')).values('user_agent')[:1])
+    for spins in _id_ranges(GameSpin):
+        with transaction.atomic():
+            spins.filter(user_agent_ref__isnull=False).update(user_agent=header)
+
+
+class Migration(migrations.Migration):
+
+    # The backfill commits in batches
+    atomic = False
+
+    dependencies = [
+        ('game', '0009_spincounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, help_text='MD5 لنص المتصفح', max_length=32, unique=True, verbose_name='البصمة')),
+                ('user_agent', models.TextField(verbose_name='معلومات المتصفح')),
+                ('device', models.CharField(choices=[('mobile', 'جوال'), ('tablet', 'جهاز لوحي'), ('desktop', 'كمبيوتر'), ('bot', 'برنامج آلي')], max_length=10, verbose_name='نوع الجهاز')),
+                ('browser', models.CharField(max_length=30, verbose_name='المتصفح')),
+                ('os', models.CharField(max_length=30, verbose_name='نظام التشغيل')),
+            ],
+            options={
+                'verbose_name': 'متصفح',
+                'verbose_name_plural': 'المتصفحات',
+            },
+        ),
+        migrations.AddField(
+            model_name='gamespin',
+            name='user_agent_ref',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='game.useragent'),
+        ),
+        migrations.RunPython(intern_user_agents, restore_user_agents),
+        migrations.RemoveField(
+            model_name='gamespin',
+            name='user_agent',
+        ),
+        migrations.RenameField(
+            model_name='gamespin',
+            old_name='user_agent_ref',
+            new_name='user_agent',
+        ),
+        migrations.AlterField(
+            model_name='gamespin',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='spins', to='game.useragent', verbose_name='المتصفح'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+MAX_LENGTH = 40
+
+
+def check_session_ids(apps, schema_editor):
+    """Refuse to shorten the column while longer values exist"""
+    GameSpin = apps.get_model('game', 'GameSpin')
+    longer = GameSpin.objects.annotate(length=Length('session_id')).filter(length__gt=MAX_LENGTH)
+    count = longer.count()
+    if count:
+        raise RuntimeError(
+            f'{count} spin(s) have a session_id longer than {MAX_LENGTH} characters '
+            f'(e.g. #{longer.values_list("id", flat=True).first()}); '
+            f'clear or shorten them before running this migration'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_useragent'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_session_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='gamespin',
+            name='session_id',
+            field=models.CharField(blank=True, max_length=MAX_LENGTH, null=True, verbose_name='معرف الجلسة'),
+        ),
+    ]
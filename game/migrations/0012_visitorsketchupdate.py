@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0011_alter_gamespin_session_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketchUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('register', models.PositiveSmallIntegerField(verbose_name='الخانة')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='القيمة')),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketch_updates', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'تحديث تقدير الزوار',
+                'verbose_name_plural': 'تحديثات تقدير الزوار',
+                'indexes': [models.Index(fields=['company', 'day'], name='sketchupdate_company_day_idx')],
+            },
+        ),
+    ]
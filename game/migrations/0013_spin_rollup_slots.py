@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0012_visitorsketchupdate'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyspinrollup',
+            name='dailyspinrollup_unique',
+        ),
+        migrations.RemoveConstraint(
+            model_name='spinrollup',
+            name='spinrollup_unique',
+        ),
+        migrations.AddField(
+            model_name='dailyspinrollup',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='الخانة'),
+        ),
+        migrations.AddField(
+            model_name='spinrollup',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='الخانة'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyspinrollup',
+            constraint=models.UniqueConstraint(fields=('company', 'day', 'prize', 'slot'), name='dailyspinrollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='spinrollup',
+            constraint=models.UniqueConstraint(fields=('company', 'hour', 'prize', 'slot'), name='spinrollup_unique'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_spin_rollup_slots'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='SpinCounter',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0016_company_spin_limit'),
+        ('game', '0014_delete_spincounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejectedSpin',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='رقم الدورة')),
+                ('prize', models.CharField(max_length=200, verbose_name='الجائزة')),
+                ('idempotency_key', models.CharField(blank=True, max_length=64, null=True, verbose_name='مفتاح الطلب')),
+                ('recorded_spin_id', models.BigIntegerField(blank=True, help_text='الدورة التي سُجلت بنفس مفتاح الطلب', null=True, verbose_name='الدورة المسجلة')),
+                ('record', models.JSONField(verbose_name='بيانات الدورة')),
+                ('rejected_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الرفض')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rejected_spins', to='companies.company', verbose_name='الشركة')),
+            ],
+            options={
+                'verbose_name': 'دورة مرفوضة',
+                'verbose_name_plural': 'الدورات المرفوضة',
+            },
+        ),
+    ]
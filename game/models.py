@@ -6,6 +6,49 @@ from django.utils import timezone
 from companies.models import Company
 
 
+class UserAgent(models.Model):
+    """
+    A distinct User-Agent header, parsed once (see game.useragents)
+    """
+    DEVICE_CHOICES = [
+        ('mobile', 'جوال'),
+        ('tablet', 'جهاز لوحي'),
+        ('desktop', 'كمبيوتر'),
+        ('bot', 'برنامج آلي'),
+    ]
+    
+    digest = models.CharField(
+        max_length=32,
+        unique=True,
+        editable=False,
+        verbose_name="البصمة",
+        help_text="MD5 لنص المتصفح"
+    )
+    user_agent = models.TextField(
+        verbose_name="معلومات المتصفح"
+    )
+    device = models.CharField(
+        max_length=10,
+        choices=DEVICE_CHOICES,
+        verbose_name="نوع الجهاز"
+    )
+    browser = models.CharField(
+        max_length=30,
+        verbose_name="المتصفح"
+    )
+    os = models.CharField(
+        max_length=30,
+        verbose_name="نظام التشغيل"
+    )
+    
+    class Meta:
+        verbose_name = "متصفح"
+        verbose_name_plural = "المتصفحات"
+    
+    def __str__(self):
+        return f"{self.browser} - {self.os} ({self.get_device_display()})"
+
+
 class GameSpin(models.Model):
     """
     Model for storing game spin results
@@ -14,6 +57,8 @@ class GameSpin(models.Model):
         Company, 
         on_delete=models.CASCADE,
         related_name='spins',
+        # Covered by gamespin_company_recent_idx (company is its first column)
+        db_index=False,
         verbose_name="الشركة"
     )
     visitor_name = models.CharField(
@@ -36,7 +81,7 @@ class GameSpin(models.Model):
         verbose_name="فاز"
     )
     session_id = models.CharField(
-        max_length=100,
+        max_length=40,
         blank=True,
         null=True,
         verbose_name="معرف الجلسة"
@@ -46,10 +91,24 @@ class GameSpin(models.Model):
         null=True,
         verbose_name="عنوان IP"
     )
-    user_agent = models.TextField(
+    user_agent = models.ForeignKey(
+        UserAgent,
+        on_delete=models.PROTECT,
         blank=True,
         null=True,
-        verbose_name="معلومات المتصفح"
+        related_name='spins',
+        # Spins are never looked up by user agent; the index would only add
+        # to the size of the table
+        db_index=False,
+        verbose_name="المتصفح"
+    )
+    idempotency_key = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="مفتاح الطلب",
+        help_text="يرسله المتصفح مع كل محاولة دوران لمنع تكرار الدورة عند إعادة الإرسال"
     )
     created_at = models.DateTimeField(
         default=timezone.now,
@@ -60,6 +119,270 @@ class GameSpin(models.Model):
         verbose_name = "دورة لعبة"
         verbose_name_plural = "دورات الألعاب"
         ordering = ['-created_at']
+        indexes = [
+            # A company's latest spins (dashboards) and time ranges (analytics)
+            models.Index(fields=['company', '-created_at'], name='gamespin_company_recent_idx'),
+        ]
+        constraints = [
+            # A retried spin request can't be recorded twice
+            models.UniqueConstraint(
+                fields=['company', 'idempotency_key'],
+                name='gamespin_idempotency_key_unique',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.visitor_name} - {self.prize} ({self.company.name})"
+
+
+class SpinClaim(models.Model):
+    """
+    Spins used by a visitor of a company in a limit period.
+
+    Enforces the company's spin limit (e.g. one spin per phone number per
+    day): the unique (company, subject, period) index makes each check a
+    single indexed probe, however many spins there are (see game.limits).
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='spin_claims',
+        # Covered by the unique index below (company is its first column)
+        db_index=False,
+        verbose_name="الشركة"
+    )
+    subject = models.CharField(
+        max_length=100,
+        verbose_name="الزائر",
+        help_text="رقم الجوال أو معرف الجلسة حسب حد المحاولات"
+    )
+    period = models.CharField(
+        max_length=40,
+        verbose_name="المدة"
+    )
+    spins = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name="عدد المحاولات"
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="تاريخ أول محاولة"
+    )
+    
+    class Meta:
+        verbose_name = "محاولات زائر"
+        verbose_name_plural = "محاولات الزوار"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'subject', 'period'], name='spinclaim_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} - {self.period} ({self.spins})"
+
+
+class SpinRollup(models.Model):
+    """
+    Number of spins of a company per hour and prize.
+
+    Maintained together with the spins (see game.rollups), so reports read a
+    few rollup rows instead of scanning GameSpin. Each count is split over
+    up to GAME_SPIN_ROLLUP_SHARDS slots so concurrent spins of a company
+    don't all update the same row; reads sum the slots.
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='spin_rollups',
+        # Covered by the unique index below (company is its first column)
+        db_index=False,
+        verbose_name="الشركة"
+    )
+    hour = models.DateTimeField(
+        verbose_name="الساعة"
+    )
+    prize = models.CharField(
+        max_length=200,
+        verbose_name="الجائزة"
+    )
+    spins = models.PositiveIntegerField(
+        default=0,
+        verbose_name="عدد الدورات"
+    )
+    slot = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="الخانة"
+    )
+    
+    class Meta:
+        verbose_name = "إحصائية دورات بالساعة"
+        verbose_name_plural = "إحصائيات الدورات بالساعة"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'hour', 'prize', 'slot'], name='spinrollup_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} - {self.prize}: {self.spins}"
+
+
+class DailySpinRollup(models.Model):
+    """
+    Number of spins of a company per day (Asia/Riyadh) and prize.
+
+    Maintained together with the spins (see game.rollups) and split over
+    slots like SpinRollup; the dashboards read only these rows.
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='daily_spin_rollups',
+        # Covered by the unique index below (company is its first column)
+        db_index=False,
+        verbose_name="الشركة"
+    )
+    day = models.DateField(
+        verbose_name="اليوم"
+    )
+    prize = models.CharField(
+        max_length=200,
+        verbose_name="الجائزة"
+    )
+    spins = models.PositiveIntegerField(
+        default=0,
+        verbose_name="عدد الدورات"
+    )
+    slot = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="الخانة"
+    )
+    
+    class Meta:
+        verbose_name = "إحصائية دورات يومية"
+        verbose_name_plural = "إحصائيات الدورات اليومية"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'day', 'prize', 'slot'], name='dailyspinrollup_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} - {self.prize}: {self.spins}"
+
+
+class VisitorSketch(models.Model):
+    """
+    HyperLogLog sketch of a company's distinct visitors in a day (Asia/Riyadh).
+
+    Updated with the spins (see game.rollups); the sketches of any range of
+    days merge into an approximate unique-visitor count (see game.hll).
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='visitor_sketches',
+        # Covered by the unique index below (company is its first column)
+        db_index=False,
+        verbose_name="الشركة"
+    )
+    day = models.DateField(
+        verbose_name="اليوم"
+    )
+    registers = models.BinaryField(
+        verbose_name="بيانات التقدير"
+    )
+    
+    class Meta:
+        verbose_name = "تقدير الزوار اليومي"
+        verbose_name_plural = "تقديرات الزوار اليومية"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'day'], name='visitorsketch_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day}"
+
+
+class VisitorSketchUpdate(models.Model):
+    """
+    A register update of a VisitorSketch that has not been merged yet.
+
+    Spins append these rows instead of rewriting the sketch, so the request
+    path never locks a sketch row; merge_visitor_sketches folds them into
+    the sketches (see game.rollups) and reads include the pending ones.
+    """
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='visitor_sketch_updates',
+        # Covered by the index below (company is its first column)
+        db_index=False,
+        verbose_name="الشركة"
+    )
+    day = models.DateField(
+        verbose_name="اليوم"
+    )
+    register = models.PositiveSmallIntegerField(
+        verbose_name="الخانة"
+    )
+    rank = models.PositiveSmallIntegerField(
+        verbose_name="القيمة"
+    )
+
+    class Meta:
+        verbose_name = "تحديث تقدير الزوار"
+        verbose_name_plural = "تحديثات تقدير الزوار"
+        indexes = [
+            models.Index(fields=['company', 'day'], name='sketchupdate_company_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.register}: {self.rank}"
+
+
+class RejectedSpin(models.Model):
+    """
+    A journaled spin that a replay did not write because another spin with
+    the same idempotency key was recorded first (see game.journal).
+
+    The id is the one reserved for the spin and returned to the visitor. The
+    prize unit and spin-limit claim its draw took were given back when the
+    row was created, so each is given back once however often the journal
+    segment is replayed.
+    """
+    id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="رقم الدورة"
+    )
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name='rejected_spins',
+        verbose_name="الشركة"
+    )
+    prize = models.CharField(
+        max_length=200,
+        verbose_name="الجائزة"
+    )
+    idempotency_key = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name="مفتاح الطلب"
+    )
+    recorded_spin_id = models.BigIntegerField(
+        blank=True,
+        null=True,
+        verbose_name="الدورة المسجلة",
+        help_text="الدورة التي سُجلت بنفس مفتاح الطلب"
+    )
+    record = models.JSONField(
+        verbose_name="بيانات الدورة"
+    )
+    rejected_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="تاريخ الرفض"
+    )
+    
+    class Meta:
+        verbose_name = "دورة مرفوضة"
+        verbose_name_plural = "الدورات المرفوضة"
+    
+    def __str__(self):
+        return f"#{self.id} - {self.prize}"
@@ -0,0 +1,377 @@
+"""
+Spin rollups: spin counts per company, time bucket and prize
+
+Every batch of spins written by persist_spins() is added to the rollups in
+the same transaction:
+
+* SpinRollup - spins per UTC hour and prize (one upsert)
+* DailySpinRollup - spins per day in the site's time zone (Asia/Riyadh)
+  and prize (one upsert)
+* VisitorSketchUpdate - the register updates of the daily visitor sketches
+  (appended only when the batch raises a register, see game.hll)
+
+merge_visitor_sketches (run periodically) folds the updates into
+VisitorSketch, the HyperLogLog sketch of the distinct visitors per day, so
+no sketch row is locked while a spin is written.
+
+The dashboards read only the rollups, so their cost depends on the number
+of days and prizes, not on the number of spins. ``rebuild_spin_rollups``
+recomputes the rollups from GameSpin (backfill, or after fixing data).
+"""
+import random
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from time import monotonic
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from companies.models import Company
+
+from .hll import REGISTERS, HyperLogLog, register_update, visitor_key
+from .models import DailySpinRollup, GameSpin, SpinRollup, VisitorSketch, VisitorSketchUpdate
+
+
+def hour_bucket(when):
+    return when.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(when):
+    return timezone.localdate(when, timezone.get_default_timezone())
+
+
+def day_start(day):
+    """Start of a day (Asia/Riyadh) as an aware datetime"""
+    return datetime.combine(day, time.min, tzinfo=timezone.get_default_timezone())
+
+
+# Class ids of the per-company advisory locks (see lock_companies())
+ROLLUP_LOCK = 7_348_292
+SKETCH_LOCK = 7_348_293
+
+# Each process keeps the registers of the sketches its spins were compared
+# with, read from the database at most every SKETCH_CACHE_TIMEOUT seconds and
+# raised by the updates it committed since. Registers only grow, so an old
+# copy only lets through updates that are already merged. (After a rebuild
+# that removed spins, a copy may skip updates for that long.)
+SKETCH_CACHE_TIMEOUT = 60
+MAX_KNOWN_SKETCHES = 1000
+_known_sketches = {}
+_known_sketches_lock = threading.Lock()
+
+# (model, bucket column, bucket of a spin time, bucket expression in SQL)
+ROLLUPS = [
+    (SpinRollup, 'hour', hour_bucket, lambda: TruncHour('created_at', tzinfo=dt_timezone.utc)),
+    (DailySpinRollup, 'day', day_bucket, lambda: TruncDate('created_at', tzinfo=timezone.get_default_timezone())),
+]
+
+
+def _quoted(model, column):
+    quote = connection.ops.quote_name
+    return quote(model._meta.db_table), quote(column)
+
+
+def _adapt_bucket(model, column, value):
+    return model._meta.get_field(column).get_db_prep_value(value, connection)
+
+
+def lock_companies(lock, company_ids, shared=False):
+    """
+    Take a per-company Postgres advisory lock (ROLLUP_LOCK or SKETCH_LOCK)
+    of each company until the transaction ends (call in a transaction).
+    Shared holders never wait for each other. SQLite has one writer anyway.
+    """
+    if connection.vendor != 'postgresql' or not company_ids:
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {function}(%s, company_id) FROM unnest(%s) AS company_id',
+            # Lock keys are 32-bit: ids past 2**31 share a key with a smaller
+            # id, which can only make a rebuild wait a little longer
+            [lock, sorted({company_id % 2 ** 31 for company_id in company_ids})],
+        )
+
+
+def add_to_rollups(spins):
+    """
+    Add newly written spins to the rollups (call in the transaction that
+    wrote them).
+
+    Each company's counts go to one random slot of its rollup rows, under
+    the company's rollup lock taken shared (see rebuild_rollups()).
+    """
+    if not spins:
+        return
+    shards = max(settings.GAME_SPIN_ROLLUP_SHARDS, 1)
+    slots = {company_id: random.randrange(shards) for company_id in sorted({spin.company_id for spin in spins})}
+    lock_companies(ROLLUP_LOCK, slots, shared=True)
+    for model, column, bucket, _ in ROLLUPS:
+        counts = Counter((spin.company_id, bucket(spin.created_at), spin.prize) for spin in spins)
+        table, bucket_column = _quoted(model, column)
+        rows = sorted(counts.items())
+        sql = (
+            f'INSERT INTO {table} (company_id, {bucket_column}, prize, slot, spins) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (company_id, {bucket_column}, prize, slot) '
+            f'DO UPDATE SET spins = {table}.spins + excluded.spins'
+        )
+        params = []
+        for (company_id, value, prize), count in rows:
+            params.extend([company_id, _adapt_bucket(model, column, value), prize, slots[company_id], count])
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    add_to_visitor_sketches(spins)
+
+
+def _known_registers(company_id, day):
+    """
+    Registers of a company's sketch of a day as this process knows them
+    (see SKETCH_CACHE_TIMEOUT); read from the database when missing or old.
+    """
+    key = (company_id, day)
+    now = monotonic()
+    entry = _known_sketches.get(key)
+    if entry is not None and now - entry[0] < SKETCH_CACHE_TIMEOUT:
+        return entry[1]
+
+    stored = (
+        VisitorSketch.objects.filter(company_id=company_id, day=day)
+        .values_list('registers', flat=True).first()
+    )
+    registers = HyperLogLog.from_bytes(stored).registers if stored is not None else bytearray(REGISTERS)
+    with _known_sketches_lock:
+        if len(_known_sketches) >= MAX_KNOWN_SKETCHES:
+            _known_sketches.clear()
+        _known_sketches[key] = (now, registers)
+    return registers
+
+
+def _remember_updates(rows):
+    """Raise the known registers by updates that were committed"""
+    with _known_sketches_lock:
+        for row in rows:
+            entry = _known_sketches.get((row.company_id, row.day))
+            if entry is not None and row.rank > entry[1][row.register]:
+                entry[1][row.register] = row.rank
+
+
+def add_to_visitor_sketches(spins):
+    """
+    Queue the visitors of newly written spins for the daily sketches.
+
+    Only the updates that raise a register of the sketch are appended as
+    VisitorSketchUpdate rows (returning visitors, and most new ones once a
+    day has many, change nothing). The sketch is compared as this process
+    knows it, so most spins don't read it; the sketch row itself is never
+    locked or rewritten here, see merge_visitor_sketches().
+    """
+    updates = defaultdict(dict)
+    for spin in spins:
+        index, rank = register_update(visitor_key(spin.visitor_name, spin.visitor_phone))
+        registers = updates[(spin.company_id, day_bucket(spin.created_at))]
+        if rank > registers.get(index, 0):
+            registers[index] = rank
+
+    rows = []
+    for (company_id, day), registers in sorted(updates.items()):
+        known = _known_registers(company_id, day)
+        rows.extend(
+            VisitorSketchUpdate(company_id=company_id, day=day, register=index, rank=rank)
+            for index, rank in sorted(registers.items())
+            if rank > known[index]
+        )
+    if rows:
+        VisitorSketchUpdate.objects.bulk_create(rows)
+        transaction.on_commit(lambda: _remember_updates(rows))
+
+
+def merge_visitor_sketches(batch_size=5000):
+    """
+    Fold the pending VisitorSketchUpdate rows into the daily sketches and
+    delete them; returns the number of updates merged.
+
+    Each batch is one transaction. Pending rows are claimed with SKIP
+    LOCKED, so concurrent runs merge different updates; merging an update
+    twice is harmless (a register keeps its maximum).
+    """
+    merged = 0
+    while True:
+        with transaction.atomic():
+            pending = list(
+                VisitorSketchUpdate.objects.select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('id', 'company_id', 'day', 'register', 'rank')[:batch_size]
+            )
+            updates = defaultdict(list)
+            for _, company_id, day, index, rank in pending:
+                updates[(company_id, day)].append((index, rank))
+
+            # Wait for sketch rebuilds of these companies (see rebuild_visitor_sketches())
+            lock_companies(SKETCH_LOCK, {company_id for company_id, _ in updates}, shared=True)
+            for (company_id, day), day_updates in sorted(updates.items()):
+                sketches = VisitorSketch.objects.filter(company_id=company_id, day=day)
+                sketch = sketches.select_for_update().first()
+                if sketch is None:
+                    hll = HyperLogLog()
+                    hll.apply(day_updates)
+                    try:
+                        with transaction.atomic():
+                            VisitorSketch.objects.create(company_id=company_id, day=day, registers=hll.to_bytes())
+                        continue
+                    except IntegrityError:
+                        # Created by a concurrent merge or rebuild: merge into it
+                        sketch = sketches.select_for_update().get()
+                hll = HyperLogLog.from_bytes(sketch.registers)
+                if hll.apply(day_updates):
+                    sketch.registers = hll.to_bytes()
+                    sketch.save(update_fields=['registers'])
+
+            VisitorSketchUpdate.objects.filter(id__in=[row[0] for row in pending]).delete()
+        merged += len(pending)
+        if len(pending) < batch_size:
+            return merged
+
+
+def rebuild_rollups(company_ids=None):
+    """
+    Recompute the rollups and visitor sketches from GameSpin (all
+    companies, or ``company_ids``), one company per transaction.
+
+    A company's rollups are rebuilt under its rollup lock taken exclusive:
+    its in-flight spins commit first and its new spins wait until the
+    rebuild's transaction ends (otherwise a spin committed between the
+    DELETE and the INSERT ... SELECT would be counted twice). Spins of
+    other companies don't wait. The sketches are rebuilt afterwards,
+    without that lock (see rebuild_visitor_sketches()).
+    """
+    if company_ids is None:
+        company_ids = Company.objects.order_by('pk').values_list('pk', flat=True)
+
+    for company_id in company_ids:
+        spins = GameSpin.objects.filter(company_id=company_id)
+        with transaction.atomic():
+            lock_companies(ROLLUP_LOCK, [company_id])
+            for model, column, _, expression in ROLLUPS:
+                model.objects.filter(company_id=company_id).delete()
+
+                select = (
+                    spins.annotate(bucket=expression())
+                    .values('company_id', 'bucket', 'prize')
+                    .annotate(count=Count('id'))
+                    .order_by()
+                )
+                select_sql, params = select.query.sql_with_params()
+                table, bucket_column = _quoted(model, column)
+                with connection.cursor() as cursor:
+                    # The rebuilt counts go to slot 0
+                    cursor.execute(
+                        f'INSERT INTO {table} (company_id, {bucket_column}, prize, spins, slot) '
+                        f'SELECT *, 0 FROM ({select_sql}) AS rebuilt',
+                        params,
+                    )
+        rebuild_visitor_sketches(company_id)
+
+
+def rebuild_visitor_sketches(company_id):
+    """
+    Rebuild the daily visitor sketches of a company from its spins.
+
+    Spins are not held up: they only append VisitorSketchUpdate rows, which
+    are kept and merged on top later (a register keeps its maximum, so the
+    updates of spins that are also in the rebuilt sketch change nothing).
+    merge_visitor_sketches() waits for the company's sketch lock, so it
+    can't fold the update of a spin the rebuild didn't see into a sketch
+    that is then replaced.
+    """
+    day = TruncDate('created_at', tzinfo=timezone.get_default_timezone())
+    rows = (
+        GameSpin.objects.filter(company_id=company_id)
+        .annotate(day=day)
+        .order_by('day')
+        .values_list('day', 'visitor_name', 'visitor_phone')
+    )
+    with transaction.atomic():
+        lock_companies(SKETCH_LOCK, [company_id])
+        sketches = {}
+        for spin_day, visitor_name, visitor_phone in rows.iterator(chunk_size=5000):
+            hll = sketches.get(spin_day)
+            if hll is None:
+                hll = sketches[spin_day] = HyperLogLog()
+            hll.add(visitor_key(visitor_name, visitor_phone))
+
+        VisitorSketch.objects.filter(company_id=company_id).delete()
+        VisitorSketch.objects.bulk_create(
+            [
+                VisitorSketch(company_id=company_id, day=sketch_day, registers=hll.to_bytes())
+                for sketch_day, hll in sorted(sketches.items())
+            ],
+            batch_size=500,
+        )
+
+
+def spin_stats(company_id, today=None):
+    """
+    Dashboard numbers of a company from the daily rollups.
+
+    Returns a dict with ``total_spins``, ``today_spins``, ``week_spins`` (the
+    last 7 days and today) and ``prize_distribution`` (``prize``/``count``
+    dicts, most given first).
+    """
+    today = today or timezone.localdate()
+    week_ago = today - timedelta(days=7)
+    rollups = DailySpinRollup.objects.filter(company_id=company_id)
+
+    totals = rollups.aggregate(
+        total=Sum('spins'),
+        today=Sum('spins', filter=Q(day=today)),
+        week=Sum('spins', filter=Q(day__gte=week_ago)),
+    )
+    prize_distribution = list(
+        rollups.values('prize').annotate(count=Sum('spins')).order_by('-count', 'prize')
+    )
+    return {
+        'total_spins': totals['total'] or 0,
+        'today_spins': totals['today'] or 0,
+        'week_spins': totals['week'] or 0,
+        'prize_distribution': prize_distribution,
+    }
+
+
+def unique_visitors(company_id, start=None, end=None, exact=False):
+    """
+    Number of distinct visitors of a company between two days (inclusive,
+    Asia/Riyadh; open-ended when not given).
+
+    By default the daily HyperLogLog sketches of the range and their
+    pending updates are merged (about 1.6% error, cost independent of the
+    number of spins). With
+    ``exact`` the spins themselves are scanned - for audits.
+    """
+    if exact:
+        spins = GameSpin.objects.filter(company_id=company_id)
+        if start is not None:
+            spins = spins.filter(created_at__gte=day_start(start))
+        if end is not None:
+            spins = spins.filter(created_at__lt=day_start(end + timedelta(days=1)))
+        keys = {
+            visitor_key(visitor_name, visitor_phone)
+            for visitor_name, visitor_phone in spins.values_list('visitor_name', 'visitor_phone').iterator(chunk_size=5000)
+        }
+        return len(keys)
+
+    days = Q(company_id=company_id)
+    if start is not None:
+        days &= Q(day__gte=start)
+    if end is not None:
+        days &= Q(day__lte=end)
+    hll = HyperLogLog()
+    for registers in VisitorSketch.objects.filter(days).values_list('registers', flat=True).iterator():
+        hll.merge(HyperLogLog.from_bytes(registers))
+    # Plus the updates not merged yet
+    hll.apply(VisitorSketchUpdate.objects.filter(days).values_list('register', 'rank').iterator())
+    return hll.count()
@@ -0,0 +1,203 @@
+"""
+Recording of wheel spins
+
+Every spin is written through persist_spins(), whether it is saved on the
+request path or later by the write-behind journal flusher, which also keeps
+the spin rollups (game.rollups), which the live counters (game.counters) read,
+up to date.
+"""
+import asyncio
+import logging
+import weakref
+from functools import reduce
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from companies.inventory import return_stock
+from companies.models import Company
+
+from .limits import spin_subject, unclaim_spin
+from .models import GameSpin, RejectedSpin
+from .rollups import add_to_rollups
+from .useragents import intern_user_agent
+
+logger = logging.getLogger(__name__)
+
+
+def persist_spins(spins, replay=False):
+    """
+    Write GameSpin objects to the database in one batch and add them to the
+    spin rollups in the same transaction.
+
+    Args:
+        spins: list of unsaved GameSpin objects
+        replay: the spins already have reserved ids and may have been written
+            before (journal replay), so existing rows are skipped; spins
+            whose idempotency key was recorded by another spin are rejected
+            (see reject_spins())
+    """
+    if not spins:
+        return spins
+    with transaction.atomic():
+        if len(spins) == 1 and not replay:
+            # A single spin on the request path: one INSERT
+            spins[0].save(force_insert=True)
+            written = spins
+        elif replay:
+            # Only the spins this replay inserts are added to the rollups
+            ids = [spin.id for spin in spins]
+            existing = set(GameSpin.objects.filter(id__in=ids).values_list('id', flat=True))
+            GameSpin.objects.bulk_create(
+                spins,
+                batch_size=settings.GAME_SPIN_FLUSH_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            stored = set(GameSpin.objects.filter(id__in=ids).values_list('id', flat=True))
+            written = [spin for spin in spins if spin.id in stored - existing]
+            # Skipped although their id is free: the idempotency key is taken
+            reject_spins([spin for spin in spins if spin.id not in stored])
+        else:
+            written = GameSpin.objects.bulk_create(spins, batch_size=settings.GAME_SPIN_FLUSH_BATCH_SIZE)
+        add_to_rollups(written)
+    return spins
+
+
+def reject_spins(spins):
+    """
+    Dead-letter replayed spins that were not written because another spin
+    with the same idempotency key was recorded first, and give back the
+    prize unit and spin-limit claim their draw took (call in the replay's
+    transaction). Spins rejected by an earlier replay of the same segment
+    are skipped, so nothing is given back twice.
+    """
+    from .journal import spin_to_record
+
+    rejected = set(RejectedSpin.objects.filter(id__in=[spin.id for spin in spins]).values_list('id', flat=True))
+    spins = [spin for spin in spins if spin.id not in rejected]
+    if not spins:
+        return
+
+    recorded = {}
+    keys = [Q(company_id=spin.company_id, idempotency_key=spin.idempotency_key) for spin in spins if spin.idempotency_key]
+    if keys:
+        recorded = {
+            (company_id, key): spin_id
+            for spin_id, company_id, key in GameSpin.objects.filter(reduce(or_, keys))
+            .values_list('id', 'company_id', 'idempotency_key')
+        }
+    RejectedSpin.objects.bulk_create([
+        RejectedSpin(
+            id=spin.id,
+            company_id=spin.company_id,
+            prize=spin.prize,
+            idempotency_key=spin.idempotency_key,
+            recorded_spin_id=recorded.get((spin.company_id, spin.idempotency_key)),
+            record=spin_to_record(spin),
+        )
+        for spin in spins
+    ])
+
+    companies = Company.objects.in_bulk({spin.company_id for spin in spins})
+    for spin in spins:
+        recorded_id = recorded.get((spin.company_id, spin.idempotency_key))
+        if recorded_id is None:
+            logger.error(
+                "Spin #%s of company %s was not written and no spin has its idempotency key %s",
+                spin.id, spin.company_id, spin.idempotency_key,
+            )
+        else:
+            logger.warning(
+                "Spin #%s not written: idempotency key %s already recorded as #%s",
+                spin.id, spin.idempotency_key, recorded_id,
+            )
+        return_stock(spin.company_id, spin.prize, timezone.localdate(spin.created_at))
+        company = companies.get(spin.company_id)
+        subject = spin_subject(company, spin) if company is not None else None
+        if subject:
+            unclaim_spin(company, subject, spin.created_at)
+
+
+def record_spin(company, visitor_name, visitor_phone, prize, session_id=None,
+                ip_address=None, user_agent=None, idempotency_key=None):
+    """
+    Record a spin and return it (with its id).
+
+    ``company`` may be a Company or its cached snapshot (only ``pk`` is used).
+    ``user_agent`` is the User-Agent header; the spin stores the id of its
+    interned UserAgent row.
+
+    With GAME_SPIN_WRITE_BEHIND the spin gets a reserved id and is appended
+    to the local journal; the database write happens in the background.
+    Otherwise it is written right away. If a spin with the same
+    ``idempotency_key`` was already written, that spin is returned instead,
+    with ``recorded_before`` set, so the caller can undo its own draw.
+    """
+    spin = GameSpin(
+        company_id=company.pk,
+        visitor_name=visitor_name,
+        visitor_phone=visitor_phone,
+        prize=prize,
+        won=True,
+        session_id=session_id,
+        ip_address=ip_address,
+        user_agent_id=intern_user_agent(user_agent),
+        idempotency_key=idempotency_key,
+        created_at=timezone.now(),
+    )
+
+    if settings.GAME_SPIN_WRITE_BEHIND:
+        from .journal import get_journal
+
+        journal = get_journal()
+        if journal is not None:
+            journal.append(spin)
+            return spin
+
+    try:
+        persist_spins([spin])
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        # A retry whose first request was recorded meanwhile (by another
+        # worker, or after its cached result expired)
+        original = GameSpin.objects.filter(company_id=company.pk, idempotency_key=idempotency_key).first()
+        if original is None:
+            raise
+        logger.info(f"Spin with idempotency key {idempotency_key} already recorded as #{original.id}")
+        original.recorded_before = True
+        return original
+    return spin
+
+
+_write_slots = weakref.WeakKeyDictionary()
+
+
+def write_slots():
+    """
+    Semaphore bounding the spins an ASGI worker draws and records at once.
+
+    Under ASGI every request runs its blocking calls in a thread of its own,
+    with its own database connection: without a bound, a burst of spins
+    opens a connection per spin and the writes contend for the same rows.
+    There is one semaphore per event loop (a worker has one).
+    """
+    loop = asyncio.get_running_loop()
+    slots = _write_slots.get(loop)
+    if slots is None:
+        slots = _write_slots[loop] = asyncio.Semaphore(settings.GAME_SPIN_ASYNC_WRITERS)
+    return slots
+
+
+async def arecord_spin(*args, **kwargs):
+    """
+    Async version of record_spin().
+
+    The insert (or the fsync'd journal append) blocks, so it runs in a
+    worker thread instead of on the event loop.
+    """
+    return await sync_to_async(record_spin)(*args, **kwargs)
@@ -10,4 +10,6 @@ urlpatterns = [
     path('play/<str:token>/', views.play_game, name='play'),
     path('spin/<str:token>/', views.spin_wheel, name='spin'),
     path('dashboard/<str:token>/', views.game_dashboard, name='dashboard'),
+    path('analytics/<str:token>/', views.spin_analytics, name='analytics'),
+    path('counters/<str:token>/', views.live_counters, name='counters'),
 ]
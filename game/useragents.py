@@ -0,0 +1,114 @@
+"""
+Interned user agents
+
+A spin points to a UserAgent row instead of storing the User-Agent header
+itself: a few thousand distinct headers cover millions of spins. Each row
+is parsed once, when it is first seen, into device, browser and OS families
+(for the admin filters and the Excel export).
+
+Interning a header is a dict lookup in the worker; only the first spin of a
+new header in a worker reads (or inserts) the row.
+"""
+import hashlib
+import re
+import threading
+
+from django.db import IntegrityError, transaction
+
+from .models import UserAgent
+
+# Headers kept per worker (distinct headers are few, this just bounds memory)
+MAX_CACHED = 10000
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+_BOT = re.compile(r'bot|crawl|spider|slurp|preview|curl|wget|python-requests|httpclient|headless', re.I)
+_TABLET = re.compile(r'ipad|tablet|kindle|silk|sm-t\d|(android(?!.*mobile))', re.I)
+_MOBILE = re.compile(r'mobile|iphone|ipod|android|windows phone|blackberry|opera mini', re.I)
+
+# First match wins: in-app browsers and Chromium forks before Chrome and Safari
+_BROWSERS = [
+    ('Snapchat', re.compile(r'snapchat', re.I)),
+    ('Instagram', re.compile(r'instagram', re.I)),
+    ('TikTok', re.compile(r'tiktok|musical_ly|bytedancewebview', re.I)),
+    ('Facebook', re.compile(r'fban|fbav|fb_iab', re.I)),
+    ('X', re.compile(r'twitter', re.I)),
+    ('WhatsApp', re.compile(r'whatsapp', re.I)),
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.I)),
+    ('Opera', re.compile(r'opr/|opera|opt/', re.I)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.I)),
+    ('Huawei Browser', re.compile(r'huaweibrowser', re.I)),
+    ('Firefox', re.compile(r'firefox|fxios', re.I)),
+    ('Chrome', re.compile(r'chrome|crios|chromium', re.I)),
+    ('Safari', re.compile(r'safari|applewebkit', re.I)),
+]
+
+_SYSTEMS = [
+    ('iOS', re.compile(r'iphone|ipad|ipod|ios', re.I)),
+    ('Android', re.compile(r'android', re.I)),
+    ('Windows', re.compile(r'windows', re.I)),
+    ('macOS', re.compile(r'mac os x|macintosh', re.I)),
+    ('Linux', re.compile(r'linux|x11|cros', re.I)),
+]
+
+
+def digest(user_agent):
+    """Lookup key of a header (MD5, the same as the MD5() database function)"""
+    return hashlib.md5(user_agent.encode('utf-8')).hexdigest()
+
+
+def _family(families, user_agent):
+    for name, pattern in families:
+        if pattern.search(user_agent):
+            return name
+    return 'Other'
+
+
+def parse(user_agent):
+    """Return the ``device``, ``browser`` and ``os`` families of a header"""
+    if _BOT.search(user_agent):
+        device = 'bot'
+    elif _TABLET.search(user_agent):
+        device = 'tablet'
+    elif _MOBILE.search(user_agent):
+        device = 'mobile'
+    else:
+        device = 'desktop'
+    return {
+        'device': device,
+        'browser': _family(_BROWSERS, user_agent),
+        'os': _family(_SYSTEMS, user_agent),
+    }
+
+
+def new_user_agent(user_agent):
+    """An unsaved, parsed UserAgent row for a header"""
+    return UserAgent(digest=digest(user_agent), user_agent=user_agent, **parse(user_agent))
+
+
+def intern_user_agent(user_agent):
+    """Id of the UserAgent row of a header (``None`` for an empty header)"""
+    if not user_agent:
+        return None
+    key = digest(user_agent)
+    pk = _cache.get(key)
+    if pk is not None:
+        return pk
+
+    pk = UserAgent.objects.filter(digest=key).values_list('pk', flat=True).first()
+    if pk is None:
+        try:
+            row = new_user_agent(user_agent)
+            with transaction.atomic():
+                row.save(force_insert=True)
+            pk = row.pk
+        except IntegrityError:
+            # Inserted by a concurrent spin with the same header
+            pk = UserAgent.objects.get(digest=key).pk
+
+    with _cache_lock:
+        if len(_cache) >= MAX_CACHED:
+            _cache.clear()
+        _cache[key] = pk
+    return pk
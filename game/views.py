@@ -3,35 +3,45 @@ Views for game app
 """
 import json
 import logging
-import random
 import re
-from datetime import timedelta
+from datetime import date, timedelta
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db.models import Count
 from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import render
+from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from companies.decks import draw_from_deck
+from companies.inventory import draw_in_stock, return_stock
 from companies.models import Company
-from companies.utils import decrypt_slug
+from companies.pages import cached_page
+from companies.snapshots import company_snapshots, get_company_snapshot
+from companies.utils import get_by_public_token
+from . import idempotency
+from .analytics import MAX_RANGE_DAYS, spins_over_time
+from .counters import READ_CACHE_TIMEOUT, aspin_counters
+from .limits import SpinLimitReached, aclaim_spin, aunclaim_spin, limit_message
 from .models import GameSpin
+from .rollups import spin_stats, unique_visitors as unique_visitors_count
+from .spins import arecord_spin, write_slots
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
 
-def select_weighted_prize(company, prizes):
+def select_weighted_prize(company):
     """
     Select a prize using weighted random algorithm based on percentages.
     
     Algorithm:
-    1. Get prize percentages from company notes (if available)
-    2. Use percentages directly as weights (higher percentage = higher chance)
-    3. Normalize weights to ensure they sum to 1
-    4. Select prize based on weighted random
+    1. Get the compiled sampler from the company's structured prize
+       configuration (built once per configuration and cached per worker)
+    2. The sampler holds the normalized weights as a cumulative array
+    3. Draw a single random number and binary-search the cumulative array
     
     The percentages represent the probability of winning each prize:
     - Higher percentage = higher chance to win
@@ -40,126 +50,101 @@ def select_weighted_prize(company, prizes):
     Returns:
         str: The selected prize name
     """
+    sampler = company.prize_sampler
+    
     # Ensure prizes list is not empty
-    if not prizes:
+    if sampler is None:
         logger.error(f"Company {company.name} has no prizes")
         return None
     
-    # Try to get prize percentages from notes
-    prize_percentages = None
-    
-    if company.notes:
-        try:
-            notes_data = json.loads(company.notes)
-            if 'prize_percentages' in notes_data:
-                prize_percentages = notes_data['prize_percentages']
-                logger.info(f"Company {company.name}: Using custom percentages: {prize_percentages}")
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.warning(f"Company {company.name}: Could not parse prize percentages from notes: {e}")
-    
-    # If no percentages stored or length mismatch, use equal distribution
-    if not prize_percentages or len(prize_percentages) != len(prizes):
-        equal_percentage = 100 / len(prizes)
-        prize_percentages = [equal_percentage] * len(prizes)
-        logger.info(f"Company {company.name}: Using equal distribution ({equal_percentage}% each)")
+    selected_index = sampler.draw_index()
+    selected_prize = sampler.prizes[selected_index]
     
-    # Convert percentages to weights (0-1 range)
-    # Higher percentage = higher weight = higher probability
-    # The percentages are already normalized to sum to 100, but we normalize again
-    # to ensure accuracy even if there are slight rounding errors
-    weights = [float(p) / 100.0 for p in prize_percentages]
+    logger.debug(
+        "Company %s: Selected prize '%s' (index: %s, percentage: %s%%, weight: %.4f)",
+        company.name, selected_prize, selected_index,
+        sampler.percentages[selected_index], sampler.weights[selected_index],
+    )
     
-    # Normalize weights to sum to 1 (probability distribution)
-    # This ensures that if percentages don't sum to exactly 100, they're still valid
-    # This also handles cases where percentages sum to 300% or any other value
-    total_weight = sum(weights)
-    if total_weight > 0:
-        # Normalize: divide each weight by total to get probabilities that sum to 1
-        normalized_weights = [w / total_weight for w in weights]
+    return selected_prize
+
+
+def select_prize(company):
+    """
+    Select the prize of a spin according to the company's prize mode: the
+    next outcome of its pre-dealt deck (exact quotas) or a random draw
+    weighted by the percentages. Limited prizes are only given while in
+    stock; otherwise another prize in stock is drawn.
+    """
+    if company.prize_mode == 'deck':
+        selected_prize = draw_from_deck(company)
     else:
-        # Fallback: equal weights if all are zero
-        logger.warning(f"Company {company.name}: All weights are zero, using equal distribution")
-        normalized_weights = [1.0 / len(prizes)] * len(prizes)
-    
-    # Log the weights and prizes for debugging
-    if settings.DEBUG:
-        logger.debug(f"Company {company.name} - Prize selection weights:")
-        for prize, weight, percentage in zip(prizes, normalized_weights, prize_percentages):
-            logger.debug(f"  {prize}: {percentage}% (weight: {weight:.4f})")
-    
-    # Select prize based on weighted random
-    # random.choices uses weights directly - higher weight = higher probability
-    selected_prize = random.choices(prizes, weights=normalized_weights, k=1)[0]
-    
-    # Find the index of selected prize for logging
-    selected_index = prizes.index(selected_prize) if selected_prize in prizes else -1
-    
-    logger.info(
-        f"Company {company.name}: Selected prize '{selected_prize}' "
-        f"(index: {selected_index}, percentage: {prize_percentages[selected_index] if selected_index >= 0 else 'N/A'}%, "
-        f"weight: {normalized_weights[selected_index] if selected_index >= 0 else 'N/A':.4f})"
-    )
+        selected_prize = select_weighted_prize(company)
     
+    if selected_prize is not None and company.limited_prizes:
+        selected_prize = draw_in_stock(company, selected_prize)
     return selected_prize
 
 
 def play_game(request, token):
     """Game page view"""
-    # Decrypt the token to get the slug
-    slug = decrypt_slug(token)
-    if not slug:
+    # Cached read-only snapshot of the company for the link token
+    # (no DB reads while unchanged; old signed links are still accepted)
+    company = get_company_snapshot(token)
+    if company is None:
         from django.http import Http404
         raise Http404("Invalid or expired link")
     
-    company = get_object_or_404(Company, slug=slug)
-    
-    # Get and normalize prizes (remove extra spaces) to ensure consistency
-    prizes = company.get_prizes_list()
-    prizes = [str(p).strip() for p in prizes if p]  # Normalize and filter empty
-    
-    # Get colors
-    colors = company.get_colors_list()
-    
-    # Log prizes for debugging
-    if settings.DEBUG:
-        logger.debug(f"Company {company.slug} - Play page loaded:")
-        logger.debug(f"  Prizes: {prizes}")
-        logger.debug(f"  Colors: {colors}")
-        logger.debug(f"  Is active: {company.is_currently_active}")
+    is_active = company.is_currently_active
     
-    # Get encrypted token for API calls
-    from companies.utils import encrypt_slug
-    encrypted_token = encrypt_slug(slug) or token
-    
-    # Always show the play page, but pass activation status
-    context = {
-        'company': company,
-        'prizes': prizes,  # Already normalized
-        'colors': colors,
-        'status': company.status,
-        'is_active': company.is_currently_active,
-        'activation_end_time': company.activation_end_time,
-        'encrypted_token': encrypted_token,
-    }
+    def get_context():
+        # Prize names are normalized in the structured prize configuration, so the
+        # wheel shows exactly the names that spin_wheel can return
+        prizes = company.prize_names
+        
+        # Get colors
+        colors = company.colors
+        
+        # Log prizes for debugging
+        if settings.DEBUG:
+            logger.debug(f"Company {company.slug} - Play page rendered:")
+            logger.debug(f"  Prizes: {prizes}")
+            logger.debug(f"  Colors: {colors}")
+            logger.debug(f"  Is active: {is_active}")
+        
+        # Always show the play page, but pass activation status
+        return {
+            'company': company,
+            'prizes': prizes,  # Already normalized
+            'colors': colors,
+            'status': company.status,
+            'is_active': is_active,
+            'activation_end_time': company.activation_end_time,
+            'encrypted_token': company.public_token,
+            'phone_required': company.spin_limit_scope == 'phone',
+        }
     
-    return render(request, 'game/play.html', context)
+    # Rendered once per config version and activation state, with ETag/304
+    return cached_page(
+        request,
+        ('game-play', company.public_token, company.version, is_active),
+        'game/play.html',
+        get_context,
+    )
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def spin_wheel(request, token):
-    """Handle wheel spin"""
+async def spin_wheel(request, token):
+    """Handle wheel spin (async: slow clients don't hold a worker thread)"""
     try:
-        # Decrypt the token to get the slug
-        slug = decrypt_slug(token)
-        if not slug:
+        company = await company_snapshots.aresolve(token)
+        if company is None:
             return JsonResponse({
                 'success': False,
                 'message': 'رابط غير صحيح أو منتهي الصلاحية'
             }, status=404)
         
-        company = get_object_or_404(Company, slug=slug)
-        
         # Check if company is currently active (allow pending companies if they are active)
         if not company.is_currently_active:
             return JsonResponse({
@@ -185,64 +170,68 @@ def spin_wheel(request, token):
                 'message': 'رقم الجوال غير صحيح. يجب أن يبدأ بـ 05 ويحتوي على 10 أرقام أو تركه فارغاً'
             }, status=400)
         
-        # Get prizes and normalize them (remove extra spaces)
-        prizes = company.get_prizes_list()
-        if not prizes:
-            logger.error(f"Company {company.slug}: No prizes available")
-            return JsonResponse({
-                'success': False,
-                'message': 'لا توجد جوائز متاحة'
-            }, status=400)
+        # Visitor counted by the company's spin limit (phone number or session)
+        limit_subject = None
+        if company.spin_limit_scope == 'phone':
+            if not visitor_phone:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'رقم الجوال مطلوب للعب'
+                }, status=400)
+            limit_subject = visitor_phone
+        elif company.spin_limit_scope == 'session':
+            if request.session.session_key is None:
+                await request.session.acreate()
+            limit_subject = request.session.session_key
         
-        # Normalize prizes (trim whitespace) to ensure matching with frontend
-        prizes = [str(p).strip() for p in prizes if p]
+        # Key of this spin attempt, resent by the page when the request is retried
+        idempotency_key = (data.get('idempotency_key') or request.headers.get('Idempotency-Key') or '').strip() or None
+        if idempotency_key is not None:
+            if not idempotency.is_valid_key(idempotency_key):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'مفتاح الطلب غير صحيح'
+                }, status=400)
+            
+            claimed, result = await idempotency.aclaim(company.pk, idempotency_key)
+            if not claimed:
+                if result is None:
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'جاري معالجة الدورة، يرجى الانتظار'
+                    }, status=409)
+                # A retry: same prize and spin, no new draw or row
+                response = JsonResponse(result)
+                response['Idempotent-Replayed'] = 'true'
+                return response
         
-        if not prizes:
-            logger.error(f"Company {company.slug}: All prizes are empty after normalization")
+        try:
+            result = await draw_and_record_spin(
+                request, company, visitor_name, visitor_phone, idempotency_key, limit_subject
+            )
+        except SpinLimitReached:
+            if idempotency_key is not None:
+                await idempotency.arelease(company.pk, idempotency_key)
             return JsonResponse({
                 'success': False,
-                'message': 'لا توجد جوائز صالحة'
-            }, status=400)
+                'message': limit_message(company)
+            }, status=429)
+        except Exception:
+            if idempotency_key is not None:
+                await idempotency.arelease(company.pk, idempotency_key)
+            raise
         
-        # Select random prize using weighted algorithm based on percentages
-        selected_prize = select_weighted_prize(company, prizes)
-        
-        if not selected_prize:
-            logger.error(f"Company {company.slug}: Failed to select prize")
+        if result is None:
+            if idempotency_key is not None:
+                await idempotency.arelease(company.pk, idempotency_key)
             return JsonResponse({
                 'success': False,
-                'message': 'فشل في اختيار الجائزة'
-            }, status=500)
-        
-        # Ensure selected prize is in the prizes list
-        if selected_prize not in prizes:
-            logger.warning(
-                f"Company {company.slug}: Selected prize '{selected_prize}' not in prizes list {prizes}. "
-                f"Using first prize as fallback."
-            )
-            selected_prize = prizes[0]
-        
-        # Get client info
-        ip_address = request.META.get('REMOTE_ADDR')
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        
-        # Create spin record
-        spin = GameSpin.objects.create(
-            company=company,
-            visitor_name=visitor_name,
-            visitor_phone=visitor_phone if visitor_phone else None,
-            prize=selected_prize,
-            won=True,
-            session_id=request.session.session_key or f'session_{timezone.now().timestamp()}',
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+                'message': 'لا توجد جوائز متاحة'
+            }, status=400)
         
-        return JsonResponse({
-            'success': True,
-            'prize': selected_prize,
-            'spin_id': spin.id
-        })
+        if idempotency_key is not None:
+            await idempotency.acomplete(company.pk, idempotency_key, result)
+        return JsonResponse(result)
         
     except json.JSONDecodeError:
         return JsonResponse({
@@ -256,43 +245,187 @@ def spin_wheel(request, token):
         }, status=500)
 
 
+async def _draw_and_record(request, company, visitor_name, visitor_phone, idempotency_key):
+    """Draw the prize of a spin and record it (``None`` without prizes)"""
+    # Select the prize (the deck and the stock limits are kept in the database)
+    if company.prize_mode == 'deck' or company.limited_prizes:
+        selected_prize = await sync_to_async(select_prize)(company)
+    else:
+        selected_prize = select_weighted_prize(company)
+    
+    if not selected_prize:
+        logger.error(f"Company {company.slug}: No prizes available")
+        return None
+    
+    # Get client info
+    ip_address = request.META.get('REMOTE_ADDR')
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    
+    # Record spin (journaled and written in the background with GAME_SPIN_WRITE_BEHIND)
+    spin = await arecord_spin(
+        company,
+        visitor_name,
+        visitor_phone if visitor_phone else None,
+        selected_prize,
+        session_id=request.session.session_key,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        idempotency_key=idempotency_key
+    )
+    
+    # Recorded meanwhile by a concurrent request with the same key: give back
+    # the unit this draw took (a dealt deck outcome stays used)
+    if getattr(spin, 'recorded_before', False) and selected_prize in company.limited_prizes:
+        await sync_to_async(return_stock)(company.pk, selected_prize)
+    return spin
+
+
+async def draw_and_record_spin(request, company, visitor_name, visitor_phone, idempotency_key=None,
+                               limit_subject=None):
+    """
+    Draw the prize of a spin and record it; returns the response data
+    (``None`` without prizes).
+
+    Raises SpinLimitReached if ``limit_subject`` has no spins left.
+    """
+    # Waiting spins queue here instead of each holding a database connection
+    async with write_slots():
+        # The cache claim of the key is per worker without a shared cache:
+        # a retry that reached another worker finds the recorded spin here
+        # instead of drawing again
+        if idempotency_key is not None:
+            spin = await GameSpin.objects.filter(
+                company_id=company.pk, idempotency_key=idempotency_key
+            ).afirst()
+            if spin is not None:
+                return {
+                    'success': True,
+                    'prize': spin.prize,
+                    'spin_id': spin.id
+                }
+        
+        # Count the spin against the visitor's limit first (one indexed probe)
+        if limit_subject is not None and not await aclaim_spin(company, limit_subject):
+            raise SpinLimitReached
+        
+        try:
+            spin = await _draw_and_record(request, company, visitor_name, visitor_phone, idempotency_key)
+        except Exception:
+            if limit_subject is not None:
+                await aunclaim_spin(company, limit_subject)
+            raise
+        
+        if spin is None or getattr(spin, 'recorded_before', False):
+            if limit_subject is not None:
+                await aunclaim_spin(company, limit_subject)
+            if spin is None:
+                return None
+    
+    # spin.prize is the original prize if the key was already recorded
+    return {
+        'success': True,
+        'prize': spin.prize,
+        'spin_id': spin.id
+    }
+
+
 def game_dashboard(request, token):
     """Game dashboard for company"""
-    # Decrypt the token to get the slug
-    slug = decrypt_slug(token)
-    if not slug:
+    company = get_by_public_token(Company.objects.all(), token)
+    if company is None:
         from django.http import Http404
         raise Http404("Invalid or expired link")
     
-    company = get_object_or_404(Company, slug=slug)
-    
-    # Get statistics
+    # Totals, today, this week and prize distribution from the daily rollups
+    stats = spin_stats(company.pk)
     spins = company.spins.all()
-    total_spins = spins.count()
-    unique_visitors = spins.values('visitor_name').distinct().count()
     
-    # Today's spins
-    today = timezone.now().date()
-    today_spins = spins.filter(created_at__date=today).count()
-    
-    # This week's spins
-    week_ago = today - timedelta(days=7)
-    week_spins = spins.filter(created_at__date__gte=week_ago).count()
-    
-    # Prize distribution
-    prize_distribution = spins.values('prize').annotate(count=Count('prize')).order_by('-count')
+    # Unique visitors from the daily visitor sketches (?exact=1 counts the
+    # spins themselves, for staff audits)
+    exact = request.GET.get('exact') == '1' and request.user.is_staff
+    unique_visitors = unique_visitors_count(company.pk, exact=exact)
     
     # Recent spins
     recent_spins = spins[:10]
     
     context = {
         'company': company,
-        'total_spins': total_spins,
+        'total_spins': stats['total_spins'],
         'unique_visitors': unique_visitors,
-        'today_spins': today_spins,
-        'week_spins': week_spins,
-        'prize_distribution': prize_distribution,
+        'today_spins': stats['today_spins'],
+        'week_spins': stats['week_spins'],
+        'prize_distribution': stats['prize_distribution'],
         'recent_spins': recent_spins,
+        # Live total/today badges (polled from the daily spin rollups)
+        'counters_url': reverse('game:counters', kwargs={'token': company.public_token}),
     }
     
     return render(request, 'game/dashboard.html', context)
+
+
+@require_http_methods(["GET"])
+def spin_analytics(request, token):
+    """
+    Spins over time for the company dashboard (JSON)
+    
+    Query parameters: granularity (hour, day, week), from and to (YYYY-MM-DD,
+    default: the last 7 days) and page.
+    """
+    company = get_by_public_token(Company.objects.all(), token)
+    if company is None:
+        return JsonResponse({
+            'success': False,
+            'message': 'رابط غير صحيح أو منتهي الصلاحية'
+        }, status=404)
+    
+    granularity = request.GET.get('granularity', 'day')
+    try:
+        end = date.fromisoformat(request.GET['to']) if request.GET.get('to') else timezone.localdate()
+        start = date.fromisoformat(request.GET['from']) if request.GET.get('from') else end - timedelta(days=6)
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'صيغة التاريخ أو رقم الصفحة غير صحيحة'
+        }, status=400)
+    
+    try:
+        result = spins_over_time(company.pk, granularity, start, end, page)
+    except ValueError as e:
+        messages = {
+            'granularity': 'الفترة يجب أن تكون ساعة أو يوم أو أسبوع',
+            'range': f'نطاق التاريخ غير صحيح (الحد الأقصى {MAX_RANGE_DAYS} يوماً)',
+            'page': 'رقم الصفحة غير صحيح',
+        }
+        return JsonResponse({
+            'success': False,
+            'message': messages.get(str(e), 'طلب غير صحيح')
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'granularity': granularity,
+        'timezone': settings.TIME_ZONE,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        **result,
+    })
+
+
+@require_http_methods(["GET"])
+async def live_counters(request, token):
+    """
+    Live "total spins" and "spins today" badges (JSON) for the play page and
+    the dashboards, from the daily spin rollups
+    """
+    company = await company_snapshots.aresolve(token)
+    if company is None:
+        return JsonResponse({
+            'success': False,
+            'message': 'رابط غير صحيح أو منتهي الصلاحية'
+        }, status=404)
+    
+    counters = await aspin_counters(company.pk)
+    response = JsonResponse({'success': True, **counters})
+    response['Cache-Control'] = f'public, max-age={READ_CACHE_TIMEOUT}'
+    return response
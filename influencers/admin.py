@@ -3,7 +3,6 @@ Admin configuration for influencers app
 """
 from django.contrib import admin
 from django.utils.html import format_html
-from django.urls import reverse
 from django.http import HttpResponse
 from django.conf import settings
 from openpyxl import Workbook
@@ -11,6 +10,7 @@ from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 from .models import Influencer, Participant, InfluencerWinner
+from .snapshots import bump_influencer_versions, influencer_snapshots
 
 
 @admin.register(Influencer)
@@ -90,7 +90,6 @@ class InfluencerAdmin(admin.ModelAdmin):
     def registration_link(self, obj):
         """Display registration link for participants"""
         if obj.id and obj.is_active:
-            # Use encrypted token or fallback to property
             url = obj.registration_url
             return format_html(
                 '<div style="margin-bottom: 10px;">'
@@ -105,7 +104,6 @@ class InfluencerAdmin(admin.ModelAdmin):
     def wheel_link(self, obj):
         """Display wheel game link"""
         if obj.id and obj.is_active:
-            # Use encrypted token or fallback to property
             url = obj.wheel_url
             return format_html(
                 '<div>'
@@ -120,14 +118,7 @@ class InfluencerAdmin(admin.ModelAdmin):
     def wheel_link_display(self, obj):
         """Display wheel link in list view"""
         if obj.id and obj.is_active:
-            # Use encrypted token
-            from .utils import encrypt_slug
-            token = encrypt_slug(obj.slug)
-            if token:
-                url = reverse('influencers:play_wheel', kwargs={'token': token})
-            else:
-                # Fallback to using wheel_url property
-                url = obj.wheel_url
+            url = obj.wheel_url
             return format_html(
                 '<a href="{}" target="_blank" style="color: #FF6B9D; font-weight: bold;" title="{}">🎡 رابط العجلة</a>',
                 url, url
@@ -138,14 +129,7 @@ class InfluencerAdmin(admin.ModelAdmin):
     def registration_link_display(self, obj):
         """Display registration link in list view"""
         if obj.id and obj.is_active:
-            # Use encrypted token
-            from .utils import encrypt_slug
-            token = encrypt_slug(obj.slug)
-            if token:
-                url = reverse('influencers:register_participant', kwargs={'token': token})
-            else:
-                # Fallback to using registration_url property
-                url = obj.registration_url
+            url = obj.registration_url
             return format_html(
                 '<a href="{}" target="_blank" style="color: #6A3FA0; font-weight: bold;" title="{}">📝 رابط التسجيل</a>',
                 url, url
@@ -281,21 +265,27 @@ class InfluencerAdmin(admin.ModelAdmin):
     
     def reject_influencers(self, request, queryset):
         """Reject selected influencers"""
-        count = queryset.update(status='rejected', is_active=False)
+        count = bump_influencer_versions(queryset, status='rejected', is_active=False)
         self.message_user(request, f'تم رفض {count} مؤثر')
     reject_influencers.short_description = 'رفض المؤثرين المحددين'
     
     def activate_influencers(self, request, queryset):
         """Activate selected influencers"""
-        count = queryset.update(is_active=True, status='active')
+        count = bump_influencer_versions(queryset, is_active=True, status='active')
         self.message_user(request, f'تم تفعيل {count} مؤثر')
     activate_influencers.short_description = 'تفعيل المؤثرين المحددين'
     
     def deactivate_influencers(self, request, queryset):
         """Deactivate selected influencers"""
-        count = queryset.update(is_active=False)
+        count = bump_influencer_versions(queryset, is_active=False)
         self.message_user(request, f'تم إلغاء تفعيل {count} مؤثر')
     deactivate_influencers.short_description = 'إلغاء تفعيل المؤثرين المحددين'
+    
+    def delete_queryset(self, request, queryset):
+        """Delete influencers and drop their cached game snapshots"""
+        tokens = list(queryset.values_list('public_token', flat=True))
+        super().delete_queryset(request, queryset)
+        influencer_snapshots.forget(tokens)
 
 
 @admin.register(Participant)
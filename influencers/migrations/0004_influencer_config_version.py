@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influencers', '0003_influencerwinner_alter_participant_phone_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='influencer',
+            name='config_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='إصدار الإعدادات'),
+        ),
+    ]
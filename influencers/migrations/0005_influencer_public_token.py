@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:02
+
+import secrets
+
+import companies.utils
+from django.db import migrations, models
+
+
+def populate_public_tokens(apps, schema_editor):
+    """Give every existing row its own token (a field default would repeat one value)"""
+    Influencer = apps.get_model('influencers', 'Influencer')
+    rows = list(Influencer.objects.filter(public_token__isnull=True).only('pk'))
+    for row in rows:
+        # 22 characters, the length is_public_token() checks for
+        row.public_token = secrets.token_urlsafe(16)
+    Influencer.objects.bulk_update(rows, ['public_token'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('influencers', '0004_influencer_config_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='influencer',
+            name='public_token',
+            field=models.CharField(editable=False, max_length=32, null=True, verbose_name='رمز الرابط العام', help_text='يُستخدم في روابط اللعب والتسجيل العامة'),
+        ),
+        migrations.RunPython(populate_public_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='influencer',
+            name='public_token',
+            field=models.CharField(default=companies.utils.generate_public_token, editable=False, help_text='يُستخدم في روابط اللعب والتسجيل العامة', max_length=32, unique=True, verbose_name='رمز الرابط العام'),
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import MinLengthValidator
 from django.utils.text import slugify
+from companies.utils import generate_public_token
 import json
 import random
 import string
@@ -45,6 +46,14 @@ class Influencer(models.Model):
         verbose_name="الرابط الفريد",
         help_text="سيتم إنشاؤه تلقائياً من اسم المؤثر"
     )
+    public_token = models.CharField(
+        max_length=32,
+        unique=True,
+        editable=False,
+        default=generate_public_token,
+        verbose_name="رمز الرابط العام",
+        help_text="يُستخدم في روابط اللعب والتسجيل العامة"
+    )
     
     # Platform Information
     platform = models.CharField(
@@ -138,6 +147,13 @@ class Influencer(models.Model):
         verbose_name="ملاحظات"
     )
     
+    # Bumped on every change so the cached game snapshot is rebuilt
+    config_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="إصدار الإعدادات"
+    )
+    
     class Meta:
         verbose_name = "مؤثر"
         verbose_name_plural = "المؤثرون"
@@ -166,7 +182,17 @@ class Influencer(models.Model):
             
             self.slug = unique_slug
         
-        super().save(*args, **kwargs)
+        # Bump config_version so the cached game snapshot is rebuilt
+        from companies.snapshots import versioned_save
+        from .snapshots import influencer_snapshots
+        versioned_save(influencer_snapshots, self, super().save, *args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        """Delete the influencer and drop its cached game snapshot"""
+        from .snapshots import influencer_snapshots
+        result = super().delete(*args, **kwargs)
+        influencer_snapshots.forget([self.public_token])
+        return result
     
     @property
     def final_platform(self):
@@ -177,14 +203,9 @@ class Influencer(models.Model):
     def influencer_url(self):
         """Generate influencer game URL"""
         from django.urls import reverse
-        from .utils import encrypt_slug
 
-        # Use the same encrypted token mechanism as companies
-        token = encrypt_slug(self.slug)
-        if token:
-            return reverse('game:play', kwargs={'token': token})
-        # Fallback to plain slug if encryption ever fails
-        return reverse('game:play', kwargs={'token': self.slug})
+        # Use the same public token mechanism as companies
+        return reverse('game:play', kwargs={'token': self.public_token})
     
     def approve(self):
         """Approve the influencer"""
@@ -219,25 +240,15 @@ class Influencer(models.Model):
     
     @property
     def registration_url(self):
-        """Generate registration page URL for participants with encrypted token"""
+        """Generate registration page URL for participants with the public token"""
         from django.urls import reverse
-        from .utils import encrypt_slug
-        token = encrypt_slug(self.slug)
-        if token:
-            return reverse('influencers:register_participant', kwargs={'token': token})
-        # Fallback to slug if encryption fails
-        return reverse('influencers:register_participant', kwargs={'token': self.slug})
+        return reverse('influencers:register_participant', kwargs={'token': self.public_token})
     
     @property
     def wheel_url(self):
-        """Generate wheel game URL with encrypted token"""
+        """Generate wheel game URL with the public token"""
         from django.urls import reverse
-        from .utils import encrypt_slug
-        token = encrypt_slug(self.slug)
-        if token:
-            return reverse('influencers:play_wheel', kwargs={'token': token})
-        # Fallback to slug if encryption fails
-        return reverse('influencers:play_wheel', kwargs={'token': self.slug})
+        return reverse('influencers:play_wheel', kwargs={'token': self.public_token})
 
 
 class Participant(models.Model):
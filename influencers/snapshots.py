@@ -0,0 +1,33 @@
+"""
+Cached game snapshots of influencers (see companies.snapshots)
+"""
+from companies.snapshots import SnapshotStore, bump_versions
+
+from .models import Influencer
+
+
+class InfluencerSnapshot:
+    """Read-only view of an influencer for the public participant pages"""
+
+    __slots__ = ('pk', 'slug', 'public_token', 'version', 'name', 'is_active', 'prizes', 'colors')
+
+    def __init__(self, influencer):
+        self.pk = influencer.pk
+        self.slug = influencer.slug
+        self.public_token = influencer.public_token
+        self.version = influencer.config_version
+        self.name = influencer.name
+        self.is_active = influencer.is_active
+        self.prizes = influencer.get_prizes_list()
+        self.colors = influencer.get_colors_list()
+
+    def __str__(self):
+        return self.name
+
+
+influencer_snapshots = SnapshotStore('snapshot:influencer', Influencer, InfluencerSnapshot)
+
+
+def bump_influencer_versions(queryset, **updates):
+    """Apply ``updates`` to influencers and invalidate their snapshots"""
+    return bump_versions(influencer_snapshots, queryset, **updates)
@@ -4,7 +4,10 @@ Utility functions for influencers app
 from companies.utils import (
     encrypt_slug,
     decrypt_slug,
+    generate_public_token,
     generate_secure_token,
+    get_by_public_token,
+    is_public_token,
     verify_secure_token
 )
 
@@ -12,7 +15,10 @@ from companies.utils import (
 __all__ = [
     'encrypt_slug',
     'decrypt_slug',
+    'generate_public_token',
     'generate_secure_token',
+    'get_by_public_token',
+    'is_public_token',
     'verify_secure_token',
 ]
 
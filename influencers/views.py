@@ -1,6 +1,7 @@
 """
 Views for influencers app
 """
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -14,8 +15,10 @@ from datetime import datetime
 import json
 import random
 import logging
+from companies.pages import cached_page
 from .models import Influencer, Participant, InfluencerWinner
-from .utils import decrypt_slug
+from .snapshots import influencer_snapshots
+from .utils import get_by_public_token
 
 logger = logging.getLogger(__name__)
 
@@ -243,43 +246,39 @@ def export_participants_excel(request, influencer_id):
 
 def register_participant_page(request, token):
     """Page for participants to register"""
-    # Decrypt the token to get the slug
-    slug = decrypt_slug(token)
-    if not slug:
+    # Cached read-only snapshot of the influencer for the link token
+    # (no DB reads while unchanged; old signed links are still accepted)
+    influencer = influencer_snapshots.resolve(token)
+    if influencer is None:
         from django.http import Http404
         raise Http404("Invalid or expired link")
     
-    influencer = get_object_or_404(Influencer, slug=slug)
-    
     if not influencer.is_active:
         return render(request, 'influencers/suspended.html')
     
-    # Get encrypted token for the form submission
-    from .utils import encrypt_slug
-    encrypted_token = encrypt_slug(slug) or token
-    
-    context = {
-        'influencer': influencer,
-        'encrypted_token': encrypted_token,
-    }
-    
-    return render(request, 'influencers/register_participant.html', context)
+    # Rendered once per config version, with ETag/304
+    return cached_page(
+        request,
+        ('influencer-register', influencer.public_token, influencer.version),
+        'influencers/register_participant.html',
+        lambda: {
+            'influencer': influencer,
+            'encrypted_token': influencer.public_token,
+        },
+    )
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def register_participant(request, token):
-    """Register a new participant"""
+async def register_participant(request, token):
+    """Register a new participant (async: slow clients don't hold a worker thread)"""
     try:
-        # Decrypt the token to get the slug
-        slug = decrypt_slug(token)
-        if not slug:
+        influencer = await influencer_snapshots.aresolve(token)
+        if influencer is None:
             return JsonResponse({
                 'success': False,
                 'message': 'رابط غير صحيح أو منتهي الصلاحية'
             }, status=404)
-        
-        influencer = get_object_or_404(Influencer, slug=slug)
         if not influencer.is_active:
             return JsonResponse({
                 'success': False,
@@ -319,7 +318,7 @@ def register_participant(request, token):
         
         # Prevent duplicate registration for the same influencer:
         # - نفس رقم الجوال لا يمكنه التسجيل مرتين
-        if Participant.objects.filter(influencer=influencer, phone=phone).exists():
+        if await Participant.objects.filter(influencer_id=influencer.pk, phone=phone).aexists():
             return JsonResponse({
                 'success': False,
                 'message': 'هذا الرقم مسجل مسبقاً في السحب'
@@ -327,8 +326,8 @@ def register_participant(request, token):
 
         # Create participant (DB also enforces uniqueness on (influencer, phone))
         try:
-            participant = Participant.objects.create(
-                influencer=influencer,
+            await Participant.objects.acreate(
+                influencer_id=influencer.pk,
                 name=name,
                 phone=phone,
                 social_media_account=social_media_account,
@@ -361,52 +360,47 @@ def register_participant(request, token):
 
 def play_wheel_page(request, token):
     """Wheel game page for influencer"""
-    # Decrypt the token to get the slug
-    slug = decrypt_slug(token)
-    if not slug:
+    # Cached read-only snapshot of the influencer for the link token
+    # (no DB reads while unchanged; old signed links are still accepted)
+    influencer = influencer_snapshots.resolve(token)
+    if influencer is None:
         from django.http import Http404
         raise Http404("Invalid or expired link")
     
-    influencer = get_object_or_404(Influencer, slug=slug)
-    
     if not influencer.is_active:
         return render(request, 'influencers/suspended.html')
     
-    prizes = influencer.get_prizes_list()
-    colors = influencer.get_colors_list()
+    def get_context():
+        # The page refreshes this count itself right after loading
+        participants_count = Participant.objects.filter(influencer_id=influencer.pk).count()
+        return {
+            'influencer': influencer,
+            'prizes': influencer.prizes,
+            'colors': influencer.colors,
+            'participants_count': participants_count,
+            'encrypted_token': influencer.public_token,
+        }
     
-    # Get participants count
-    participants_count = influencer.participants.count()
-    
-    # Get encrypted token for API calls
-    from .utils import encrypt_slug
-    encrypted_token = encrypt_slug(slug) or token
-    
-    context = {
-        'influencer': influencer,
-        'prizes': prizes,
-        'colors': colors,
-        'participants_count': participants_count,
-        'encrypted_token': encrypted_token,
-    }
-    
-    return render(request, 'influencers/play_wheel.html', context)
+    # Rendered once per config version, with ETag/304
+    return cached_page(
+        request,
+        ('influencer-wheel', influencer.public_token, influencer.version),
+        'influencers/play_wheel.html',
+        get_context,
+    )
 
 
 @require_http_methods(["GET"])
-def get_participants_count(request, token):
+async def get_participants_count(request, token):
     """Get current participants count"""
     try:
-        # Decrypt the token to get the slug
-        slug = decrypt_slug(token)
-        if not slug:
+        influencer = await influencer_snapshots.aresolve(token)
+        if influencer is None:
             return JsonResponse({
                 'success': False,
                 'message': 'رابط غير صحيح أو منتهي الصلاحية'
             }, status=404)
-        
-        influencer = get_object_or_404(Influencer, slug=slug)
-        count = influencer.participants.count()
+        count = await Participant.objects.filter(influencer_id=influencer.pk).acount()
         return JsonResponse({
             'success': True,
             'count': count
@@ -421,7 +415,7 @@ def get_participants_count(request, token):
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def spin_wheel(request, token):
+async def spin_wheel(request, token):
     """Handle wheel spin - select random prize and random winner
 
     ملاحظة مهمة:
@@ -430,16 +424,13 @@ def spin_wheel(request, token):
     - يتم تخزين الجوائز التي تم استخدامها في حقل notes كـ JSON تحت المفتاح "used_prizes".
     """
     try:
-        # Decrypt the token to get the slug
-        slug = decrypt_slug(token)
-        if not slug:
+        influencer = await sync_to_async(get_by_public_token)(Influencer.objects.all(), token)
+        if influencer is None:
             return JsonResponse({
                 'success': False,
                 'message': 'رابط غير صحيح أو منتهي الصلاحية'
             }, status=404)
         
-        influencer = get_object_or_404(Influencer, slug=slug)
-        
         # Check if influencer is active
         if not influencer.is_active:
             return JsonResponse({
@@ -450,7 +441,7 @@ def spin_wheel(request, token):
         # Get all participants
         participants = influencer.participants.all()
         
-        if not participants.exists():
+        if not await participants.aexists():
             return JsonResponse({
                 'success': False,
                 'message': 'لا يوجد مسجلين بعد'
@@ -465,9 +456,10 @@ def spin_wheel(request, token):
             }, status=400)
 
         # Load used prizes from InfluencerWinner records
-        used_prizes = set(
+        used_prizes = {
+            prize async for prize in
             InfluencerWinner.objects.filter(influencer=influencer).values_list('prize', flat=True)
-        )
+        }
 
         # Filter available prizes (those that haven't been used yet)
         available_prizes = [p for p in prizes if p not in used_prizes]
@@ -482,7 +474,7 @@ def spin_wheel(request, token):
         selected_prize = random.choice(available_prizes)
         
         # Select random participant (winner)
-        winner = random.choice(list(participants))
+        winner = random.choice([participant async for participant in participants])
         
         # Encrypt phone (hide last 4 digits, show first part)
         phone_encrypted = winner.phone
@@ -500,7 +492,7 @@ def spin_wheel(request, token):
 
         # Persist this win so the same prize is not used again for this influencer
         try:
-            InfluencerWinner.objects.create(
+            await InfluencerWinner.objects.acreate(
                 influencer=influencer,
                 participant=winner,
                 prize=selected_prize,